@@ -0,0 +1,41 @@
+"""In-process stand-in for a pymongo collection that counts round trips."""
+import time
+
+from pymongo.results import BulkWriteResult
+
+
+class CountingCollection:
+    """Accepts bulk writes without storing documents.
+
+    Every call is one simulated round trip costing `latency` seconds. The
+    first upsert for each sample_id counts as created, later ones as updated.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.round_trips = 0
+        self.ops = 0
+        self._seen = set()
+
+    def bulk_write(self, ops, ordered=True):
+        self.round_trips += 1
+        self.ops += len(ops)
+        if self.latency:
+            time.sleep(self.latency)
+        upserted = []
+        for index, op in enumerate(ops):
+            key = op._filter.get("sample_id")
+            if key not in self._seen:
+                self._seen.add(key)
+                upserted.append({"index": index, "_id": key})
+        matched = len(ops) - len(upserted)
+        return BulkWriteResult({
+            "nInserted": 0, "nUpserted": len(upserted), "nMatched": matched, "nModified": matched,
+            "nRemoved": 0, "upserted": upserted, "writeErrors": [],
+        }, True)
+
+    def insert_many(self, docs, ordered=True):
+        self.round_trips += 1
+        self.ops += len(docs)
+        if self.latency:
+            time.sleep(self.latency)
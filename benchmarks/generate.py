@@ -0,0 +1,69 @@
+"""Synthetic sample status records for benchmarking."""
+import csv
+import json
+import random
+
+import yaml
+
+SYSTEMS = ["clarity", "demux", "bjorn", "pipeline", "cdm", "frontend"]
+CHECKPOINTS = {
+    "clarity": ["registered", "lab_processing", "sent_to_sequencing"],
+    "frontend": ["scout", "coyote", "bonsai", "breaxpress", "eyrie", "cll_genie", "gens"],
+}
+STATUSES = ["started", "running", "ok", "completed", "fail", "failed"]
+FIELDS = ["sample_id", "system", "message", "status", "checkpoint", "clarity_lims_id",
+          "sequencing_run_id", "assay", "group_id", "owner", "case_id"]
+
+
+def generate_records(rows: int, samples: int = 1000, systems=None, checkpoint_ratio: float = 0.5,
+                     duplicate_ratio: float = 0.0, seed: int = 0) -> list[dict]:
+    """Return `rows` records spread over `samples` sample ids.
+
+    `checkpoint_ratio` is the share of rows sent by checkpoint systems
+    (clarity/frontend); `duplicate_ratio` is the share of rows that repeat an
+    earlier row exactly, as in overlapping re-exports.
+    """
+    rng = random.Random(seed)
+    systems = systems or SYSTEMS
+    flat = [s for s in systems if s not in CHECKPOINTS] or systems
+    checkpointed = [s for s in systems if s in CHECKPOINTS] or systems
+    records = []
+    for i in range(rows):
+        if records and rng.random() < duplicate_ratio:
+            records.append(dict(rng.choice(records)))
+            continue
+        system = rng.choice(checkpointed if rng.random() < checkpoint_ratio else flat)
+        sample = rng.randrange(samples)
+        record = {
+            "sample_id": f"BENCH-{sample:07d}",
+            "system": system,
+            "message": f"{system} event {i}",
+            "status": rng.choice(STATUSES),
+            "checkpoint": rng.choice(CHECKPOINTS[system]) if system in CHECKPOINTS else "",
+            "clarity_lims_id": f"CLAR-{sample:07d}",
+            "sequencing_run_id": f"RUN-{sample % 97:04d}",
+            "assay": rng.choice(["WGS", "WES", "PANEL"]),
+            "group_id": f"GROUP-{sample % 53:04d}",
+            "owner": rng.choice(["", "clinical", "research"]),
+            "case_id": rng.choice(["", f"CASE-{sample:07d}"]),
+        }
+        records.append(record)
+    return records
+
+
+def write_records(records: list[dict], path: str, fmt: str) -> str:
+    if fmt in ("csv", "tsv"):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS, delimiter="," if fmt == "csv" else "\t")
+            writer.writeheader()
+            writer.writerows(records)
+    elif fmt == "yaml":
+        with open(path, "w", encoding="utf-8") as f:
+            yaml.safe_dump([{k: v for k, v in r.items() if v} for r in records], f, sort_keys=False)
+    elif fmt == "jsonl":
+        with open(path, "w", encoding="utf-8") as f:
+            for r in records:
+                f.write(json.dumps({k: v for k, v in r.items() if v}) + "\n")
+    else:
+        raise ValueError(f"Unsupported benchmark format: {fmt!r}")
+    return path
@@ -0,0 +1,164 @@
+"""Benchmark the ingest stages on synthetic data.
+
+    python benchmarks/run.py --rows 50000 --format csv --output bench.json
+    python benchmarks/run.py --rows 50000 --compare bench.json --max-slowdown 1.25
+    python benchmarks/run.py --rows 50000 --compare bench.json --report-timings
+
+Each stage is timed on the materialised output of the previous one, so a
+regression can be pinned to parse, aliases, validate, normalise, build,
+coalesce or write. Writes go to an in-process collection that counts round
+trips instead of a real MongoDB.
+"""
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import click
+
+from fake_mongo import CountingCollection
+from generate import generate_records, write_records
+
+import samplenator_cli.config as default_config
+from samplenator_cli.__version__ import __version__
+from samplenator_cli.ingest import VALIDATE_CHUNK, batched, build_items, coalesce_updates, parse_file, resolve_aliases
+from samplenator_cli.plan import compile_plan
+from samplenator_cli.writer import write_updates
+
+STAGES = ["parse", "aliases", "validate", "normalise", "build", "coalesce", "write"]
+
+
+def _best_of(repeat, fn):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_benchmark(path: str, cfg, repeat: int, batch_size: int, latency: float) -> dict:
+    plan = compile_plan(cfg)
+    timings = {}
+    timings["parse"], raw = _best_of(repeat, lambda: parse_file(path))
+    timings["aliases"], rows = _best_of(repeat, lambda: resolve_aliases(raw, cfg.FIELD_ALIASES))
+    timings["validate"], errors = _best_of(
+        repeat, lambda: [plan.validate_batch(chunk) for chunk in batched(rows, VALIDATE_CHUNK)]
+    )
+    if any(errors):
+        raise click.ClickException("synthetic data failed validation")
+    timings["normalise"], records = _best_of(repeat, lambda: [plan.normalise(r) for r in rows])
+    timings["build"], items = _best_of(repeat, lambda: list(build_items(enumerate(records, start=1), cfg)))
+    timings["coalesce"], _ = _best_of(repeat, lambda: coalesce_updates(items))
+
+    def write():
+        collection = CountingCollection(latency=latency)
+        write_updates(collection, items, batch_size=batch_size)
+        return collection
+    timings["write"], collection = _best_of(repeat, write)
+
+    n = len(raw)
+    return {
+        "stages": {
+            stage: {"seconds": round(seconds, 6), "rows_per_s": round(n / seconds) if seconds else None}
+            for stage, seconds in timings.items()
+        },
+        "write": {"round_trips": collection.round_trips, "ops": collection.ops},
+    }
+
+
+def compare(current: dict, baseline: dict, max_slowdown: float,
+            gate_timings: bool = True) -> list[str]:
+    """Print stage times against `baseline` and return the regressions.
+
+    Slow stages only count as regressions with `gate_timings`; extra write
+    round trips always do.
+    """
+    regressions = []
+    for key in ("rows", "samples", "systems", "checkpoint_ratio", "duplicate_ratio", "format", "batch_size",
+                "latency"):
+        if baseline.get("meta", {}).get(key) != current["meta"].get(key):
+            click.echo(f"warning: baseline {key}={baseline.get('meta', {}).get(key)!r} differs "
+                       f"from this run ({current['meta'].get(key)!r})", err=True)
+    for stage in STAGES:
+        now = current["stages"].get(stage, {}).get("seconds")
+        before = baseline.get("stages", {}).get(stage, {}).get("seconds")
+        if not now or not before:
+            continue
+        ratio = now / before
+        slow = ratio > max_slowdown
+        marker = ("  REGRESSION" if gate_timings else "  slower") if slow else ""
+        click.echo(f"{stage:<10} {before:10.4f}s -> {now:10.4f}s  x{ratio:5.2f}{marker}")
+        if slow and gate_timings:
+            regressions.append(stage)
+    baseline_trips = baseline.get("write", {}).get("round_trips")
+    if baseline_trips is not None and current["write"]["round_trips"] > baseline_trips:
+        click.echo(f"write round trips {baseline_trips} -> {current['write']['round_trips']}  REGRESSION")
+        regressions.append("round_trips")
+    return regressions
+
+
+@click.command()
+@click.option("--rows", default=50000, show_default=True, type=click.IntRange(min=1))
+@click.option("--samples", default=5000, show_default=True, type=click.IntRange(min=1),
+              help="Distinct sample ids")
+@click.option("--systems", default=None, help="Comma-separated systems to draw from (default: all)")
+@click.option("--checkpoint-ratio", default=0.5, show_default=True, type=click.FloatRange(0, 1),
+              help="Share of rows from checkpoint systems")
+@click.option("--duplicate-ratio", default=0.0, show_default=True, type=click.FloatRange(0, 1),
+              help="Share of rows that exactly repeat an earlier row")
+@click.option("--format", "fmt", default="csv", show_default=True,
+              type=click.Choice(["csv", "tsv", "yaml", "jsonl"]))
+@click.option("--batch-size", default=1000, show_default=True, type=click.IntRange(min=1))
+@click.option("--latency", default=0.0, show_default=True, type=click.FloatRange(min=0),
+              help="Simulated seconds per write round trip")
+@click.option("--repeat", default=3, show_default=True, type=click.IntRange(min=1),
+              help="Runs per stage; the fastest is reported")
+@click.option("--seed", default=0, show_default=True, type=int)
+@click.option("--output", default=None, type=click.Path(dir_okay=False), help="Write results as JSON")
+@click.option("--compare", "baseline_path", default=None, type=click.Path(exists=True, dir_okay=False),
+              help="Baseline results JSON to compare against")
+@click.option("--max-slowdown", default=1.25, show_default=True, type=click.FloatRange(min=1),
+              help="Fail when a stage is this many times slower than the baseline")
+@click.option("--report-timings", is_flag=True, default=False,
+              help="Only report slower stages and fail on extra round trips alone "
+                   "(for a baseline recorded on another machine)")
+def main(rows, samples, systems, checkpoint_ratio, duplicate_ratio, fmt, batch_size, latency, repeat, seed,
+         output, baseline_path, max_slowdown, report_timings):
+    """Time parse, aliases, validate, normalise, build, coalesce and write on synthetic data."""
+    records = generate_records(rows, samples=samples, systems=systems.split(",") if systems else None,
+                               checkpoint_ratio=checkpoint_ratio, duplicate_ratio=duplicate_ratio, seed=seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_records(records, os.path.join(tmp, f"bench.{fmt}"), fmt)
+        results = run_benchmark(path, default_config, repeat, batch_size, latency)
+
+    results["meta"] = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "rows": rows, "samples": samples, "systems": systems, "checkpoint_ratio": checkpoint_ratio,
+        "duplicate_ratio": duplicate_ratio, "format": fmt, "batch_size": batch_size,
+        "latency": latency, "repeat": repeat, "seed": seed,
+    }
+    for stage, stats in results["stages"].items():
+        click.echo(f"{stage:<10} {stats['seconds']:10.4f}s  {stats['rows_per_s'] or 0:>10} rows/s")
+    click.echo(f"write      {results['write']['round_trips']} round trips for {results['write']['ops']} ops")
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, max_slowdown, gate_timings=not report_timings):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
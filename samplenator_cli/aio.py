@@ -0,0 +1,88 @@
+"""asyncio ingest API for embedding samplenator in an event loop.
+
+Use with pymongo's `AsyncMongoClient` (pymongo >= 4.10):
+
+    client = AsyncMongoClient(cfg.MONGO_URI)
+    collection = client[cfg.MONGO_DB][cfg.MONGO_COLLECTION]
+    result = await ingest_records(records, cfg, collection)
+"""
+import asyncio
+
+from pymongo.errors import BulkWriteError
+
+from samplenator_cli.ingest import coalesce_updates, iter_aliases, iter_updates
+from samplenator_cli.writer import (
+    DEFAULT_BATCH_SIZE,
+    QueueItems,
+    merge_results,
+    partition_for,
+    record_bulk_error,
+    record_bulk_result,
+    to_operations,
+)
+
+async def _write_batch(collection, batch: list, ordered: bool, result: dict) -> bool:
+    """Write one batch into `result`; False if it hit a write error."""
+    result["rows"] += sum(len(rows) for rows, _, _ in batch)
+    try:
+        res = await collection.bulk_write(to_operations(batch), ordered=ordered)
+    except BulkWriteError as e:
+        record_bulk_error(result, batch, e, ordered)
+        return False
+    record_bulk_result(result, res)
+    return True
+
+
+async def _partition_writer(collection, q: asyncio.Queue, batch_size: int, ordered: bool) -> dict:
+    result = {"created": 0, "updated": 0, "rows": 0, "errors": []}
+    items = QueueItems(q)
+    batch = []
+    try:
+        async for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                if not await _write_batch(collection, batch, ordered, result) and ordered:
+                    return result
+                batch = []
+        if batch:
+            await _write_batch(collection, batch, ordered, result)
+    finally:
+        await items.adrain()
+    return result
+
+
+async def ingest_records(records, cfg, collection, batch_size: int = DEFAULT_BATCH_SIZE,
+                         concurrency: int = 4, ordered: bool = True, coalesce: bool = False) -> dict:
+    """Validate, build and upsert raw records through an async collection.
+
+    Records go through the same alias resolution, validation and update
+    building as `samplenator-cli upload`. Updates are partitioned by
+    `sample_id` over `concurrency` writer tasks, each with a bounded queue, so
+    a slow database applies backpressure to the producer instead of buffering
+    the whole input. Per-sample write order is preserved.
+
+    Returns the usual result dict; validation errors come first in `errors`,
+    and as with `upload --stream`, no rows after the first invalid one are
+    written.
+    """
+    errors = []
+    items = iter_updates(iter_aliases(records, cfg.FIELD_ALIASES), cfg, errors)
+    if coalesce:
+        items = coalesce_updates(items)
+
+    queues = [asyncio.Queue(maxsize=batch_size * 2) for _ in range(concurrency)]
+    tasks = [
+        asyncio.create_task(_partition_writer(collection, q, batch_size, ordered))
+        for q in queues
+    ]
+    try:
+        for item in items:
+            await queues[partition_for(item[1]["sample_id"], concurrency)].put(item)
+    finally:
+        for q in queues:
+            await q.put(QueueItems.END)
+    results = await asyncio.gather(*tasks)
+
+    result = merge_results(results)
+    result["errors"] = errors + result["errors"]
+    return result
@@ -0,0 +1,91 @@
+import threading
+
+from samplenator_cli.plan import compile_plan
+
+_TRACKED_SUFFIXES = (".status", ".message")
+
+_MISSING = object()
+
+
+def _get_path(doc, path: str):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return _MISSING
+        doc = doc[part]
+    return doc
+
+
+def tracked_values(update: dict) -> dict:
+    """{path: value} of the fields an update is compared on: status, message and top-level sample fields."""
+    sets = update.get("$set", {})
+    return {
+        path: value for path, value in sets.items()
+        if ("." not in path and path != "sample_id")
+        or (path.startswith("systems.") and path.endswith(_TRACKED_SUFFIXES))
+    }
+
+
+def timeline_values(update: dict, plan) -> list:
+    """(path, value) pairs for the status and message of every timeline entry the update pushes.
+
+    A coalesced update carries all of its rows' entries; checking each one
+    keeps a round trip such as running -> ok -> running from being skipped
+    just because it ends where it started. Paths come from the same
+    `IngestPlan` targets the update was built with, so a checkpoint column on
+    a plain system or a checkpoint system row without one resolves as it
+    does when written.
+    """
+    push = update.get("$push", {}).get("timeline")
+    if push is None:
+        return []
+    entries = push["$each"] if isinstance(push, dict) and "$each" in push else [push]
+    pairs = []
+    for entry in entries:
+        target = plan.target(entry["system"], entry.get("checkpoint") or "default")
+        pairs.append((target.status, entry.get("status")))
+        pairs.append((target.message, entry.get("message")))
+    return pairs
+
+
+class ChangeFilter:
+    """Drop upserts that would not change a sample's status or message.
+
+    Before each batch is written, the stored values of the fields its
+    updates set (`systems.<name>.status` and `.message`, per checkpoint for
+    checkpoint systems, and the top-level sample fields) are read with one
+    `$in` query projected to just those paths. An update is dropped when
+    every one of them already has the value it would write, so a repeated
+    `running` heartbeat no longer pushes a timeline entry or bumps the
+    timestamps. Updates for new samples are always written, and later
+    updates in the same batch are compared with what earlier ones set.
+    `skipped` counts the dropped rows across all writer threads.
+    """
+
+    def __init__(self, collection, cfg):
+        self.collection = collection
+        self.plan = compile_plan(cfg)
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def split(self, batch: list):
+        """Return (batch without no-op updates, row refs of the dropped ones)."""
+        checks = [(tracked_values(update), timeline_values(update, self.plan)) for _, _, update in batch]
+        paths = {path for values, pairs in checks for path in (*values, *(p for p, _ in pairs))}
+        sample_ids = list(dict.fromkeys(filt["sample_id"] for _, filt, _ in batch))
+        projection = {"_id": 0, "sample_id": 1, **{path: 1 for path in paths}}
+        stored = {doc["sample_id"]: {path: _get_path(doc, path) for path in paths}
+                  for doc in self.collection.find({"sample_id": {"$in": sample_ids}}, projection)}
+
+        kept, skipped = [], []
+        for item, (values, pairs) in zip(batch, checks):
+            rows, filt, _ = item
+            current = stored.get(filt["sample_id"])
+            if current is not None and values and all(current[path] == value for path, value in values.items()) \
+                    and all(current[path] == value for path, value in pairs):
+                skipped.extend(rows)
+                continue
+            kept.append(item)
+            stored.setdefault(filt["sample_id"], dict.fromkeys(paths, _MISSING)).update(values)
+        with self._lock:
+            self.skipped += len(skipped)
+        return kept, skipped
@@ -1,100 +1,824 @@
 import click
 import importlib.util
 import json
+import os
 import sys
+import time
+from contextlib import nullcontext
 
 import samplenator_cli.config as default_config
-from samplenator_cli.ingest import parse_file, resolve_aliases, validate_record, build_mongo_update
+from samplenator_cli.ingest import (
+    READ_ERRORS,
+    STREAM_FORMATS,
+    batched,
+    build_items,
+    coalesce_updates,
+    file_format,
+    iter_aliases,
+    guard_read,
+    iter_file,
+    iter_normalised,
+    iter_quarantined,
+    iter_stream,
+    iter_valid_records,
+    iter_validated,
+    sniff_stream,
+)
+from samplenator_cli.sources import expand_inputs, iter_sources
+
+
+# Exit status of an upload that wrote its valid rows but quarantined others
+EXIT_PARTIAL = 3
+
+_config_cache = {}
 
 
 def load_config(config_path):
+    """Return the config module at `config_path` (the bundled config if None).
+
+    Modules are cached by path, mtime and size, so repeated calls in one
+    process (e.g. per file in a parsing worker) execute the file only once, and
+    the cached module keeps hitting the compiled-plan cache. importlib caches
+    the file's bytecode in __pycache__ across runs.
+    """
     if config_path is None:
         return default_config
-    spec = importlib.util.spec_from_file_location("_user_config", config_path)
-    mod = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(mod)
+    path = os.path.realpath(config_path)
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    mod = _config_cache.get(key)
+    if mod is None:
+        spec = importlib.util.spec_from_file_location("_user_config", path)
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        _config_cache[key] = mod
     return mod
 
 
+def _fail(errors):
+    for msg in errors:
+        click.echo(msg, err=True)
+    sys.exit(1)
+
+
+def _input_paths(input_files) -> list:
+    # An input that names no file to read is a usage error, like a missing path
+    try:
+        return expand_inputs(input_files)
+    except FileNotFoundError as e:
+        raise click.BadParameter(str(e), param_hint="'-i' / '--input'") from e
+
+
+def mongo_options(f):
+    f = click.option("--mongo-collection", envvar="SAMPLENATOR_MONGO_COLLECTION", default=None,
+                     help="MongoDB collection name (env: SAMPLENATOR_MONGO_COLLECTION)")(f)
+    f = click.option("--mongo-db", envvar="SAMPLENATOR_MONGO_DB", default=None,
+                     help="MongoDB database name (env: SAMPLENATOR_MONGO_DB)")(f)
+    f = click.option("--mongo-uri", envvar="SAMPLENATOR_MONGO_URI", default=None,
+                     help="MongoDB URI (env: SAMPLENATOR_MONGO_URI)")(f)
+    return f
+
+
+def config_option(f):
+    return click.option("--config", "config_path", default=None, type=click.Path(),
+                        help="Path to an alternate config.py")(f)
+
+
+def events_options(f):
+    f = click.option("--timeline-window", default=None, type=click.IntRange(min=0),
+                     help="Timeline entries kept on the sample document (default: cfg.TIMELINE_WINDOW)")(f)
+    f = click.option("--events-collection", envvar="SAMPLENATOR_EVENTS_COLLECTION", default=None,
+                     help="Events collection name (env: SAMPLENATOR_EVENTS_COLLECTION)")(f)
+    return f
+
+
+def retry_options(f):
+    f = click.option("--retry-backoff", default=0.5, show_default=True, type=click.FloatRange(min=0),
+                     help="Base delay in seconds for exponential backoff between retries")(f)
+    f = click.option("--retries", default=5, show_default=True, type=click.IntRange(min=0),
+                     help="Retries of a write that failed before reaching MongoDB (no server selectable, pool exhausted)")(f)
+    return f
+
+
+def rollups_options(f):
+    f = click.option("--rollups-collection", envvar="SAMPLENATOR_ROLLUPS_COLLECTION", default=None,
+                     help="Rollups collection name (env: SAMPLENATOR_ROLLUPS_COLLECTION)")(f)
+    f = click.option("--rollups", "use_rollups", is_flag=True,
+                     help="Keep per-run and per-group status counts in the rollups collection up to date")(f)
+    return f
+
+
+def skip_unchanged_option(f):
+    return click.option("--skip-unchanged", is_flag=True,
+                        help="Skip records that would not change the stored status or message of their system")(f)
+
+
+def open_changes(collection, cfg, skip_unchanged):
+    if not skip_unchanged:
+        return None
+    from samplenator_cli.changes import ChangeFilter
+    return ChangeFilter(collection, cfg)
+
+
+def resolve_rollups(cfg, rollups_collection):
+    return rollups_collection or getattr(cfg, "ROLLUPS_COLLECTION", "sample_rollups")
+
+
+def resolve_events(cfg, events_collection, timeline_window):
+    from samplenator_cli.events import DEFAULT_TIMELINE_WINDOW
+    events_collection = events_collection or getattr(cfg, "EVENTS_COLLECTION", "sample_events")
+    if timeline_window is None:
+        timeline_window = getattr(cfg, "TIMELINE_WINDOW", DEFAULT_TIMELINE_WINDOW)
+    return events_collection, timeline_window
+
+
+def open_targets(cfg, mongo_uri, mongo_db, mongo_collection, event_log, events_collection, timeline_window,
+                 retries, retry_backoff, stats=None, use_rollups=False, rollups_collection=None):
+    """Connect and return (collection, EventLog or None, Rollups or None) for writing updates."""
+    from pymongo import MongoClient
+    from samplenator_cli.retry import RetryingCollection
+    client = MongoClient(mongo_uri)
+
+    def wrap(collection):
+        if stats is not None:
+            collection = stats.collection(collection)
+        return RetryingCollection(collection, retries, retry_backoff, log=lambda msg: click.echo(msg, err=True))
+
+    collection = wrap(client[mongo_db][mongo_collection])
+    events = None
+    if event_log:
+        from samplenator_cli.events import EventLog, ensure_event_indexes
+        events_collection, timeline_window = resolve_events(cfg, events_collection, timeline_window)
+        ensure_event_indexes(client[mongo_db][events_collection])
+        events = EventLog(wrap(client[mongo_db][events_collection]), timeline_window)
+    rollups = None
+    if use_rollups:
+        from samplenator_cli.rollups import Rollups
+        rollups = Rollups(wrap(client[mongo_db][resolve_rollups(cfg, rollups_collection)]), collection)
+    return collection, events, rollups
+
+
+def write_or_fail(collection, items, workers, batch_size, ordered, on_batch=None, event_log=None, rollups=None,
+                  changes=None, hint=None):
+    """write_updates_concurrent, exiting with a message if MongoDB stays unreachable."""
+    from pymongo.errors import PyMongoError
+    from samplenator_cli.writer import write_updates_concurrent
+    try:
+        return write_updates_concurrent(collection, items, workers, batch_size=batch_size, ordered=ordered,
+                                        on_batch=on_batch, event_log=event_log, rollups=rollups, changes=changes)
+    except PyMongoError as e:
+        _fail([f"Error writing to MongoDB: {e}"] + ([hint] if hint else []))
+
+
+def report_write(result, elapsed, mongo_db, mongo_collection):
+    for msg in result["errors"]:
+        click.echo(msg, err=True)
+    click.echo(f"Done — {result['created']} created, {result['updated']} updated in {mongo_db}.{mongo_collection}")
+    click.echo(f"Wrote {result['rows']} rows in {elapsed:.2f}s ({result['rows'] / max(elapsed, 1e-9):.0f} rows/s)")
+
+
+def _timed(stats, name, iterable):
+    return stats.timed(name, iterable) if stats is not None else iterable
+
+
+def _read_records(open_rows, cfg, errors, stats, reject=None):
+    """Valid records from one source; `open_rows()` returns its raw row iterator.
+
+    With `reject`, invalid rows are handed to it (see `iter_quarantined`)
+    instead of being added to `errors`.
+    """
+    if stats is None:
+        raw_rows = guard_read(open_rows(), errors)
+        if reject is not None:
+            return iter_normalised(iter_quarantined(raw_rows, cfg, reject), cfg)
+        return iter_valid_records(iter_aliases(raw_rows, cfg.FIELD_ALIASES), cfg, errors)
+    with stats.measure("parse"):
+        raw_rows = stats.timed("parse", guard_read(open_rows(), errors))
+    if reject is not None:
+        valid = stats.timed("validate", iter_quarantined(raw_rows, cfg, reject))
+    else:
+        rows = stats.timed("aliases", iter_aliases(raw_rows, cfg.FIELD_ALIASES))
+        valid = stats.timed("validate", iter_validated(rows, cfg, errors))
+    return stats.timed("normalise", iter_normalised(valid, cfg))
+
+
+def _report_quarantine(quarantine) -> None:
+    quarantine.close()
+    for msg in quarantine.messages:
+        click.echo(msg, err=True)
+    if quarantine.rows:
+        where = f" to {', '.join(quarantine.files)}" if quarantine.files else ""
+        click.echo(f"Quarantined {quarantine.rows} invalid rows{where}", err=True)
+
+
+def _report_stats(stats, show, json_path, profiler, profile_path):
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+    if stats is None:
+        return
+    if show:
+        click.echo(stats.format_table(), err=True)
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(stats.report(), f, indent=2)
+
+
+def resolve_mongo(cfg, mongo_uri, mongo_db, mongo_collection):
+    return mongo_uri or cfg.MONGO_URI, mongo_db or cfg.MONGO_DB, mongo_collection or cfg.MONGO_COLLECTION
+
+
 @click.group()
 def main():
     """CLI for theSamplenator — ingest sample status records into MongoDB."""
 
 
 @main.command()
-@click.option("-i", "--input", "input_file", required=True, type=click.Path(exists=True),
-              help="Input file (.csv, .tsv, .yaml, .yml)")
-@click.option("--mongo-uri", envvar="SAMPLENATOR_MONGO_URI", default=None,
-              help="MongoDB URI (env: SAMPLENATOR_MONGO_URI)")
-@click.option("--mongo-db", envvar="SAMPLENATOR_MONGO_DB", default=None,
-              help="MongoDB database name (env: SAMPLENATOR_MONGO_DB)")
-@click.option("--mongo-collection", envvar="SAMPLENATOR_MONGO_COLLECTION", default=None,
-              help="MongoDB collection name (env: SAMPLENATOR_MONGO_COLLECTION)")
+@click.option("-i", "--input", "input_files", required=True, multiple=True,
+              help="Input file (.csv, .tsv, .yaml, .yml, .jsonl, .ndjson), directory or glob; repeatable. "
+                   "Use - to read from stdin")
+@click.option("--format", "input_format", default=None, type=click.Choice(STREAM_FORMATS),
+              help="Format of records read from stdin (default: sniffed from the first line)")
+@mongo_options
 @click.option("--dry-run", is_flag=True, help="Print JSON, skip insert")
-@click.option("--config", "config_path", default=None, type=click.Path(),
-              help="Path to an alternate config.py")
-def upload(input_file, mongo_uri, mongo_db, mongo_collection, dry_run, config_path):
-    """Upload records from a file into MongoDB."""
+@click.option("--export", "export_path", default=None, type=click.Path(dir_okay=False, allow_dash=True),
+              help="Write update documents with their filter as NDJSON to this path (- for stdout), skip insert")
+@config_option
+@click.option("--batch-size", default=1000, show_default=True, type=click.IntRange(min=1),
+              help="Number of upserts sent per bulk_write call")
+@click.option("--ordered/--unordered", default=True, show_default=True,
+              help="Stop at the first failed write (ordered) or keep going (unordered)")
+@click.option("--coalesce", is_flag=True,
+              help="Fold all records for the same sample_id into a single upsert")
+@click.option("--stream", is_flag=True,
+              help="Write batches while the file is still being read (rows before an invalid row may be written)")
+@click.option("--on-error", default="abort", show_default=True, type=click.Choice(["abort", "quarantine"]),
+              help="On invalid rows, write nothing (abort) or write the valid rows and move the invalid ones "
+                   "to a rejects file per input (quarantine, exit status 3)")
+@click.option("--rejects-dir", default=None, type=click.Path(file_okay=False),
+              help="Directory for rejects files (default: next to each input; stdin: current directory)")
+@click.option("--workers", default=1, show_default=True, type=click.IntRange(min=1),
+              help="Number of writer threads; records are partitioned by sample_id")
+@click.option("--processes", default=None, type=click.IntRange(min=1),
+              help="Worker processes for parsing multiple files (default: CPU count)")
+@click.option("--ledger", "ledger_path", default=None, type=click.Path(dir_okay=False),
+              help="SQLite ledger of ingested records; rows already in it are skipped")
+@click.option("--ledger-by-position", is_flag=True, default=False,
+              help="Key ledger entries on the input file name and row too, so a repeated record is still written")
+@click.option("--ledger-max-age", default=None, type=click.FloatRange(min=0),
+              help="Evict ledger entries older than this many days")
+@click.option("--ledger-max-entries", default=None, type=click.IntRange(min=0),
+              help="Keep at most this many (most recent) ledger entries")
+@click.option("--journal", "journal_path", default=None, type=click.Path(dir_okay=False),
+              help="Record the rows written from each input file in this JSON journal")
+@click.option("--resume", is_flag=True, help="Skip rows the --journal already records as written")
+@retry_options
+@click.option("--event-log", is_flag=True,
+              help="Write timeline entries to the events collection and keep only a recent window on the sample")
+@events_options
+@rollups_options
+@skip_unchanged_option
+@click.option("--stats", "show_stats", is_flag=True,
+              help="Print time, rows/s per stage and peak RSS to stderr")
+@click.option("--stats-json", default=None, type=click.Path(dir_okay=False),
+              help="Write per-stage stats as JSON to this path")
+@click.option("--stats-memory", is_flag=True,
+              help="Also trace peak memory per stage with tracemalloc (slows the run several times over)")
+@click.option("--profile", "profile_path", default=None, type=click.Path(dir_okay=False),
+              help="Write a cProfile dump of the run to this path")
+def upload(input_files, input_format, mongo_uri, mongo_db, mongo_collection, dry_run, export_path, config_path,
+           batch_size, ordered, coalesce, stream, on_error, rejects_dir, workers, processes,
+           ledger_path, ledger_by_position, ledger_max_age, ledger_max_entries, journal_path, resume, retries,
+           retry_backoff, event_log, events_collection, timeline_window, use_rollups, rollups_collection,
+           skip_unchanged, show_stats, stats_json, stats_memory, profile_path):
+    """Upload records from one or more files into MongoDB."""
     cfg = load_config(config_path)
 
-    mongo_uri = mongo_uri or cfg.MONGO_URI
-    mongo_db = mongo_db or cfg.MONGO_DB
-    mongo_collection = mongo_collection or cfg.MONGO_COLLECTION
+    if stats_memory and not (show_stats or stats_json):
+        raise click.BadParameter("requires --stats or --stats-json", param_hint="'--stats-memory'")
+    stats = profiler = None
+    if show_stats or stats_json:
+        from samplenator_cli.stats import StageStats
+        stats = StageStats(memory=stats_memory)
+    if profile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    if stats is not None or profiler is not None:
+        # Runs however upload exits, including through sys.exit on errors
+        click.get_current_context().call_on_close(
+            lambda: _report_stats(stats, show_stats, stats_json, profiler, profile_path)
+        )
+
+    mongo_uri, mongo_db, mongo_collection = resolve_mongo(cfg, mongo_uri, mongo_db, mongo_collection)
 
+    all_errors = []
+    if "-" in input_files and len(input_files) > 1:
+        raise click.BadParameter("stdin (-) cannot be combined with other inputs", param_hint="'-i' / '--input'")
+    if resume and not journal_path:
+        raise click.BadParameter("requires --journal", param_hint="'--resume'")
+    if journal_path and input_files == ("-",):
+        raise click.BadParameter("stdin cannot be journaled", param_hint="'--journal'")
+    quarantine = None
+    if on_error == "quarantine":
+        from samplenator_cli.quarantine import Quarantine
+        quarantine = Quarantine(rejects_dir, write=not dry_run)
+        # Nothing is held back for a bad row, so valid rows go to the writer as they are read
+        stream = True
+    elif rejects_dir:
+        raise click.BadParameter("requires --on-error quarantine", param_hint="'--rejects-dir'")
+    journal = None
+    # Rows of a single input are referenced by row number alone, so the ledger is told its name
+    source = None
     try:
-        raw_rows = parse_file(input_file)
+        if input_files == ("-",):
+            source = "-"
+            fmt, stdin = sniff_stream(click.open_file("-", encoding="utf-8"), input_format)
+            reject = quarantine.open("-", fmt or "jsonl") if quarantine is not None else None
+            records = _read_records(lambda: iter_stream(stdin, fmt), cfg, all_errors, stats, reject)
+        else:
+            paths = _input_paths(input_files)
+            if len(paths) == 1:
+                source = paths[0]
+                reject = quarantine.open(paths[0], file_format(paths[0])) if quarantine is not None else None
+                records = _read_records(lambda: iter_file(paths[0]), cfg, all_errors, stats, reject)
+            else:
+                records = _timed(stats, "load", iter_sources(paths, config_path, processes or os.cpu_count() or 1,
+                                                             all_errors, quarantine))
+            if journal_path and not (dry_run or export_path):
+                from samplenator_cli.journal import Journal
+                journal = Journal(journal_path, paths, resume=resume)
+                records = _timed(stats, "journal", journal.filter_new(records))
     except (ValueError, FileNotFoundError) as e:
         click.echo(f"Error reading file: {e}", err=True)
         sys.exit(1)
 
-    rows = resolve_aliases(raw_rows, cfg.FIELD_ALIASES)
+    ledger = None
+    if ledger_path:
+        from samplenator_cli.ledger import Ledger, ledger_target
+        ledger = Ledger(ledger_path, ledger_target(mongo_uri, mongo_db, mongo_collection),
+                        by_position=ledger_by_position, max_age_days=ledger_max_age, max_entries=ledger_max_entries)
+        records = _timed(stats, "ledger", ledger.filter_new(records, source))
+    items = _timed(stats, "build", build_items(records, cfg))
 
-    all_errors = []
-    for i, record in enumerate(rows, start=1):
-        for err in validate_record(record, cfg.REQUIRED_FIELDS, cfg.VALID_STATUSES, cfg.KNOWN_SYSTEMS):
-            all_errors.append(f"Row {i}: {err}")
+    if not stream and not export_path:
+        items = list(items)
+        if all_errors:
+            _fail(all_errors)
+        if coalesce:
+            if stats is None:
+                items = coalesce_updates(items)
+            else:
+                with stats.measure("coalesce") as stage:
+                    items = coalesce_updates(items)
+                    stage.rows = len(items)
+    elif coalesce:
+        items = _timed(stats, "coalesce",
+                       (item for chunk in batched(items, batch_size) for item in coalesce_updates(chunk)))
+
+    partial = 0
+    if dry_run:
+        updates = [update for _, _, update in items]
+        if quarantine is not None:
+            _report_quarantine(quarantine)
+            partial = EXIT_PARTIAL if quarantine.rows else 0
+        if all_errors:
+            _fail(all_errors)
+        if ledger is not None:
+            click.echo(f"Skipped {ledger.skipped} already-ingested rows", err=True)
+        click.echo(json.dumps({"updates": updates}, indent=2))
+        sys.exit(partial)
+
+    if export_path:
+        from samplenator_cli.export import open_export, write_export
+        # The file only appears if every row was valid
+        with open_export(export_path) as f:
+            with stats.measure("export") if stats is not None else nullcontext() as stage:
+                exported = write_export(items, f)
+                if stage is not None:
+                    stage.rows = exported
+            if quarantine is not None:
+                _report_quarantine(quarantine)
+                partial = EXIT_PARTIAL if quarantine.rows else 0
+            if all_errors:
+                _fail(all_errors)
+        if ledger is not None:
+            click.echo(f"Skipped {ledger.skipped} already-ingested rows", err=True)
+        click.echo(f"Done — exported {exported} rows to {export_path}", err=True)
+        sys.exit(partial)
+
+    collection, events, rollups = open_targets(cfg, mongo_uri, mongo_db, mongo_collection, event_log,
+                                               events_collection, timeline_window, retries, retry_backoff, stats,
+                                               use_rollups, rollups_collection)
+    changes = open_changes(collection, cfg, skip_unchanged)
+    commits = [c.commit for c in (ledger, journal) if c is not None]
 
+    def on_batch(refs):
+        for commit in commits:
+            commit(refs)
+
+    hint = "Re-run with --resume to continue after the last written batch" if journal is not None else None
+    started = time.perf_counter()
+    with stats.measure("write") if stats is not None else nullcontext() as stage:
+        result = write_or_fail(collection, items, workers, batch_size, ordered,
+                               on_batch=on_batch if commits else None, event_log=events, rollups=rollups,
+                               changes=changes, hint=hint)
+        if stage is not None:
+            stage.rows = result["rows"]
+    elapsed = time.perf_counter() - started
+    if journal is not None and journal.skipped:
+        click.echo(f"Resumed — skipped {journal.skipped} rows already written")
+    if ledger is not None:
+        ledger.close()
+        click.echo(f"Skipped {ledger.skipped} already-ingested rows")
+    if changes is not None:
+        click.echo(f"Skipped {changes.skipped} unchanged rows")
+
+    report_write(result, elapsed, mongo_db, mongo_collection)
+    if quarantine is not None:
+        _report_quarantine(quarantine)
     if all_errors:
-        for msg in all_errors:
-            click.echo(msg, err=True)
+        _fail(all_errors)
+    if result["errors"]:
         sys.exit(1)
+    if quarantine is not None and quarantine.rows:
+        sys.exit(EXIT_PARTIAL)
 
-    # Normalise records: strip whitespace, lowercase status/system, drop unknown fields
-    payload_records = []
-    for record in rows:
-        row = {}
-        for field in cfg.KNOWN_FIELDS:
-            if field in record and record[field] is not None and str(record[field]).strip() != "":
-                row[field] = str(record[field]).strip()
-        if "status" in row:
-            row["status"] = row["status"].lower()
-        if "system" in row:
-            row["system"] = row["system"].lower()
-        payload_records.append(row)
 
-    if dry_run:
-        updates = [build_mongo_update(r, cfg) for r in payload_records]
-        click.echo(json.dumps({"updates": updates}, indent=2))
-        sys.exit(0)
+def _exported_items(paths, errors):
+    from samplenator_cli.export import iter_export
+    from samplenator_cli.ingest import open_text
+    for path in paths:
+        try:
+            f = click.open_file("-", encoding="utf-8") if path == "-" else open_text(path)
+        except READ_ERRORS as e:
+            errors.append(f"{path}: Error reading file: {e}")
+            return
+        with f:
+            before = len(errors)
+            yield from guard_read(iter_export(f), errors, source=path)
+            if len(errors) > before:
+                return
+
+
+@main.command()
+@click.option("-i", "--input", "input_files", required=True, multiple=True,
+              help="NDJSON written by upload --export (optionally compressed), or - for stdin; repeatable")
+@mongo_options
+@config_option
+@click.option("--batch-size", default=1000, show_default=True, type=click.IntRange(min=1),
+              help="Number of upserts sent per bulk_write call")
+@click.option("--ordered/--unordered", default=True, show_default=True,
+              help="Stop at the first failed write (ordered) or keep going (unordered)")
+@click.option("--workers", default=1, show_default=True, type=click.IntRange(min=1),
+              help="Number of writer threads; updates are partitioned by sample_id")
+@retry_options
+@click.option("--event-log", is_flag=True,
+              help="Write timeline entries to the events collection and keep only a recent window on the sample")
+@events_options
+@rollups_options
+@skip_unchanged_option
+def apply(input_files, mongo_uri, mongo_db, mongo_collection, config_path, batch_size, ordered, workers,
+          retries, retry_backoff, event_log, events_collection, timeline_window, use_rollups, rollups_collection,
+          skip_unchanged):
+    """Bulk-write update documents exported with upload --export."""
+    cfg = load_config(config_path)
+    mongo_uri, mongo_db, mongo_collection = resolve_mongo(cfg, mongo_uri, mongo_db, mongo_collection)
+    for path in input_files:
+        if path != "-" and not os.path.isfile(path):
+            _fail([f"Error reading file: no such file: {path!r}"])
+
+    collection, events, rollups = open_targets(cfg, mongo_uri, mongo_db, mongo_collection, event_log,
+                                               events_collection, timeline_window, retries, retry_backoff,
+                                               use_rollups=use_rollups, rollups_collection=rollups_collection)
+    changes = open_changes(collection, cfg, skip_unchanged)
+    errors = []
+    started = time.perf_counter()
+    result = write_or_fail(collection, _exported_items(input_files, errors), workers, batch_size, ordered,
+                           event_log=events, rollups=rollups, changes=changes)
+    elapsed = time.perf_counter() - started
+    if changes is not None:
+        click.echo(f"Skipped {changes.skipped} unchanged rows")
+    report_write(result, elapsed, mongo_db, mongo_collection)
+    if errors:
+        _fail(errors)
+    if result["errors"]:
+        sys.exit(1)
+
+
+@main.command()
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@mongo_options
+@config_option
+@click.option("--state-file", default=None, type=click.Path(),
+              help="Offset state file (default: <directory>/.samplenator-watch.json)")
+@click.option("--batch-size", default=1000, show_default=True, type=click.IntRange(min=1),
+              help="Flush once this many rows are pending")
+@click.option("--flush-interval", default=2.0, show_default=True, type=click.FloatRange(min=0),
+              help="Flush pending rows after this many seconds")
+@click.option("--poll-interval", default=1.0, show_default=True, type=click.FloatRange(min=0),
+              help="Seconds between directory scans when inotify is unavailable")
+@click.option("--once", is_flag=True, help="Ingest what is currently in the directory and exit")
+@retry_options
+@skip_unchanged_option
+def watch(directory, mongo_uri, mongo_db, mongo_collection, config_path, state_file,
+          batch_size, flush_interval, poll_interval, once, retries, retry_backoff, skip_unchanged):
+    """Watch a drop directory and ingest new or appended records."""
+    cfg = load_config(config_path)
+    mongo_uri, mongo_db, mongo_collection = resolve_mongo(cfg, mongo_uri, mongo_db, mongo_collection)
 
     from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+    from samplenator_cli.retry import RetryingCollection
+    from samplenator_cli.watcher import Watcher
     client = MongoClient(mongo_uri)
-    collection = client[mongo_db][mongo_collection]
-
-    upserted = inserted = 0
-    for record in payload_records:
-        update = build_mongo_update(record, cfg)
-        result = collection.update_one(
-            {"sample_id": record["sample_id"]},
-            update,
-            upsert=True,
-        )
-        if result.upserted_id:
-            upserted += 1
+    collection = RetryingCollection(client[mongo_db][mongo_collection], retries, retry_backoff,
+                                    log=lambda msg: click.echo(msg, err=True))
+
+    changes = open_changes(collection, cfg, skip_unchanged)
+    watcher = Watcher(directory, collection, cfg, state_path=state_file, batch_size=batch_size,
+                      flush_interval=flush_interval, poll_interval=poll_interval, changes=changes,
+                      retry_backoff=retry_backoff, log=lambda msg: click.echo(msg, err=True))
+    try:
+        totals = watcher.run(once=once)
+    except PyMongoError as e:
+        _fail([f"Error writing to MongoDB: {e}", "Offsets of unwritten rows were not saved; they are read again "
+               "on the next run"])
+    if changes is not None:
+        click.echo(f"Skipped {changes.skipped} unchanged rows")
+    click.echo(f"Done — {totals['created']} created, {totals['updated']} updated in {mongo_db}.{mongo_collection}")
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+@main.command()
+@click.option("--socket", "socket_path", envvar="SAMPLENATOR_SOCKET", default=None,
+              type=click.Path(dir_okay=False),
+              help="Unix socket to listen on (env: SAMPLENATOR_SOCKET; default: samplenator.sock in the temp dir)")
+@click.option("--port", default=None, type=click.IntRange(0, 65535),
+              help="Serve HTTP on this port instead of a Unix socket")
+@click.option("--host", default="127.0.0.1", show_default=True, help="Address to bind with --port")
+@mongo_options
+@config_option
+@click.option("--batch-size", default=1000, show_default=True, type=click.IntRange(min=1),
+              help="Flush once this many rows are pending")
+@click.option("--flush-interval", default=0.05, show_default=True, type=click.FloatRange(min=0),
+              help="Flush pending rows this many seconds after the oldest arrived")
+@retry_options
+@click.option("--event-log", is_flag=True,
+              help="Write timeline entries to the events collection and keep only a recent window on the sample")
+@events_options
+@rollups_options
+@skip_unchanged_option
+def serve(socket_path, port, host, mongo_uri, mongo_db, mongo_collection, config_path, batch_size, flush_interval,
+          retries, retry_backoff, event_log, events_collection, timeline_window, use_rollups, rollups_collection,
+          skip_unchanged):
+    """Accept JSON records from send (or HTTP) and write them in micro-batches."""
+    if socket_path and port is not None:
+        raise click.BadParameter("cannot be combined with --port", param_hint="'--socket'")
+    cfg = load_config(config_path)
+    mongo_uri, mongo_db, mongo_collection = resolve_mongo(cfg, mongo_uri, mongo_db, mongo_collection)
+
+    import signal
+    from samplenator_cli.client import DEFAULT_SOCKET
+    from samplenator_cli.server import Batcher, open_server
+    collection, events, rollups = open_targets(cfg, mongo_uri, mongo_db, mongo_collection, event_log,
+                                               events_collection, timeline_window, retries, retry_backoff,
+                                               use_rollups=use_rollups, rollups_collection=rollups_collection)
+    batcher = Batcher(collection, cfg, batch_size=batch_size, flush_interval=flush_interval, event_log=events,
+                      rollups=rollups, changes=open_changes(collection, cfg, skip_unchanged),
+                      log=lambda msg: click.echo(msg, err=True))
+    try:
+        server = open_server(batcher, socket_path=socket_path or DEFAULT_SOCKET, host=host, port=port)
+    except OSError as e:
+        batcher.close()
+        _fail([f"Error starting server: {e}"])
+
+    signal.signal(signal.SIGTERM, _interrupt)
+    click.echo(f"Listening on {server.address}", err=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+    totals = batcher.totals
+    click.echo(f"Done — {totals['created']} created, {totals['updated']} updated in {mongo_db}.{mongo_collection} "
+               f"from {totals['requests']} requests")
+
+
+@main.command()
+@click.option("-i", "--input", "input_files", required=True, multiple=True,
+              help="Input file (.csv, .tsv, .yaml, .yml, .jsonl, .ndjson), directory or glob; repeatable. "
+                   "Use - to read from stdin")
+@click.option("--format", "input_format", default=None, type=click.Choice(STREAM_FORMATS),
+              help="Format of records read from stdin (default: sniffed from the first line)")
+@click.option("--socket", "socket_path", envvar="SAMPLENATOR_SOCKET", default=None,
+              type=click.Path(dir_okay=False),
+              help="Unix socket of a running serve (env: SAMPLENATOR_SOCKET; "
+                   "default: samplenator.sock in the temp dir)")
+@click.option("--url", envvar="SAMPLENATOR_URL", default=None,
+              help="Base URL of a serve --port instead of a socket, e.g. http://127.0.0.1:8765 (env: SAMPLENATOR_URL)")
+@click.option("--timeout", default=30.0, show_default=True, type=click.FloatRange(min=0),
+              help="Seconds to wait for the server to write the records")
+def send(input_files, input_format, socket_path, url, timeout):
+    """Forward records to a running serve, one request per input file."""
+    from samplenator_cli.client import DEFAULT_SOCKET, send_records
+    if "-" in input_files and len(input_files) > 1:
+        raise click.BadParameter("stdin (-) cannot be combined with other inputs", param_hint="'-i' / '--input'")
+    paths = ["-"] if input_files == ("-",) else _input_paths(input_files)
+
+    errors, written = [], 0
+    for path in paths:
+        prefix = f"{path}: " if len(paths) > 1 else ""
+        try:
+            if path == "-":
+                records = list(iter_stream(click.open_file("-", encoding="utf-8"), input_format))
+            else:
+                records = list(iter_file(path))
+        except READ_ERRORS as e:
+            _fail([f"{prefix}Error reading file: {e}"])
+        try:
+            reply = send_records(records, socket_path=socket_path, url=url, timeout=timeout)
+        except (OSError, ValueError) as e:
+            _fail([f"Error sending to {url or socket_path or DEFAULT_SOCKET}: {e}"])
+        written += reply["written"]
+        errors.extend(f"{prefix}{msg}" for msg in reply["errors"])
+
+    for msg in errors:
+        click.echo(msg, err=True)
+    click.echo(f"Done — {written} rows written")
+    if errors:
+        sys.exit(1)
+
+
+
+def _iter_sample_ids(sample_ids, paths):
+    from samplenator_cli.status import read_sample_ids
+    yield from sample_ids
+    for path in paths:
+        with click.open_file(path, encoding="utf-8") as f:
+            yield from read_sample_ids(f)
+
+
+@main.command()
+@click.argument("sample_ids", nargs=-1)
+@click.option("-i", "--input", "input_files", multiple=True,
+              type=click.Path(exists=True, dir_okay=False, allow_dash=True),
+              help="File of sample ids, one per line, or - for stdin; repeatable")
+@click.option("--group-id", default=None, help="Only samples with this group_id")
+@click.option("--sequencing-run-id", default=None, help="Only samples with this sequencing_run_id")
+@click.option("--system", "systems", multiple=True,
+              help="Include the systems.<name> section of this system; repeatable")
+@click.option("--timestamps/--no-timestamps", default=True, show_default=True,
+              help="Include the timestamps section")
+@click.option("--format", "output_format", default="ndjson", show_default=True,
+              type=click.Choice(["ndjson", "table"]), help="One JSON document per line, or an aligned table")
+@click.option("--chunk-size", default=500, show_default=True, type=click.IntRange(min=1),
+              help="Sample ids looked up per $in query")
+@mongo_options
+@config_option
+def status(sample_ids, input_files, group_id, sequencing_run_id, systems, timestamps, output_format, chunk_size,
+           mongo_uri, mongo_db, mongo_collection, config_path):
+    """Look up the current status of samples by id, group or sequencing run."""
+    cfg = load_config(config_path)
+    known_systems = getattr(cfg, "KNOWN_SYSTEMS", None)
+    systems = [system.lower() for system in systems]
+    for system in systems:
+        if known_systems is not None and system not in known_systems:
+            raise click.BadParameter(f"unknown system {system!r}: must be one of {known_systems}",
+                                     param_hint="'--system'")
+    if not (sample_ids or input_files or group_id or sequencing_run_id):
+        raise click.UsageError("Give sample ids as arguments or with -i, or filter with --group-id or "
+                               "--sequencing-run-id")
+    mongo_uri, mongo_db, mongo_collection = resolve_mongo(cfg, mongo_uri, mongo_db, mongo_collection)
+
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+    from samplenator_cli.status import dump_status, format_table, iter_status, sample_filter, status_projection
+    client = MongoClient(mongo_uri)
+    filters = sample_filter(cfg, group_id, sequencing_run_id)
+    ids = _iter_sample_ids(sample_ids, input_files) if sample_ids or input_files else None
+    missing = []
+    docs = iter_status(client[mongo_db][mongo_collection], ids, status_projection(systems, timestamps), filters,
+                       chunk_size=chunk_size, missing=missing)
+    try:
+        if output_format == "table":
+            click.echo(format_table(list(docs), systems))
         else:
-            inserted += 1  # actually "updated"
+            for doc in docs:
+                click.echo(dump_status(doc), nl=False)
+    except PyMongoError as e:
+        _fail([f"Error reading from MongoDB: {e}"])
+    for sample_id in missing:
+        click.echo(f"Not found: {sample_id}", err=True)
+    if missing:
+        sys.exit(1)
+
+
+@main.command("migrate-timeline")
+@mongo_options
+@config_option
+@events_options
+@click.option("--batch-size", default=500, show_default=True, type=click.IntRange(min=1),
+              help="Sample documents migrated per round trip")
+def migrate_timeline(mongo_uri, mongo_db, mongo_collection, config_path, events_collection, timeline_window,
+                     batch_size):
+    """Move existing timeline arrays into the events collection."""
+    cfg = load_config(config_path)
+    mongo_uri, mongo_db, mongo_collection = resolve_mongo(cfg, mongo_uri, mongo_db, mongo_collection)
+    events_collection, timeline_window = resolve_events(cfg, events_collection, timeline_window)
+
+    from pymongo import MongoClient
+    from samplenator_cli.events import ensure_event_indexes
+    from samplenator_cli.events import migrate_timeline as run_migration
+    client = MongoClient(mongo_uri)
+    events = client[mongo_db][events_collection]
+    ensure_event_indexes(events)
+    totals = run_migration(client[mongo_db][mongo_collection], events, timeline_window, batch_size)
+    click.echo(f"Done — moved {totals['events']} timeline entries from {totals['samples']} samples "
+               f"to {mongo_db}.{events_collection}")
 
-    click.echo(f"Done — {upserted} created, {inserted} updated in {mongo_db}.{mongo_collection}")
+
+@main.group()
+def rollups():
+    """Maintain the per-run and per-group rollups collection."""
+
+
+@rollups.command("rebuild")
+@mongo_options
+@config_option
+@click.option("--rollups-collection", envvar="SAMPLENATOR_ROLLUPS_COLLECTION", default=None,
+              help="Rollups collection name (env: SAMPLENATOR_ROLLUPS_COLLECTION)")
+def rollups_rebuild(mongo_uri, mongo_db, mongo_collection, config_path, rollups_collection):
+    """Recompute every rollup from the sample documents."""
+    cfg = load_config(config_path)
+    mongo_uri, mongo_db, mongo_collection = resolve_mongo(cfg, mongo_uri, mongo_db, mongo_collection)
+    rollups_collection = resolve_rollups(cfg, rollups_collection)
+
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+    from samplenator_cli.rollups import rebuild_rollups
+    client = MongoClient(mongo_uri)
+    try:
+        totals = rebuild_rollups(client[mongo_db][mongo_collection], client[mongo_db][rollups_collection])
+    except PyMongoError as e:
+        _fail([f"Error rebuilding rollups: {e}"])
+    click.echo(f"Done — {totals['rollups']} rollups from {totals['samples']} samples "
+               f"in {mongo_db}.{rollups_collection}")
+
+
+@main.group()
+def indexes():
+    """Create or verify the MongoDB indexes ingestion relies on."""
+
+
+@indexes.command("ensure")
+@mongo_options
+@config_option
+@click.option("--event-log", is_flag=True, help="Also index the events collection")
+@events_options
+def indexes_ensure(mongo_uri, mongo_db, mongo_collection, config_path, event_log, events_collection,
+                   timeline_window):
+    """Create any missing indexes (idempotent)."""
+    cfg = load_config(config_path)
+    mongo_uri, mongo_db, mongo_collection = resolve_mongo(cfg, mongo_uri, mongo_db, mongo_collection)
+
+    from pymongo import MongoClient
+    from pymongo.errors import OperationFailure
+    from samplenator_cli.indexes import ensure_indexes
+    client = MongoClient(mongo_uri)
+    try:
+        names = ensure_indexes(client[mongo_db][mongo_collection], cfg)
+    except OperationFailure as e:
+        click.echo(f"Error creating indexes: {e}", err=True)
+        sys.exit(1)
+    if event_log:
+        from samplenator_cli.events import ensure_event_indexes
+        events_collection, _ = resolve_events(cfg, events_collection, timeline_window)
+        ensure_event_indexes(client[mongo_db][events_collection])
+        names.append(f"{events_collection}.sample_id_started_at")
+    click.echo(f"Done — {len(names)} indexes present on {mongo_db}.{mongo_collection}: {', '.join(names)}")
+
+
+@indexes.command("check")
+@mongo_options
+@config_option
+def indexes_check(mongo_uri, mongo_db, mongo_collection, config_path):
+    """Verify required indexes exist and the upsert filter uses an index."""
+    cfg = load_config(config_path)
+    mongo_uri, mongo_db, mongo_collection = resolve_mongo(cfg, mongo_uri, mongo_db, mongo_collection)
+
+    from pymongo import MongoClient
+    from samplenator_cli.indexes import check_indexes
+    client = MongoClient(mongo_uri)
+    problems = check_indexes(client[mongo_db][mongo_collection], cfg)
+    if problems:
+        _fail(problems)
+    click.echo(f"OK — indexes on {mongo_db}.{mongo_collection} match the ingest requirements")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,49 @@
+import json
+import os
+import socket
+import tempfile
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "samplenator.sock")
+DEFAULT_TIMEOUT = 30.0
+
+
+def encode_records(records) -> bytes:
+    """Records as the NDJSON body `serve` accepts."""
+    return "".join(json.dumps(record, default=str) + "\n" for record in records).encode("utf-8")
+
+
+def send_unix(path: str, payload: bytes, timeout: float = DEFAULT_TIMEOUT) -> dict:
+    """Send an NDJSON payload to a `serve` Unix socket and return its reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(payload)
+        # End of request; the reply comes once the records have been flushed
+        sock.shutdown(socket.SHUT_WR)
+        data = b"".join(iter(lambda: sock.recv(65536), b""))
+    if not data:
+        raise OSError(f"{path}: connection closed without a reply")
+    return json.loads(data)
+
+
+def send_http(url: str, payload: bytes, timeout: float = DEFAULT_TIMEOUT) -> dict:
+    """POST an NDJSON payload to a `serve --port` endpoint and return its reply."""
+    from urllib.error import HTTPError
+    from urllib.request import Request, urlopen
+    request = Request(f"{url.rstrip('/')}/records", data=payload, method="POST",
+                      headers={"Content-Type": "application/x-ndjson"})
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except HTTPError as e:
+        # Rejected requests still carry a JSON reply with their errors
+        with e:
+            return json.loads(e.read())
+
+
+def send_records(records, socket_path: str = None, url: str = None, timeout: float = DEFAULT_TIMEOUT) -> dict:
+    """Forward records to a running `serve`, over HTTP if `url` is given."""
+    payload = encode_records(records)
+    if url:
+        return send_http(url, payload, timeout)
+    return send_unix(socket_path or DEFAULT_SOCKET, payload, timeout)
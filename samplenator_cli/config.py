@@ -130,3 +130,22 @@ STATUS_MAP = {
 MONGO_URI        = "mongodb://localhost:27017"
 MONGO_DB         = "bjorn"
 MONGO_COLLECTION = "sample_tracking"
+
+# ---------------------------------------------------------------------------
+# Event log (upload --event-log)
+# ---------------------------------------------------------------------------
+# Timeline entries go to an append-only collection; sample documents keep
+# only the most recent TIMELINE_WINDOW entries.
+# ---------------------------------------------------------------------------
+
+EVENTS_COLLECTION = "sample_events"
+TIMELINE_WINDOW   = 50
+
+# ---------------------------------------------------------------------------
+# Rollups (--rollups)
+# ---------------------------------------------------------------------------
+# Per sequencing run and per group counts of samples by queue status and by
+# system status, kept up to date with $inc as records are written.
+# ---------------------------------------------------------------------------
+
+ROLLUPS_COLLECTION = "sample_rollups"
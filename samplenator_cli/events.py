@@ -0,0 +1,82 @@
+from pymongo import ASCENDING, UpdateOne
+
+from samplenator_cli.ingest import batched, utc_now
+
+DEFAULT_TIMELINE_WINDOW = 50
+MIGRATED_FLAG = "timestamps.events_migrated_at"
+
+
+def ensure_event_indexes(events) -> None:
+    events.create_index([("sample_id", ASCENDING), ("started_at", ASCENDING)], name="sample_id_started_at")
+
+
+def split_timeline(update: dict, window: int):
+    """Return (update, entries) with the timeline push bounded to `window` entries."""
+    push = update.get("$push", {}).get("timeline")
+    if push is None:
+        return update, []
+    entries = list(push["$each"]) if isinstance(push, dict) and "$each" in push else [push]
+    update = dict(update)
+    update["$push"] = dict(update["$push"])
+    update["$push"]["timeline"] = {"$each": entries, "$slice": -window}
+    return update, entries
+
+
+class EventLog:
+    """Send timeline entries to an append-only events collection.
+
+    The sample document keeps only the most recent `window` timeline entries
+    (`$push` with `$slice`); every entry is also inserted, with its sample_id,
+    into `events` once the sample upsert that carried it has been applied.
+    """
+
+    def __init__(self, events, window: int = DEFAULT_TIMELINE_WINDOW):
+        self.events = events
+        self.window = window
+
+    def split(self, batch: list):
+        new_batch, events = [], []
+        for rows, filt, update in batch:
+            update, entries = split_timeline(update, self.window)
+            new_batch.append((rows, filt, update))
+            events.append([{"sample_id": filt["sample_id"], **entry} for entry in entries])
+        return new_batch, events
+
+    def insert(self, events: list, applied) -> None:
+        docs = [doc for index in applied for doc in events[index]]
+        if docs:
+            self.events.insert_many(docs, ordered=True)
+
+
+def migrate_timeline(collection, events, window: int = DEFAULT_TIMELINE_WINDOW,
+                     batch_size: int = 500) -> dict:
+    """Copy existing `timeline` arrays into `events` and trim them to `window`.
+
+    Documents are marked with `timestamps.events_migrated_at` and skipped on
+    later runs, so the migration can be re-run; an interrupted run copies the
+    batch that was in flight again. Run it before switching writers to
+    `--event-log`, since entries already in the events collection are not
+    recognised here. Trimming uses `$push` with an empty `$each` and `$slice`,
+    so entries pushed while the migration runs are not lost.
+    """
+    query = {MIGRATED_FLAG: {"$exists": False}, "timeline.0": {"$exists": True}}
+    cursor = collection.find(query, {"sample_id": 1, "timeline": 1})
+    totals = {"samples": 0, "events": 0}
+    for docs in batched(cursor, batch_size):
+        now = utc_now()
+        event_docs = [
+            {"sample_id": doc["sample_id"], **entry}
+            for doc in docs for entry in doc.get("timeline", [])
+        ]
+        if event_docs:
+            events.insert_many(event_docs, ordered=True)
+        collection.bulk_write([
+            UpdateOne(
+                {"_id": doc["_id"], MIGRATED_FLAG: {"$exists": False}},
+                {"$push": {"timeline": {"$each": [], "$slice": -window}}, "$set": {MIGRATED_FLAG: now}},
+            )
+            for doc in docs
+        ], ordered=False)
+        totals["samples"] += len(docs)
+        totals["events"] += len(event_docs)
+    return totals
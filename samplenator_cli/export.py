@@ -0,0 +1,54 @@
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+from samplenator_cli.ingest import iter_json_lines
+
+
+def dump_item(item) -> str:
+    """One (rows, filter, update) item as a compact JSON line."""
+    rows, filt, update = item
+    return json.dumps({"rows": rows, "filter": filt, "update": update}, separators=(",", ":"),
+                      ensure_ascii=False) + "\n"
+
+
+def write_export(items, f) -> int:
+    """Write items to the text stream `f` as they arrive; returns the number of rows exported."""
+    rows = 0
+    for item in items:
+        f.write(dump_item(item))
+        rows += len(item[0])
+    return rows
+
+
+@contextmanager
+def open_export(path: str):
+    """Open `path` (`-` for stdout) for writing an export.
+
+    A file is written under a temporary name and only renamed into place if
+    the block exits cleanly, so a failed run never leaves a partial export.
+    """
+    if path == "-":
+        yield sys.stdout
+        return
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                               prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            yield f
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    os.replace(tmp, path)
+
+
+def iter_export(lines):
+    """Yield (rows, filter, update) items from the lines of an export, lazily."""
+    for n, doc in enumerate(iter_json_lines(lines), start=1):
+        if not isinstance(doc.get("filter"), dict) or not isinstance(doc.get("update"), dict):
+            raise ValueError(f"Update {n}: expected an object with 'filter' and 'update'")
+        # JSON turns (source, row) refs into lists; row_label expects tuples
+        rows = [tuple(ref) if isinstance(ref, list) else ref for ref in doc.get("rows", [])]
+        yield rows, doc["filter"], doc["update"]
@@ -0,0 +1,112 @@
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+# Plan stages that mean the upsert filter is answered from an index
+_INDEX_STAGES = {"IXSCAN", "EXPRESS_IXSCAN", "IDHACK", "COUNT_SCAN", "DISTINCT_SCAN"}
+
+
+def run_id_paths(cfg) -> list[str]:
+    """Where a sample's sequencing run id is stored: the top-level field, then each plain system's `ids`.
+
+    Checkpoint systems keep their ids per checkpoint, under names no config
+    lists, so they are only found through the top-level field.
+    """
+    checkpoint_systems = getattr(cfg, "CHECKPOINT_SYSTEMS", set())
+    return ["sequencing_run_id", *(f"systems.{system}.ids.sequencing_run_id" for system in cfg.KNOWN_SYSTEMS
+                                   if system not in checkpoint_systems)]
+
+
+def required_indexes(cfg) -> list[IndexModel]:
+    """Indexes the sample collection needs: the upsert key plus reader lookups."""
+    models = [
+        IndexModel([("sample_id", ASCENDING)], name="sample_id_unique", unique=True),
+        IndexModel([("group_id", ASCENDING)], name="group_id"),
+        IndexModel([("sequencing_run_id", ASCENDING)], name="sequencing_run_id"),
+    ]
+    # Sparse, so only samples with a run id in that system pay for them; they keep a run id lookup an index scan
+    for path in run_id_paths(cfg)[1:]:
+        models.append(IndexModel([(path, ASCENDING)], name=path.replace(".", "_"), sparse=True))
+    for system in cfg.KNOWN_SYSTEMS:
+        path = f"systems.{system}.last_seen_at"
+        models.append(IndexModel([(path, ASCENDING)], name=path.replace(".", "_")))
+    return models
+
+
+def _indexes_by_keys(collection) -> dict:
+    """{key pattern: (name, info)} of the collection's existing indexes."""
+    return {tuple(tuple(k) for k in info["key"]): (name, info)
+            for name, info in collection.index_information().items()}
+
+
+def ensure_indexes(collection, cfg) -> list[str]:
+    """Create any missing required indexes; returns the index names.
+
+    A required index whose key pattern already exists is left alone under
+    whatever name it has (e.g. `sample_id_1` from a manual `create_index`),
+    since creating it again under our name would conflict. An existing
+    non-unique `sample_id` index raises OperationFailure instead. Safe to run
+    on every deployment.
+    """
+    by_keys = _indexes_by_keys(collection)
+    names, missing = [], []
+    for model in required_indexes(cfg):
+        spec = model.document
+        found = by_keys.get(tuple(spec["key"].items()))
+        if found is None:
+            missing.append(model)
+            names.append(spec["name"])
+        elif spec.get("unique") and not found[1].get("unique"):
+            raise OperationFailure(
+                f"index {found[0]!r} on {next(iter(spec['key']))} must be unique; "
+                f"drop it and run again to create {spec['name']!r}"
+            )
+        else:
+            names.append(found[0])
+    if not missing:
+        return names
+    try:
+        collection.create_indexes(missing)
+    except OperationFailure as e:
+        if e.code == 11000:
+            raise OperationFailure(
+                f"cannot create unique sample_id index, duplicate sample documents exist: {e}", e.code
+            ) from e
+        raise
+    return names
+
+
+def _plan_stages(plan) -> list[str]:
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for key in ("inputStage", "queryPlan", "winningPlan"):
+            stages.extend(_plan_stages(plan.get(key)))
+        for child in plan.get("inputStages", []):
+            stages.extend(_plan_stages(child))
+    return stages
+
+
+def upsert_plan_stages(collection) -> list[str]:
+    """Stages of the winning plan for the upsert filter `{"sample_id": ...}`."""
+    explain = collection.find({"sample_id": "__samplenator_probe__"}).explain()
+    return _plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+
+
+def check_indexes(collection, cfg) -> list[str]:
+    """Return a list of problems: missing or mismatched indexes and a non-index upsert plan."""
+    problems = []
+    by_keys = _indexes_by_keys(collection)
+    for model in required_indexes(cfg):
+        spec = model.document
+        keys = tuple((k, v) for k, v in spec["key"].items())
+        found = by_keys.get(keys)
+        if found is None:
+            problems.append(f"missing index {spec['name']!r} on {', '.join(k for k, _ in keys)}")
+        elif spec.get("unique") and not found[1].get("unique"):
+            problems.append(f"index {found[0]!r} on {keys[0][0]} must be unique")
+
+    stages = upsert_plan_stages(collection)
+    if "COLLSCAN" in stages or not _INDEX_STAGES.intersection(stages):
+        problems.append(f"upsert filter on sample_id is not an index lookup (plan: {' > '.join(stages) or 'unknown'})")
+    return problems
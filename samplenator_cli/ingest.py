@@ -1,47 +1,319 @@
+import bz2
 import csv
+import gzip
+import io
+import json
+import lzma
+import os
+import re
+import time
 from datetime import datetime
-from urllib.parse import urlparse
+from itertools import islice
 
-import yaml
+from samplenator_cli.plan import compile_plan
+
+
+SUPPORTED_EXTENSIONS = (".csv", ".tsv", ".yaml", ".yml", ".jsonl", ".ndjson")
+
+# Compression suffixes that may follow a supported extension, e.g. `.csv.gz`
+COMPRESSION_EXTENSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz", ".zst": "zstd"}
+
+# Errors a malformed input can raise while it is being read (YAML errors are re-raised as ValueError)
+READ_ERRORS = (ValueError, OSError, EOFError, lzma.LZMAError)
+
+# Formats accepted for input that has no file name to dispatch on (stdin)
+STREAM_FORMATS = ("csv", "tsv", "yaml", "jsonl")
+
+_YAML_MAPPING_LINE = re.compile(r"""^[\w"'.-]+:(\s|$)""")
+
+VALIDATE_CHUNK = 1000
+
+
+def split_compression(path: str):
+    """Return (path without its compression suffix, compression name or None)."""
+    root, ext = os.path.splitext(path)
+    compression = COMPRESSION_EXTENSIONS.get(ext.lower())
+    return (root, compression) if compression else (path, None)
+
+
+def is_supported(path: str) -> bool:
+    return split_compression(path)[0].lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def _opener(compression):
+    if compression is None:
+        return open
+    if compression == "gzip":
+        return gzip.open
+    if compression == "bz2":
+        return bz2.open
+    if compression == "xz":
+        return lzma.open
+    try:
+        import zstandard
+    except ImportError as err:
+        raise ValueError("Reading .zst files requires the zstandard package "
+                         "(pip install samplenator-cli[zstd])") from err
+
+    def open_zstd(path, mode, encoding=None, newline=None):
+        if mode not in ("r", "rt"):
+            raise ValueError(f".zst files can only be opened for reading as text, not {mode!r}")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        raw = _ZstdReader(reader, zstandard.ZstdError)
+        return io.TextIOWrapper(io.BufferedReader(raw), encoding=encoding, newline=newline)
+    return open_zstd
+
+
+class _ZstdReader(io.RawIOBase):
+    """Raw stream over a zstandard reader that raises its `error` as ValueError, one of READ_ERRORS."""
+
+    def __init__(self, reader, error):
+        super().__init__()
+        self._reader = reader
+        self._error = error
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        try:
+            return self._reader.readinto(b)
+        except self._error as e:
+            raise ValueError(f"Invalid zstd data: {e}") from e
+
+    def close(self) -> None:
+        self._reader.close()
+        super().close()
+
+
+def open_text(path: str, newline=None):
+    """Open `path` as UTF-8 text, decompressing according to its suffix."""
+    return _opener(split_compression(path)[1])(path, "rt", encoding="utf-8", newline=newline)
+
+
+def file_format(path: str) -> str:
+    """The STREAM_FORMATS name of a supported file, e.g. "yaml" for `runs.yml.gz`."""
+    lower = split_compression(path)[0].lower()
+    if lower.endswith((".yaml", ".yml")):
+        return "yaml"
+    if lower.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "tsv" if lower.endswith(".tsv") else "csv"
 
 
 def parse_file(path: str) -> list[dict]:
-    lower = path.lower()
+    return list(iter_file(path))
+
+
+def iter_file(path: str):
+    """Return an iterator over the records in `path`, dispatching on extension.
+
+    Every format is read lazily: delimited and JSON Lines files row by row,
+    YAML one document at a time. A `.gz`, `.bz2`, `.xz` or `.zst` suffix is
+    decompressed as a stream. Unsupported extensions (or .zst without the
+    zstandard package) raise ValueError immediately rather than on first
+    iteration.
+    """
+    base, compression = split_compression(path)
+    lower = base.lower()
+    if not lower.endswith(SUPPORTED_EXTENSIONS):
+        raise ValueError(
+            f"Unsupported file extension: {path!r}. Use .csv, .tsv, .yaml, .yml, .jsonl or .ndjson, "
+            "optionally followed by .gz, .bz2, .xz or .zst"
+        )
+    opener = _opener(compression)
     if lower.endswith(".csv"):
-        return _read_delimited(path, delimiter=",")
+        return _iter_delimited(path, delimiter=",", opener=opener)
     elif lower.endswith(".tsv"):
-        return _read_delimited(path, delimiter="\t")
+        return _iter_delimited(path, delimiter="\t", opener=opener)
     elif lower.endswith(".yaml") or lower.endswith(".yml"):
-        with open(path, encoding="utf-8") as f:
-            data = yaml.safe_load(f)
+        return _iter_yaml(path, opener)
+    else:
+        return _iter_json_lines_file(path, opener)
+
+
+def _iter_yaml(path: str, opener=open):
+    with opener(path, "rt", encoding="utf-8") as f:
+        yield from iter_yaml_documents(load_yaml_all(f))
+
+
+def load_yaml_all(stream):
+    """Parse YAML documents one at a time, re-raising YAML errors as ValueError.
+
+    PyYAML is imported on first use, so CSV and JSON runs never load it, and
+    libyaml's C loader is used when PyYAML was built with it.
+    """
+    import yaml
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    try:
+        yield from yaml.load_all(stream, Loader=loader)
+    except yaml.YAMLError as e:
+        raise ValueError(str(e)) from e
+
+
+def iter_yaml_documents(documents):
+    """Flatten YAML documents into records.
+
+    A document may be a list of records or a single record, so both the
+    classic one-list file and a `---`-separated stream of records work.
+    Empty documents are skipped.
+    """
+    for data in documents:
+        if data is None:
+            continue
         if isinstance(data, list):
-            return [dict(row) for row in data]
-        raise ValueError(f"YAML file must contain a list of records, got {type(data).__name__}")
+            for row in data:
+                yield dict(row)
+        elif isinstance(data, dict):
+            yield data
+        else:
+            raise ValueError(f"YAML documents must be a list of records or a record, got {type(data).__name__}")
+
+
+def _iter_json_lines_file(path: str, opener=open):
+    with opener(path, "rt", encoding="utf-8") as f:
+        yield from iter_json_lines(f)
+
+
+def iter_json_lines(lines, start: int = 1):
+    """Parse one JSON object per line, skipping blank lines."""
+    for n, line in enumerate(lines, start=start):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {n}: invalid JSON: {e.msg}") from e
+        if not isinstance(record, dict):
+            raise ValueError(f"Line {n}: JSON Lines record must be an object, got {type(record).__name__}")
+        yield record
+
+
+def sniff_format(line: str) -> str:
+    """Guess the format of text input from its first non-blank line."""
+    line = line.strip()
+    if line.startswith("{"):
+        return "jsonl"
+    if line.startswith(("-", "%YAML")) or _YAML_MAPPING_LINE.match(line):
+        return "yaml"
+    try:
+        delimiter = csv.Sniffer().sniff(line, delimiters=",\t").delimiter
+    except csv.Error:
+        delimiter = "\t" if line.count("\t") > line.count(",") else ","
+    return "tsv" if delimiter == "\t" else "csv"
+
+
+class _Rewound:
+    """A text stream with the lines already read from it put back in front."""
+
+    def __init__(self, head: str, stream):
+        self._head = io.StringIO(head)
+        self._stream = stream
+
+    def read(self, size=-1):
+        data = self._head.read(size)
+        if size is None or size < 0:
+            return data + self._stream.read()
+        return data or self._stream.read(size)
+
+    def readline(self):
+        return self._head.readline() or self._stream.readline()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+
+def sniff_stream(stream, fmt: str = None):
+    """Return (format, stream) for an open text stream, sniffing the format if not given.
+
+    Only the first non-blank line is read to sniff, and the returned stream
+    still starts with it. The format is None for a stream with no content.
+    """
+    if fmt is not None:
+        return fmt, stream
+    skipped, line = "", stream.readline()
+    while line and not line.strip():
+        skipped, line = skipped + line, stream.readline()
+    if not line:
+        return None, stream
+    fmt = sniff_format(line)
+    # Leading blank lines keep JSON Lines numbering right but would become an empty CSV header
+    return fmt, _Rewound(line if fmt in ("csv", "tsv") else skipped + line, stream)
+
+
+def iter_stream(stream, fmt: str = None):
+    """Return an iterator over the records in an open text stream such as stdin.
+
+    `fmt` is one of STREAM_FORMATS. Without it the format is sniffed from the
+    first non-blank line, so nothing past that line is read before the first
+    record can be yielded.
+    """
+    fmt, stream = sniff_stream(stream, fmt)
+    if fmt is None:
+        return iter(())
+    if fmt not in STREAM_FORMATS:
+        raise ValueError(f"Unsupported input format: {fmt!r}. Use one of {', '.join(STREAM_FORMATS)}")
+    return _iter_text(stream, fmt)
+
+
+def _iter_text(f, fmt: str):
+    if fmt in ("csv", "tsv"):
+        for row in csv.DictReader(f, delimiter="," if fmt == "csv" else "\t"):
+            yield dict(row)
+    elif fmt == "yaml":
+        yield from iter_yaml_documents(load_yaml_all(f))
     else:
-        raise ValueError(f"Unsupported file extension: {path!r}. Use .csv, .tsv, .yaml, or .yml")
+        yield from iter_json_lines(f)
+
+
+def guard_read(rows, errors: list, source=None):
+    """Yield from `rows`; a read error part-way through is appended to `errors` and ends the stream."""
+    try:
+        yield from rows
+    except READ_ERRORS as e:
+        prefix = f"{source}: " if source is not None else ""
+        errors.append(f"{prefix}Error reading file: {e}")
 
 
 def _read_delimited(path: str, delimiter: str) -> list[dict]:
-    with open(path, newline="", encoding="utf-8") as f:
+    return list(_iter_delimited(path, delimiter))
+
+
+def _iter_delimited(path: str, delimiter: str, opener=open):
+    with opener(path, "rt", newline="", encoding="utf-8") as f:
         reader = csv.DictReader(f, delimiter=delimiter)
-        return [dict(row) for row in reader]
+        for row in reader:
+            yield dict(row)
 
 
 def resolve_aliases(rows: list[dict], aliases: dict) -> list[dict]:
+    return list(iter_aliases(rows, aliases))
+
+
+def iter_aliases(rows, aliases: dict):
     # Build reverse map: alias_lower → canonical
     reverse = {}
     for canonical, alias_list in aliases.items():
         for alias in alias_list:
             reverse[alias.lower()] = canonical
 
-    resolved = []
+    # Rows from one file share a header, so map each distinct key tuple once
+    headers = {}
     for row in rows:
-        new_row = {}
-        for key, value in row.items():
-            canonical = reverse.get(key.lower(), key)
-            new_row[canonical] = value
-        resolved.append(new_row)
-    return resolved
+        keys = tuple(row)
+        canonical = headers.get(keys)
+        if canonical is None:
+            if len(headers) >= 1024:
+                headers.clear()
+            # csv.DictReader files the values of an over-long row under the key None
+            canonical = headers[keys] = tuple(key if key is None else reverse.get(key.lower(), key) for key in keys)
+        yield dict(zip(canonical, row.values()))
 
 
 def validate_record(record: dict, required_fields: set, valid_statuses: set, known_systems=None) -> list[str]:
@@ -67,101 +339,130 @@ def validate_record(record: dict, required_fields: set, valid_statuses: set, kno
     return errors
 
 
-def build_mongo_update(record: dict, cfg) -> dict:
-    now = datetime.utcnow().isoformat() + "Z"
-    system = record["system"].lower()
-    status_raw = record["status"].lower()
-    status_compound = cfg.STATUS_MAP.get(status_raw, status_raw)
-
-    # IDs dict for the system section
-    ids = {}
-    if record.get("clarity_lims_id"):
-        ids["clarity_lims_id"] = record["clarity_lims_id"]
-    if record.get("sequencing_run_id"):
-        ids["sequencing_run_id"] = record["sequencing_run_id"]
-
-    # Determine queue_status for summary
-    if status_raw in ("ok", "completed"):
-        queue_status = "completed"
-    elif status_raw in ("fail", "failed"):
-        queue_status = "failed"
-    else:
-        queue_status = "in_progress"
-
-    # Base $set fields
-    set_fields = {
-        "sample_id": record["sample_id"],
-        "summary.current_step": record["message"],
-        "summary.queue_status": queue_status,
-        "summary.current_step_started_at": now,
-        "timestamps.updated_at": now,
-        "timestamps.last_event_at": now,
-    }
-    # Optional top-level sample fields
-    for field in ("group_id", "assay", "lab_id", "sample_type"):
-        if record.get(field):
-            set_fields[field] = record[field]
-
-    # Resolve URL from config masks
-    url_masks = getattr(cfg, "SYSTEM_URL_MASKS", {})
-    mask = url_masks.get(system)
-    if isinstance(mask, dict):
-        mask = mask.get(record.get("checkpoint", "default"))
-    try:
-        resolved_url = mask.format(**record) if mask else None
-    except KeyError:
-        parsed = urlparse(mask)
-        checkpoint = record.get("checkpoint", "")
-        resolved_url = f"{parsed.scheme}://{parsed.netloc}/{checkpoint}"
-
-    # System-specific fields
-    if system in cfg.CHECKPOINT_SYSTEMS:
-        checkpoint = record.get("checkpoint", "default")
-        prefix = f"systems.{system}.checkpoints.{checkpoint}"
-        set_fields.update({
-            f"{prefix}.status": status_compound,
-            f"{prefix}.message": record["message"],
-            f"systems.{system}.last_seen_at": now,
-        })
-        if resolved_url:
-            set_fields[f"{prefix}.url"] = resolved_url
-        if ids:
-            set_fields[f"{prefix}.ids"] = ids
-        if status_raw in ("started", "running"):
-            set_fields[f"{prefix}.started_at"] = now
-            set_fields[f"{prefix}.ended_at"] = None
-        elif status_raw in ("ok", "completed", "fail", "failed"):
-            set_fields[f"{prefix}.ended_at"] = now
-    else:
-        prefix = f"systems.{system}"
-        set_fields.update({
-            f"{prefix}.status": status_compound,
-            f"{prefix}.last_seen_at": now,
-            f"{prefix}.message": record["message"],
-        })
-        if resolved_url:
-            set_fields[f"{prefix}.url"] = resolved_url
-        if ids:
-            set_fields[f"{prefix}.ids"] = ids
-        if status_raw in ("started", "running"):
-            set_fields[f"{prefix}.started_at"] = now
-            set_fields[f"{prefix}.ended_at"] = None
-        elif status_raw in ("ok", "completed", "fail", "failed"):
-            set_fields[f"{prefix}.ended_at"] = now
-
-    # Timeline entry
-    timeline_entry = {
-        "name": record["message"],
-        "system": system,
-        "checkpoint": record.get("checkpoint"),
-        "status": status_compound,
-        "started_at": now,
-        "ended_at": None,
-        "message": record["message"],
-    }
-
-    return {
-        "$setOnInsert": {"timestamps.created_at": now},
-        "$set": set_fields,
-        "$push": {"timeline": timeline_entry},
-    }
+def row_label(ref) -> str:
+    # Row references are plain row numbers, or (source, row) pairs for multi-file input
+    if isinstance(ref, tuple):
+        return f"{ref[0]}: Row {ref[1]}"
+    return f"Row {ref}"
+
+
+def iter_valid_records(rows, cfg, errors: list, source=None):
+    """Validate and normalise rows as they stream in, yielding (ref, record)."""
+    return iter_normalised(iter_validated(rows, cfg, errors, source), cfg)
+
+
+def iter_validated(rows, cfg, errors: list, source=None, chunk_size: int = VALIDATE_CHUNK):
+    """Yield (ref, record) for valid rows, as they stream in.
+
+    Rows are validated in chunks of `chunk_size` (see `IngestPlan.validate_batch`).
+    Validation messages are appended to `errors` as `Row N: ...` (prefixed
+    with `source` when given). Once a row has failed, later rows are still
+    validated so every error is reported, but no further records are yielded.
+    """
+    plan = compile_plan(cfg)
+    start = 1
+    for chunk in batched(rows, chunk_size):
+        failures = plan.validate_batch(chunk)
+        for offset, record in enumerate(chunk):
+            i = start + offset
+            ref = (source, i) if source is not None else i
+            row_errors = failures.get(offset)
+            if row_errors:
+                errors.extend(f"{row_label(ref)}: {err}" for err in row_errors)
+                continue
+            if errors:
+                continue
+            yield ref, record
+        start += len(chunk)
+
+
+def iter_quarantined(rows, cfg, reject, source=None, chunk_size: int = VALIDATE_CHUNK):
+    """Resolve aliases and validate raw rows, yielding (ref, record) for the valid ones.
+
+    Unlike `iter_validated`, an invalid row does not stop the stream: it is
+    passed to `reject(ref, row, messages)` as it was read, before alias
+    resolution, and the rows after it keep flowing.
+    """
+    plan = compile_plan(cfg)
+    start = 1
+    for raw_chunk in batched(rows, chunk_size):
+        chunk = list(iter_aliases(raw_chunk, cfg.FIELD_ALIASES))
+        failures = plan.validate_batch(chunk)
+        for offset, record in enumerate(chunk):
+            i = start + offset
+            ref = (source, i) if source is not None else i
+            row_errors = failures.get(offset)
+            if row_errors:
+                reject(ref, raw_chunk[offset], row_errors)
+            else:
+                yield ref, record
+        start += len(chunk)
+
+
+def iter_normalised(records, cfg):
+    plan = compile_plan(cfg)
+    for ref, record in records:
+        yield ref, plan.normalise(record)
+
+
+def build_items(records, cfg, timestamp_every: int = 1000, timestamp_max_age: float = 1.0):
+    # Rows share a timestamp for up to `timestamp_every` rows and `timestamp_max_age` seconds, so a slow
+    # stream never stamps late rows with an early time; monotonic() costs far less than formatting utc_now()
+    plan = compile_plan(cfg)
+    now, taken, n = utc_now(), time.monotonic(), 0
+    for ref, record in records:
+        if n >= timestamp_every or time.monotonic() - taken >= timestamp_max_age:
+            now, taken, n = utc_now(), time.monotonic(), 0
+        n += 1
+        yield [ref], {"sample_id": record["sample_id"]}, plan.build(record, now)
+
+
+def iter_updates(rows, cfg, errors: list, source=None):
+    """Validate, normalise and build (rows, filter, update) items as rows stream in."""
+    return build_items(iter_valid_records(rows, cfg, errors, source), cfg)
+
+
+def utc_now() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def build_mongo_update(record: dict, cfg, now: str = None) -> dict:
+    return compile_plan(cfg).build(record, now or utc_now())
+
+
+def batched(items, size: int):
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def coalesce_updates(items):
+    """Fold (rows, filter, update) items for the same sample into one update.
+
+    `$set` maps are merged in input order (last writer wins per field path),
+    `$setOnInsert` keeps the first value seen, and `$push` entries are combined
+    into a single `$each` so the timeline order matches sequential upserts.
+    """
+    merged = {}
+    for rows, filt, update in items:
+        key = filt["sample_id"]
+        if key not in merged:
+            merged[key] = (list(rows), filt, {"$setOnInsert": {}, "$set": {}, "$push": {}})
+        else:
+            merged[key][0].extend(rows)
+        target = merged[key][2]
+        for path, value in update.get("$setOnInsert", {}).items():
+            target["$setOnInsert"].setdefault(path, value)
+        target["$set"].update(update.get("$set", {}))
+        for path, value in update.get("$push", {}).items():
+            push = target["$push"].setdefault(path, {"$each": []})
+            if isinstance(value, dict) and "$each" in value:
+                push["$each"].extend(value["$each"])
+                push.update({k: v for k, v in value.items() if k != "$each"})
+            else:
+                push["$each"].append(value)
+    return [(rows, filt, {op: fields for op, fields in update.items() if fields})
+            for rows, filt, update in merged.values()]
@@ -0,0 +1,93 @@
+import bisect
+import json
+import math
+import os
+import threading
+
+
+def _fingerprint(path: str) -> dict:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": st.st_mtime}
+
+
+def merge_ranges(ranges: list, rows) -> list:
+    """Add row numbers to a sorted list of inclusive [start, end] ranges."""
+    spans = sorted([list(r) for r in ranges] + [[row, row] for row in set(rows)])
+    merged = []
+    for start, end in spans:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def in_ranges(ranges: list, row: int) -> bool:
+    i = bisect.bisect_right(ranges, [row, math.inf]) - 1
+    return i >= 0 and ranges[i][1] >= row
+
+
+class Journal:
+    """Rows of each input file that have been written, saved after every batch.
+
+    Committed rows are kept per file as inclusive [start, end] ranges, so a
+    run that went through in order is a single range however large the file.
+    With `resume`, rows already in the journal are skipped; a file whose size
+    or mtime has changed since the journal was written is refused, since its
+    row numbers may no longer mean the same rows.
+    """
+
+    def __init__(self, path: str, sources: list, resume: bool = False):
+        self.path = path
+        # Single-file runs use plain row numbers as refs
+        self.default_source = sources[0] if len(sources) == 1 else None
+        self.skipped = 0
+        self._lock = threading.Lock()
+        previous = {}
+        if resume and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                previous = json.load(f).get("files", {})
+        self.files = {}
+        for source in sources:
+            fingerprint = _fingerprint(source)
+            entry = previous.get(source)
+            if entry is not None and {k: entry.get(k) for k in fingerprint} != fingerprint:
+                raise ValueError(f"{source} has changed since the journal was written; "
+                                 "re-run without --resume to start over")
+            committed = entry["committed"] if entry is not None else []
+            self.files[source] = {**fingerprint, "committed": committed}
+        self.save()
+
+    def _locate(self, ref):
+        if isinstance(ref, tuple):
+            return ref[0], ref[1]
+        return self.default_source, ref
+
+    def filter_new(self, records):
+        """Yield the (ref, record) pairs whose rows are not in the journal yet."""
+        for ref, record in records:
+            source, row = self._locate(ref)
+            if in_ranges(self.files[source]["committed"], row):
+                self.skipped += 1
+                continue
+            yield ref, record
+
+    def commit(self, refs) -> None:
+        """Record written rows and save; safe to call from writer threads."""
+        by_source = {}
+        for ref in refs:
+            source, row = self._locate(ref)
+            by_source.setdefault(source, []).append(row)
+        if not by_source:
+            return
+        with self._lock:
+            for source, rows in by_source.items():
+                entry = self.files[source]
+                entry["committed"] = merge_ranges(entry["committed"], rows)
+            self.save()
+
+    def save(self) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f)
+        os.replace(tmp, self.path)
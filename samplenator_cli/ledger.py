@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from samplenator_cli.ingest import batched
+
+_LOOKUP_CHUNK = 500
+
+
+def record_hash(record: dict, key: tuple = ()) -> str:
+    """Stable hash of a normalised record together with `key`, such as the target it is written to."""
+    payload = json.dumps([*key, record], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def ledger_target(mongo_uri: str, mongo_db: str, mongo_collection: str) -> str:
+    """The target ledger entries are keyed on: hosts, database and collection, without credentials or options."""
+    scheme, _, rest = mongo_uri.partition("://")
+    hosts = rest.rsplit("@", 1)[-1].split("/", 1)[0].split("?", 1)[0]
+    return f"{scheme}://{hosts}/{mongo_db}.{mongo_collection}"
+
+
+class Ledger:
+    """SQLite ledger of already-ingested records, keyed by content hash.
+
+    Hashes cover the record and `target`, so one ledger can serve uploads to
+    several databases or collections. With `by_position`, they also cover the
+    input file name and row, and only the same row of a re-run file is
+    skipped; otherwise an identical record at any row is. `filter_new` drops
+    records whose hash is in the ledger (or was already seen earlier in the
+    same run). Hashes are only stored once `commit` is called with the rows
+    that were actually written, so failed writes are retried on the next run.
+    Entries older than `max_age_days`, and the oldest entries beyond
+    `max_entries`, are evicted when the ledger is opened.
+    """
+
+    def __init__(self, path: str, target: str = "", by_position: bool = False, max_age_days: float = None,
+                 max_entries: int = None):
+        self.path = path
+        self.target = target
+        self.by_position = by_position
+        self.max_age_days = max_age_days
+        self.max_entries = max_entries
+        self.skipped = 0
+        self._in_flight = {}
+        self._run_hashes = set()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ingested (hash TEXT PRIMARY KEY, ingested_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ingested_at_idx ON ingested (ingested_at)")
+        self.evict()
+
+    def evict(self) -> None:
+        with self._lock, self._conn:
+            if self.max_age_days is not None:
+                cutoff = time.time() - self.max_age_days * 86400
+                self._conn.execute("DELETE FROM ingested WHERE ingested_at < ?", (cutoff,))
+            if self.max_entries is not None:
+                self._conn.execute(
+                    "DELETE FROM ingested WHERE hash IN ("
+                    " SELECT hash FROM ingested ORDER BY ingested_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def _known(self, hashes: list) -> set:
+        placeholders = ",".join("?" * len(hashes))
+        with self._lock:
+            cur = self._conn.execute(f"SELECT hash FROM ingested WHERE hash IN ({placeholders})", hashes)
+            return {row[0] for row in cur}
+
+    def _key(self, ref, source) -> tuple:
+        if not self.by_position:
+            return (self.target,)
+        # Row references are plain row numbers of `source`, or (source, row) pairs for multi-file input
+        name, row = ref if isinstance(ref, tuple) else (source, ref)
+        return self.target, os.path.basename(name or ""), row
+
+    def filter_new(self, records, source: str = None):
+        """Yield the (ref, record) pairs that have not been ingested before; `source` names a single input."""
+        for chunk in batched(records, _LOOKUP_CHUNK):
+            hashed = [(ref, record, record_hash(record, self._key(ref, source))) for ref, record in chunk]
+            known = self._known([h for _, _, h in hashed])
+            for ref, record, digest in hashed:
+                if digest in known or digest in self._run_hashes:
+                    self.skipped += 1
+                    continue
+                self._run_hashes.add(digest)
+                self._in_flight[ref] = digest
+                yield ref, record
+
+    def commit(self, refs) -> None:
+        """Store the hashes of written rows; safe to call from writer threads."""
+        now = time.time()
+        with self._lock:
+            rows = [(self._in_flight.pop(ref), now) for ref in refs if ref in self._in_flight]
+            if rows:
+                with self._conn:
+                    self._conn.executemany("INSERT OR REPLACE INTO ingested VALUES (?, ?)", rows)
+
+    def close(self) -> None:
+        self._conn.close()
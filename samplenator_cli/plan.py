@@ -0,0 +1,256 @@
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+_QUEUE_STATUS = {
+    "ok": "completed", "completed": "completed",
+    "fail": "failed", "failed": "failed",
+}
+_STARTED = frozenset({"started", "running"})
+_ENDED = frozenset({"ok", "completed", "fail", "failed"})
+_TOP_LEVEL_FIELDS = ("group_id", "sequencing_run_id", "assay", "lab_id", "sample_type")
+
+
+class _Target(NamedTuple):
+    """Precomputed $set paths and URL template for one (system, checkpoint)."""
+    checkpointed: bool
+    status: str
+    message: str
+    last_seen: str
+    url: str
+    ids: str
+    started_at: str
+    ended_at: str
+    mask: str
+    fallback_base: str
+
+
+@dataclass(frozen=True)
+class IngestPlan:
+    """Everything row processing needs from a config module, computed once.
+
+    `build` produces exactly the update documents of `build_mongo_update`, and
+    `validate` the messages of `validate_record`, without re-deriving field
+    paths, URL masks or error text per row. Build one with `compile_plan`.
+
+    The config-derived fields never change, but the plan is not immutable:
+    checkpoint names come from the data, so `_targets` is a cache of compiled
+    (system, checkpoint) targets that `target` fills on first use. Two threads
+    compiling the same target at once store equal values, so sharing a plan
+    across writer threads is safe.
+    """
+    status_map: dict
+    checkpoint_systems: frozenset
+    url_masks: dict
+    required_fields: tuple
+    valid_statuses: frozenset
+    known_systems: frozenset
+    known_fields: tuple
+    status_error: str
+    system_error: str
+    _targets: dict = field(default_factory=dict, compare=False, repr=False)
+
+    def target(self, system: str, checkpoint: str) -> _Target:
+        key = (system, checkpoint)
+        target = self._targets.get(key)
+        if target is None:
+            target = self._targets[key] = self._compile_target(system, checkpoint)
+        return target
+
+    def _compile_target(self, system: str, checkpoint: str) -> _Target:
+        mask = self.url_masks.get(system)
+        if isinstance(mask, dict):
+            mask = mask.get(checkpoint)
+        fallback_base = None
+        if mask:
+            parsed = urlparse(mask)
+            fallback_base = f"{parsed.scheme}://{parsed.netloc}/"
+        checkpointed = system in self.checkpoint_systems
+        prefix = f"systems.{system}.checkpoints.{checkpoint}" if checkpointed else f"systems.{system}"
+        return _Target(
+            checkpointed=checkpointed,
+            status=f"{prefix}.status",
+            message=f"{prefix}.message",
+            last_seen=f"systems.{system}.last_seen_at",
+            url=f"{prefix}.url",
+            ids=f"{prefix}.ids",
+            started_at=f"{prefix}.started_at",
+            ended_at=f"{prefix}.ended_at",
+            mask=mask,
+            fallback_base=fallback_base,
+        )
+
+    def validate(self, record: dict) -> list[str]:
+        errors = []
+        for name in self.required_fields:
+            value = record.get(name)
+            if value is None or str(value).strip() == "":
+                errors.append(f"missing required field: {name!r}")
+        status = record.get("status")
+        if status is not None and str(status).strip().lower() not in self.valid_statuses:
+            errors.append(f"invalid status {status!r}: {self.status_error}")
+        if self.known_systems is not None:
+            system = record.get("system")
+            if system is not None and str(system).strip().lower() not in self.known_systems:
+                errors.append(f"unknown system {system!r}: {self.system_error}")
+        return errors
+
+    def validate_batch(self, records: list) -> dict:
+        """Validate a chunk of records column by column.
+
+        Returns {index: messages} for the failing records only, with the same
+        messages in the same order as `validate`. Each column is reduced to its
+        distinct values, which are checked once, so a chunk costs a few set
+        operations plus one scan per column that actually holds a bad value.
+        """
+        failures = {}
+        try:
+            for name in self.required_fields:
+                column = [record.get(name) for record in records]
+                bad = _blank_values(set(column))
+                if bad:
+                    message = f"missing required field: {name!r}"
+                    for i in _indexes(column, bad):
+                        failures.setdefault(i, []).append(message)
+            self._check_column(records, "status", self.valid_statuses, "invalid status", self.status_error,
+                               failures)
+            if self.known_systems is not None:
+                self._check_column(records, "system", self.known_systems, "unknown system", self.system_error,
+                                   failures)
+        except TypeError:
+            # Unhashable values (nested YAML) cannot go through sets; check row by row
+            failures = {}
+            for i, record in enumerate(records):
+                errors = self.validate(record)
+                if errors:
+                    failures[i] = errors
+        return failures
+
+    @staticmethod
+    def _check_column(records, name, allowed, label, hint, failures) -> None:
+        column = [record.get(name) for record in records]
+        distinct = set(column)
+        distinct.discard(None)
+        bad = {v for v in distinct if str(v).strip().lower() not in allowed}
+        if bad:
+            for i in _indexes(column, bad):
+                failures.setdefault(i, []).append(f"{label} {column[i]!r}: {hint}")
+
+    def normalise(self, record: dict) -> dict:
+        row = {}
+        for name in self.known_fields:
+            value = record.get(name)
+            if value is not None:
+                value = str(value).strip()
+                if value:
+                    row[name] = value
+        if "status" in row:
+            row["status"] = row["status"].lower()
+        if "system" in row:
+            row["system"] = row["system"].lower()
+        return row
+
+    def build(self, record: dict, now: str) -> dict:
+        system = record["system"].lower()
+        status_raw = record["status"].lower()
+        status_compound = self.status_map.get(status_raw, status_raw)
+        message = record["message"]
+        target = self.target(system, record.get("checkpoint", "default"))
+
+        ids = {}
+        if record.get("clarity_lims_id"):
+            ids["clarity_lims_id"] = record["clarity_lims_id"]
+        if record.get("sequencing_run_id"):
+            ids["sequencing_run_id"] = record["sequencing_run_id"]
+
+        set_fields = {
+            "sample_id": record["sample_id"],
+            "summary.current_step": message,
+            "summary.queue_status": _QUEUE_STATUS.get(status_raw, "in_progress"),
+            "summary.current_step_started_at": now,
+            "timestamps.updated_at": now,
+            "timestamps.last_event_at": now,
+        }
+        for name in _TOP_LEVEL_FIELDS:
+            if record.get(name):
+                set_fields[name] = record[name]
+
+        resolved_url = None
+        if target.mask:
+            try:
+                resolved_url = target.mask.format(**record)
+            except KeyError:
+                resolved_url = f"{target.fallback_base}{record.get('checkpoint', '')}"
+
+        set_fields[target.status] = status_compound
+        if target.checkpointed:
+            set_fields[target.message] = message
+            set_fields[target.last_seen] = now
+        else:
+            set_fields[target.last_seen] = now
+            set_fields[target.message] = message
+        if resolved_url:
+            set_fields[target.url] = resolved_url
+        if ids:
+            set_fields[target.ids] = ids
+        if status_raw in _STARTED:
+            set_fields[target.started_at] = now
+            set_fields[target.ended_at] = None
+        elif status_raw in _ENDED:
+            set_fields[target.ended_at] = now
+
+        return {
+            "$setOnInsert": {"timestamps.created_at": now},
+            "$set": set_fields,
+            "$push": {"timeline": {
+                "name": message,
+                "system": system,
+                "checkpoint": record.get("checkpoint"),
+                "status": status_compound,
+                "started_at": now,
+                "ended_at": None,
+                "message": message,
+            }},
+        }
+
+
+def _blank_values(values: set) -> set:
+    """The values in `values` that count as a missing field: None, or blank once stripped."""
+    blank = {None} & values
+    values = values - blank
+    try:
+        blank.update(filter(str.isspace, values))
+    except TypeError:
+        return blank | {v for v in values if str(v).strip() == ""}
+    if "" in values:
+        blank.add("")
+    return blank
+
+
+def _indexes(column: list, values: set) -> list:
+    return [i for i, v in enumerate(column) if v in values]
+
+
+@lru_cache(maxsize=16)
+def _compile(cfg) -> IngestPlan:
+    valid_statuses = cfg.VALID_STATUSES
+    known_systems = getattr(cfg, "KNOWN_SYSTEMS", None)
+    return IngestPlan(
+        status_map=dict(cfg.STATUS_MAP),
+        checkpoint_systems=frozenset(cfg.CHECKPOINT_SYSTEMS),
+        url_masks=dict(getattr(cfg, "SYSTEM_URL_MASKS", {})),
+        required_fields=tuple(cfg.REQUIRED_FIELDS),
+        valid_statuses=frozenset(valid_statuses),
+        known_systems=frozenset(known_systems) if known_systems is not None else None,
+        known_fields=tuple(cfg.KNOWN_FIELDS),
+        status_error=f"must be one of {sorted(valid_statuses)}",
+        system_error=f"must be one of {known_systems}",
+    )
+
+
+def compile_plan(cfg) -> IngestPlan:
+    """Return the (cached) IngestPlan for a config module; plans pass through."""
+    if isinstance(cfg, IngestPlan):
+        return cfg
+    return _compile(cfg)
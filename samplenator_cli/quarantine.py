@@ -0,0 +1,145 @@
+import csv
+import json
+import os
+
+from samplenator_cli.ingest import row_label, split_compression
+
+# Columns added to every rejected row; the leading underscore keeps them clear of record fields
+ROW_FIELD = "_row"
+ERRORS_FIELD = "_errors"
+
+_EXTENSIONS = {"csv": ".csv", "tsv": ".tsv", "yaml": ".yaml", "jsonl": ".jsonl"}
+_MARKER = ".rejects."
+
+
+def rejects_path(source: str, fmt: str, directory: str = None) -> str:
+    """Where the rejected rows of `source` go: `<name>.rejects<ext>` next to it or in `directory`.
+
+    Compression suffixes are dropped, so `runs.csv.gz` is quarantined to
+    `runs.rejects.csv`. Rows from stdin go to `stdin.rejects.<fmt>`.
+    """
+    if source == "-":
+        name, ext = "stdin", _EXTENSIONS[fmt]
+        folder = directory or os.curdir
+    else:
+        name, ext = os.path.splitext(os.path.basename(split_compression(source)[0]))
+        folder = directory or os.path.dirname(source)
+    return os.path.join(folder, f"{name}.rejects{ext}")
+
+
+def is_rejects(path: str) -> bool:
+    """True for a rejects file written by an earlier run, which directory inputs and watch skip."""
+    return _MARKER in os.path.basename(path)
+
+
+def open_exclusive(path: str, **kwargs):
+    """Open a new file at `path`, or at `<name>.rejects.2<ext>`, `.3`, ... if it exists.
+
+    Files are created with O_EXCL, so inputs that share a name, even when
+    quarantined by separate parsing workers, never truncate each other's or
+    an earlier run's rejects.
+    """
+    base, ext = os.path.splitext(path)
+    candidate, n = path, 1
+    while True:
+        try:
+            return open(candidate, "x", **kwargs)
+        except FileExistsError:
+            n += 1
+            candidate = f"{base}.{n}{ext}"
+
+
+class Rejects:
+    """Rejected rows of one input, written as read in the input's own format.
+
+    Each row keeps its original fields and gains `_row` (its row number in the
+    input) and `_errors` (the validation messages; joined with "; " in
+    delimited files). The file is only created when the first row is
+    rejected, never over an existing file (see `open_exclusive`), and with
+    `path` None rows are counted and reported but not written. Once fixed, a
+    rejects file can be uploaded as it is: the extra columns are not record
+    fields and are ignored.
+    """
+
+    def __init__(self, path: str, fmt: str):
+        self.path = path
+        self.fmt = fmt
+        self.rows = 0
+        self.messages = []
+        self._file = None
+        self._writer = None
+        self._header = None
+
+    def __call__(self, ref, row: dict, messages: list) -> None:
+        self.rows += 1
+        self.messages.extend(f"{row_label(ref)}: {msg}" for msg in messages)
+        if self.path is None:
+            return
+        if self._file is None:
+            self._file = open_exclusive(self.path, encoding="utf-8",
+                                        newline="" if self.fmt in ("csv", "tsv") else None)
+            self.path = self._file.name
+        number = ref[1] if isinstance(ref, tuple) else ref
+        if self.fmt in ("csv", "tsv"):
+            self._write_delimited(number, row, messages)
+        elif self.fmt == "yaml":
+            import yaml
+            # Consecutive one-item lists read back as a single list of records
+            item = {ROW_FIELD: number, ERRORS_FIELD: list(messages), **row}
+            self._file.write(yaml.safe_dump([item], sort_keys=False, allow_unicode=True))
+        else:
+            item = {ROW_FIELD: number, ERRORS_FIELD: list(messages), **row}
+            self._file.write(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+
+    def _write_delimited(self, number: int, row: dict, messages: list) -> None:
+        # csv.DictReader puts the values of over-long rows in a list under the key None
+        extra = row.get(None) or []
+        if self._writer is None:
+            self._writer = csv.writer(self._file, delimiter="," if self.fmt == "csv" else "\t")
+            self._header = [key for key in row if key is not None]
+            self._writer.writerow([ROW_FIELD, ERRORS_FIELD, *self._header])
+        values = [row.get(key) for key in self._header]
+        self._writer.writerow([number, "; ".join(messages), *values, *extra])
+
+    def summary(self) -> tuple:
+        """(rows, file or None, messages), picklable for parsing workers."""
+        return self.rows, self.path if self._file is not None else None, self.messages
+
+    def close(self) -> tuple:
+        if self._file is not None:
+            self._file.close()
+        return self.summary()
+
+
+class Quarantine:
+    """Rejected rows of every input of one upload, with a rejects file per input.
+
+    `directory` overrides where rejects files go (default: next to each input)
+    and `write=False` only collects the messages, for dry runs. Rejects
+    written by parsing workers are added with `merge`.
+    """
+
+    def __init__(self, directory: str = None, write: bool = True):
+        self.directory = directory
+        self.write = write
+        self.rows = 0
+        self.files = []
+        self.messages = []
+        self._open = []
+
+    def open(self, source: str, fmt: str) -> Rejects:
+        rejects = Rejects(rejects_path(source, fmt, self.directory) if self.write else None, fmt)
+        self._open.append(rejects)
+        return rejects
+
+    def merge(self, summary: tuple) -> None:
+        rows, path, messages = summary
+        self.rows += rows
+        if path is not None:
+            self.files.append(path)
+        self.messages.extend(messages)
+
+    def close(self) -> None:
+        for rejects in self._open:
+            self.merge(rejects.close())
+        self._open = []
@@ -0,0 +1,68 @@
+import random
+import time
+
+from pymongo.errors import PyMongoError, ServerSelectionTimeoutError, WaitQueueTimeoutError
+
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+
+
+def is_transient(error: BaseException) -> bool:
+    """True for errors raised before any op of the write reached a server.
+
+    That is no server being selectable, no pooled connection coming free, or
+    an error labelled NoWritesPerformed. Anything else (AutoReconnect,
+    NetworkTimeout, a BulkWriteError) may come after the server applied some
+    or all ops, and re-sending the batch would push those timeline entries
+    twice. pymongo's own retryable writes already retry such a failure once,
+    safely, under the same transaction number; past that, an interrupted
+    upload is continued with `--journal`/`--resume`.
+    """
+    if isinstance(error, (ServerSelectionTimeoutError, WaitQueueTimeoutError)):
+        return True
+    return isinstance(error, PyMongoError) and error.has_error_label("NoWritesPerformed")
+
+
+def backoff_delay(attempt: int, backoff: float = DEFAULT_BACKOFF, max_backoff: float = MAX_BACKOFF) -> float:
+    """Exponential backoff with full jitter for the given (0-based) attempt."""
+    return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+
+
+def call_with_retry(fn, retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF, log=None,
+                    sleep=time.sleep):
+    """Call `fn()`, retrying transient MongoDB errors up to `retries` times."""
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except PyMongoError as e:
+            if attempt >= retries or not is_transient(e):
+                raise
+            delay = backoff_delay(attempt, backoff)
+            attempt += 1
+            if log is not None:
+                log(f"Transient MongoDB error ({type(e).__name__}: {e}), "
+                    f"retrying in {delay:.1f}s ({attempt}/{retries})")
+            sleep(delay)
+
+
+class RetryingCollection:
+    """Collection proxy that retries bulk_write and insert_many on errors raised before anything was sent."""
+
+    def __init__(self, collection, retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF, log=None):
+        self._collection = collection
+        self.retries = retries
+        self.backoff = backoff
+        self.log = log
+
+    def bulk_write(self, *args, **kwargs):
+        return call_with_retry(lambda: self._collection.bulk_write(*args, **kwargs), self.retries, self.backoff,
+                               self.log)
+
+    def insert_many(self, *args, **kwargs):
+        return call_with_retry(lambda: self._collection.insert_many(*args, **kwargs), self.retries, self.backoff,
+                               self.log)
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
@@ -0,0 +1,152 @@
+from collections import Counter
+
+from pymongo import ReplaceOne, UpdateOne
+
+# Top-level sample fields that each get a rollup document per value
+ROLLUP_FIELDS = ("sequencing_run_id", "group_id")
+
+# Everything a sample's rollup contribution depends on; never the timeline
+STATE_PROJECTION = {"_id": 0, "sample_id": 1, "summary.queue_status": 1, "systems": 1,
+                    **{name: 1 for name in ROLLUP_FIELDS}}
+
+_EMPTY = {"scopes": {}, "queue_status": None, "statuses": {}}
+
+
+def rollup_id(field: str, value) -> str:
+    """`_id` of the rollup document for one run or group, e.g. "sequencing_run_id:RUN-1"."""
+    return f"{field}:{value}"
+
+
+def sample_state(doc: dict) -> dict:
+    """The parts of a sample document its rollup contribution is computed from."""
+    statuses = {}
+    for system, section in (doc.get("systems") or {}).items():
+        if not isinstance(section, dict):
+            continue
+        checkpoints = section.get("checkpoints")
+        if isinstance(checkpoints, dict):
+            for checkpoint, entry in checkpoints.items():
+                if isinstance(entry, dict) and entry.get("status"):
+                    statuses[f"{system}.{checkpoint}"] = entry["status"]
+        elif section.get("status"):
+            statuses[system] = section["status"]
+    return {
+        "scopes": {name: doc[name] for name in ROLLUP_FIELDS if doc.get(name)},
+        "queue_status": (doc.get("summary") or {}).get("queue_status"),
+        "statuses": statuses,
+    }
+
+
+def advance(state: dict, update: dict) -> dict:
+    """The state after applying the `$set` of a sample update to `state`."""
+    sets = update.get("$set", {})
+    scopes = dict(state["scopes"])
+    statuses = dict(state["statuses"])
+    for name in ROLLUP_FIELDS:
+        if sets.get(name):
+            scopes[name] = sets[name]
+    for path, value in sets.items():
+        # systems.<name>.status or systems.<name>.checkpoints.<checkpoint>.status
+        if path.startswith("systems.") and path.endswith(".status"):
+            key = path[len("systems."):-len(".status")].replace(".checkpoints.", ".", 1)
+            statuses[key] = value
+    return {
+        "scopes": scopes,
+        "queue_status": sets.get("summary.queue_status", state["queue_status"]),
+        "statuses": statuses,
+    }
+
+
+def contribution(state: dict) -> dict:
+    """{rollup id: Counter of counter paths} that one sample in `state` adds."""
+    counts = Counter({"samples": 1})
+    if state["queue_status"]:
+        counts[f"queue_status.{state['queue_status']}"] += 1
+    for key, status in state["statuses"].items():
+        counts[f"systems.{key}.{status}"] += 1
+    return {rollup_id(name, value): counts for name, value in state["scopes"].items()}
+
+
+def _nest(counts: dict) -> dict:
+    doc = {}
+    for path, n in counts.items():
+        parts = path.split(".")
+        node = doc
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = n
+    return doc
+
+
+class Rollups:
+    """Keep per-run and per-group counters in step with the sample upserts.
+
+    Before each batch is written, the current state of its samples is read
+    with one `$in` query on `samples`. After the write, the state each applied
+    op leads to is derived from its `$set`, and every rollup document touched
+    gets one `$inc` with the difference (one unordered bulk_write per batch).
+    A sample moving between states decrements the old counters and increments
+    the new ones; a sample that joins a run or group adds all of its system
+    statuses there. Counters drift if two writers update the same sample at
+    once; `rebuild_rollups` recomputes them.
+    """
+
+    def __init__(self, rollups, samples):
+        self.rollups = rollups
+        self.samples = samples
+
+    def fetch(self, batch: list) -> dict:
+        """{sample_id: state} for the samples in `batch` that already exist."""
+        sample_ids = list(dict.fromkeys(filt["sample_id"] for _, filt, _ in batch))
+        docs = self.samples.find({"sample_id": {"$in": sample_ids}}, STATE_PROJECTION)
+        return {doc["sample_id"]: sample_state(doc) for doc in docs}
+
+    def update(self, batch: list, applied, before: dict) -> None:
+        """Apply the counter changes caused by the ops at `applied` indexes of `batch`."""
+        after = dict(before)
+        for index in applied:
+            _, filt, update = batch[index]
+            sample_id = filt["sample_id"]
+            after[sample_id] = advance(after.get(sample_id, _EMPTY), update)
+
+        deltas = {}
+        for sample_id, state in after.items():
+            for scope, counts in contribution(state).items():
+                deltas.setdefault(scope, Counter()).update(counts)
+            if sample_id in before:
+                for scope, counts in contribution(before[sample_id]).items():
+                    deltas.setdefault(scope, Counter()).subtract(counts)
+
+        ops = []
+        for scope, counts in deltas.items():
+            inc = {path: n for path, n in counts.items() if n}
+            if inc:
+                field, _, value = scope.partition(":")
+                ops.append(UpdateOne({"_id": scope}, {"$setOnInsert": {"field": field, "value": value}, "$inc": inc},
+                                     upsert=True))
+        if ops:
+            self.rollups.bulk_write(ops, ordered=False)
+
+
+def rebuild_rollups(samples, rollups, batch_size: int = 1000) -> dict:
+    """Recompute every rollup document from the sample documents.
+
+    Rollups are replaced in place and ones with no samples left are deleted,
+    so readers never see an empty collection. Pause ingestion while this
+    runs: increments made during the scan are overwritten.
+    """
+    totals = {}
+    scanned = 0
+    for doc in samples.find({}, STATE_PROJECTION):
+        scanned += 1
+        for scope, counts in contribution(sample_state(doc)).items():
+            totals.setdefault(scope, Counter()).update(counts)
+
+    ops = []
+    for scope, counts in totals.items():
+        field, _, value = scope.partition(":")
+        ops.append(ReplaceOne({"_id": scope}, {"field": field, "value": value, **_nest(counts)}, upsert=True))
+    for start in range(0, len(ops), batch_size):
+        rollups.bulk_write(ops[start:start + batch_size], ordered=False)
+    rollups.delete_many({"_id": {"$nin": list(totals)}})
+    return {"samples": scanned, "rollups": len(totals)}
@@ -0,0 +1,241 @@
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+
+from pymongo.errors import PyMongoError
+
+from samplenator_cli.ingest import build_items, coalesce_updates, iter_aliases, iter_json_lines, row_label
+from samplenator_cli.plan import compile_plan
+from samplenator_cli.writer import DEFAULT_BATCH_SIZE, write_updates
+
+DEFAULT_FLUSH_INTERVAL = 0.05
+
+
+class _Submission:
+    """The records of one request, and what became of them once flushed."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.accepted = 0
+        self.written = 0
+        self.errors = []
+        self.done = threading.Event()
+
+    def __str__(self):
+        # Write errors are labelled `row_label((submission, n))`, i.e. "<label>: Row n"
+        return self.label
+
+    def reply(self) -> dict:
+        return {"accepted": self.accepted, "written": self.written, "errors": self.errors}
+
+
+class Batcher:
+    """Micro-batch records sent by concurrent clients into shared bulk writes.
+
+    Each request is parsed, aliased, validated and built on the thread that
+    received it, then queued. One writer thread flushes the queue once
+    `batch_size` updates are pending or `flush_interval` seconds after the
+    oldest one arrived: updates are coalesced per sample (in arrival order) and
+    sent as unordered bulk_writes, so a rejected op does not hold back other
+    clients' rows. `submit` returns once the flush carrying its records is
+    done, so every reply says how many rows were actually written.
+    """
+
+    def __init__(self, collection, cfg, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, event_log=None, rollups=None,
+                 changes=None, log=print):
+        self.collection = collection
+        self.cfg = cfg
+        self.plan = compile_plan(cfg)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.event_log = event_log
+        self.rollups = rollups
+        self.changes = changes
+        self.log = log
+        self.totals = {"requests": 0, "rows": 0, "created": 0, "updated": 0, "failed": 0}
+        self._pending = []
+        self._submissions = []
+        self._pending_since = None
+        self._closed = False
+        self._ids = count(1)
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="samplenator-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, lines) -> dict:
+        """Queue the NDJSON records in `lines` and wait until they are flushed.
+
+        Raises ValueError (and queues nothing) if a line is not a JSON object.
+        """
+        rows = list(iter_aliases(iter_json_lines(lines), self.cfg.FIELD_ALIASES))
+        submission = _Submission(f"request {next(self._ids)}")
+        failures = self.plan.validate_batch(rows)
+        records = []
+        for index, record in enumerate(rows):
+            errors = failures.get(index)
+            if errors:
+                submission.errors.extend(f"{row_label(index + 1)}: {err}" for err in errors)
+            else:
+                records.append(((submission, index + 1), self.plan.normalise(record)))
+        items = list(build_items(records, self.cfg))
+        submission.accepted = len(items)
+        if not items:
+            return submission.reply()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("server is shutting down")
+            self.totals["requests"] += 1
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            self._pending.extend(items)
+            self._submissions.append(submission)
+            self._cond.notify()
+        submission.done.wait()
+        return submission.reply()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._pending:
+                        remaining = self.flush_interval - (time.monotonic() - self._pending_since)
+                        if self._closed or remaining <= 0 or len(self._pending) >= self.batch_size:
+                            break
+                        self._cond.wait(remaining)
+                    elif self._closed:
+                        return
+                    else:
+                        self._cond.wait()
+                items, submissions = self._pending, self._submissions
+                self._pending, self._submissions, self._pending_since = [], [], None
+            self._flush(items, submissions)
+
+    def _flush(self, items: list, submissions: list) -> None:
+        by_label = {submission.label: submission for submission in submissions}
+
+        def on_batch(refs):
+            for submission, _ in refs:
+                submission.written += 1
+
+        try:
+            result = write_updates(self.collection, coalesce_updates(items), batch_size=self.batch_size,
+                                   ordered=False, on_batch=on_batch, event_log=self.event_log,
+                                   rollups=self.rollups, changes=self.changes)
+        except PyMongoError as e:
+            message = f"Error writing to MongoDB: {e}"
+            self.log(message)
+            for submission in submissions:
+                submission.errors.append(message)
+        else:
+            for msg in result["errors"]:
+                label, _, error = msg.partition(": ")
+                by_label[label].errors.append(error)
+            for key in ("rows", "created", "updated"):
+                self.totals[key] += result[key]
+            self.log(f"Flushed {result['rows']} rows from {len(submissions)} requests — "
+                     f"{result['created']} created, {result['updated']} updated")
+        finally:
+            for submission in submissions:
+                self.totals["failed"] += submission.accepted - submission.written
+                submission.done.set()
+
+    def close(self) -> None:
+        """Flush whatever is pending and stop the writer thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+
+def _handle(batcher: Batcher, body: bytes):
+    """Return (ok, reply) for one NDJSON request body."""
+    try:
+        return True, batcher.submit(body.decode("utf-8").splitlines())
+    except (ValueError, RuntimeError) as e:
+        return False, {"accepted": 0, "written": 0, "errors": [str(e)]}
+
+
+class _StreamHandler(socketserver.StreamRequestHandler):
+    # A request is everything the client sends before shutting down its side
+    def handle(self):
+        _, reply = _handle(self.server.batcher, self.rfile.read())
+        self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+
+
+class UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, batcher: Batcher):
+        self.batcher = batcher
+        self.address = path
+        _remove_stale_socket(path)
+        super().__init__(path, _StreamHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.path.rstrip("/") != "/records":
+            return self._reply(404, {"errors": [f"no such endpoint: {self.path}"]})
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        ok, reply = _handle(self.server.batcher, body)
+        self._reply(200 if ok else 400, reply)
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/health":
+            return self._reply(404, {"errors": [f"no such endpoint: {self.path}"]})
+        self._reply(200, {"status": "ok", **self.server.batcher.totals})
+
+    def _reply(self, code: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Flushes are logged by the Batcher; one line per request would drown them
+        pass
+
+
+class HTTPServer(ThreadingHTTPServer):
+    def __init__(self, host: str, port: int, batcher: Batcher):
+        self.batcher = batcher
+        super().__init__((host, port), _HTTPHandler)
+        self.address = f"http://{host}:{self.server_address[1]}"
+
+
+def _remove_stale_socket(path: str) -> None:
+    """Unlink a socket file left behind by a server that is no longer running."""
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError(f"{path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+            return
+    raise OSError(f"{path} is already in use by a running server")
+
+
+def open_server(batcher: Batcher, socket_path: str = None, host: str = "127.0.0.1", port: int = None):
+    """Bind a Unix socket server, or a localhost HTTP server if `port` is given."""
+    if port is not None:
+        return HTTPServer(host, port, batcher)
+    return UnixServer(socket_path, batcher)
@@ -0,0 +1,120 @@
+import glob
+import os
+from itertools import repeat
+
+from samplenator_cli.ingest import (
+    READ_ERRORS,
+    file_format,
+    is_supported,
+    iter_aliases,
+    iter_file,
+    iter_normalised,
+    iter_quarantined,
+    iter_valid_records,
+)
+from samplenator_cli.quarantine import is_rejects
+
+
+def _has_magic(path: str) -> bool:
+    return any(c in path for c in "*?[")
+
+
+def expand_inputs(paths) -> list[str]:
+    """Expand input arguments (files, directories, glob patterns) into a file list.
+
+    Directories are searched recursively. Directories and globs keep only
+    files with supported extensions, skipping rejects files left by
+    `--on-error quarantine` runs, and raise FileNotFoundError if that leaves
+    none. Explicit files are kept as given so that unsupported extensions
+    still get the usual parse error. Duplicates are dropped, keeping the first
+    occurrence.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            matches = _input_files(glob.glob(os.path.join(path, "**", "*"), recursive=True))
+            if not matches:
+                raise FileNotFoundError(f"No supported files in {path!r}")
+            files.extend(matches)
+        elif _has_magic(path):
+            matches = _input_files(glob.glob(path, recursive=True))
+            if not matches:
+                raise FileNotFoundError(f"No supported files match {path!r}")
+            files.extend(matches)
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            raise FileNotFoundError(f"No such file or directory: {path!r}")
+    return list(dict.fromkeys(files))
+
+
+def _input_files(matches) -> list[str]:
+    return sorted(m for m in matches if os.path.isfile(m) and is_supported(m) and not is_rejects(m))
+
+
+def load_records(path: str, config_path=None):
+    """Parse, alias-resolve, validate and normalise one file.
+
+    Runs in a worker process, so it loads the config itself and returns
+    plain picklable data: (path, [(ref, record), ...], errors).
+    """
+    from samplenator_cli.cli import load_config
+    cfg = load_config(config_path)
+    errors = []
+    try:
+        rows = iter_aliases(iter_file(path), cfg.FIELD_ALIASES)
+        records = list(iter_valid_records(rows, cfg, errors, source=path))
+    except READ_ERRORS as e:
+        return path, [], [f"{path}: Error reading file: {e}"]
+    return path, records, errors
+
+
+def load_quarantined(path: str, config_path=None, rejects_dir=None, write_rejects: bool = True):
+    """Like `load_records`, but invalid rows go to the file's rejects file instead of `errors`.
+
+    Returns (path, records, errors, rejects summary); `errors` only holds a
+    read error, which still ends the file.
+    """
+    from samplenator_cli.cli import load_config
+    from samplenator_cli.quarantine import Rejects, rejects_path
+    cfg = load_config(config_path)
+    errors = []
+    fmt = file_format(path)
+    rejects = Rejects(rejects_path(path, fmt, rejects_dir) if write_rejects else None, fmt)
+    try:
+        records = list(iter_normalised(iter_quarantined(iter_file(path), cfg, rejects, source=path), cfg))
+    except READ_ERRORS as e:
+        records, errors = [], [f"{path}: Error reading file: {e}"]
+    return path, records, errors, rejects.close()
+
+
+def iter_sources(paths, config_path, processes: int, errors: list, quarantine=None):
+    """Yield validated (ref, record) pairs from many files, parsed in a process pool.
+
+    Files are yielded in input order as their results arrive. Errors from
+    every file are appended to `errors`; after the first one, no further
+    records are yielded. With `quarantine` (a `quarantine.Quarantine`), the
+    workers write invalid rows to rejects files instead, the summaries are
+    merged into it, and the valid rows of every readable file are yielded.
+    """
+    if quarantine is None:
+        load, args = load_records, (repeat(config_path),)
+    else:
+        load = load_quarantined
+        args = (repeat(config_path), repeat(quarantine.directory), repeat(quarantine.write))
+    if processes <= 1 or len(paths) <= 1:
+        yield from _collect(map(load, paths, *args), errors, quarantine)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        yield from _collect(pool.map(load, paths, *args), errors, quarantine)
+
+
+def _collect(results, errors, quarantine=None):
+    for _, records, file_errors, *rejected in results:
+        errors.extend(file_errors)
+        if quarantine is not None:
+            quarantine.merge(rejected[0])
+            yield from records
+        elif not errors:
+            yield from records
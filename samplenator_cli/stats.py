@@ -0,0 +1,211 @@
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+_END = object()
+
+
+class _Stage:
+    __slots__ = ("name", "seconds", "rows", "peak")
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.rows = 0
+        self.peak = 0
+
+
+def peak_rss() -> int:
+    """Peak resident set size of this process in bytes (None where `resource` is unavailable)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(values: list, pct: float):
+    """Nearest-rank percentile of `values` (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+class StageStats:
+    """Wall time, row counts and peak memory per ingest stage.
+
+    Stages are generators chained into each other, so the time spent pulling
+    a row through `timed("validate", ...)` includes the parse and alias stages
+    upstream of it. Every stage is charged only for its own share: time spent
+    inside nested stages on the same thread is subtracted. The process's peak
+    RSS is read once, when the run finishes. Tracing memory per stage is
+    opt-in (`memory`), because tracemalloc slows every allocation: each
+    stage's peak is then the highest traced memory seen as a row leaves it,
+    and `peak_bytes` the traced peak of the whole run. Wrapping a collection
+    with `collection` records the latency of every bulk_write/insert_many round
+    trip, including those made from writer threads.
+    """
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.round_trips = []
+        self._stages = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._elapsed = None
+        self.peak = None
+        self.peak_rss = None
+        self._owns_tracing = memory and not tracemalloc.is_tracing()
+        if self._owns_tracing:
+            tracemalloc.start()
+
+    def _stage(self, name: str) -> _Stage:
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = _Stage(name)
+        return stage
+
+    def _frames(self) -> list:
+        frames = getattr(self._local, "frames", None)
+        if frames is None:
+            frames = self._local.frames = []
+        return frames
+
+    def _enter(self) -> list:
+        frame = [0.0, None]  # seconds spent in nested stages, start time
+        self._frames().append(frame)
+        frame[1] = time.perf_counter()
+        return frame
+
+    def _exit(self, stage: _Stage, frame: list) -> None:
+        elapsed = time.perf_counter() - frame[1]
+        frames = self._frames()
+        frames.pop()
+        stage.seconds += elapsed - frame[0]
+        if self.memory:
+            current = tracemalloc.get_traced_memory()[0]
+            if current > stage.peak:
+                stage.peak = current
+        if frames:
+            frames[-1][0] += elapsed
+
+    def timed(self, name: str, iterable):
+        """Yield from `iterable`, charging the time to pull each item to `name`."""
+        return self._timed(self._stage(name), iter(iterable))
+
+    def _timed(self, stage: _Stage, it):
+        while True:
+            frame = self._enter()
+            try:
+                item = next(it, _END)
+            finally:
+                self._exit(stage, frame)
+            if item is _END:
+                return
+            stage.rows += 1
+            yield item
+
+    @contextmanager
+    def measure(self, name: str):
+        """Charge the body of a `with` block to `name`; set `rows` on the yielded stage."""
+        stage = self._stage(name)
+        frame = self._enter()
+        try:
+            yield stage
+        finally:
+            self._exit(stage, frame)
+
+    def collection(self, collection):
+        return _TimedCollection(collection, self)
+
+    def _round_trip(self, seconds: float) -> None:
+        with self._lock:
+            self.round_trips.append(seconds)
+
+    def finish(self) -> None:
+        self._elapsed = time.perf_counter() - self._started
+        self.peak_rss = peak_rss()
+        if self.memory:
+            self.peak = tracemalloc.get_traced_memory()[1]
+        if self._owns_tracing:
+            tracemalloc.stop()
+
+    def report(self) -> dict:
+        if self._elapsed is None:
+            self.finish()
+        stages = {}
+        for stage in self._stages.values():
+            stages[stage.name] = {
+                "seconds": round(stage.seconds, 6),
+                "rows": stage.rows,
+                "rows_per_s": round(stage.rows / stage.seconds) if stage.seconds > 0 else None,
+                "peak_bytes": stage.peak if self.memory else None,
+            }
+        trips = self.round_trips
+        if "write" in stages:
+            stages["write"].update({
+                "round_trips": len(trips),
+                "latency_p50": _round(percentile(trips, 50)),
+                "latency_p95": _round(percentile(trips, 95)),
+                "latency_p99": _round(percentile(trips, 99)),
+            })
+        return {
+            "seconds": round(self._elapsed, 6),
+            "peak_bytes": self.peak,
+            "peak_rss_bytes": self.peak_rss,
+            "stages": stages,
+        }
+
+    def format_table(self) -> str:
+        report = self.report()
+        lines = [f"{'stage':<10} {'seconds':>10} {'rows':>9} {'rows/s':>10} {'peak MiB':>9}"]
+        for name, stage in report["stages"].items():
+            peak = f"{stage['peak_bytes'] / 2**20:.1f}" if stage["peak_bytes"] is not None else "-"
+            lines.append(f"{name:<10} {stage['seconds']:10.4f} {stage['rows']:9d} "
+                         f"{stage['rows_per_s'] or 0:10d} {peak:>9}")
+        write = report["stages"].get("write")
+        if write and write["round_trips"]:
+            lines.append(f"write round trips: {write['round_trips']}, latency "
+                         f"p50 {write['latency_p50'] * 1000:.1f} ms, "
+                         f"p95 {write['latency_p95'] * 1000:.1f} ms, "
+                         f"p99 {write['latency_p99'] * 1000:.1f} ms")
+        total = f"total {report['seconds']:.4f}s"
+        if report["peak_rss_bytes"] is not None:
+            total += f", peak RSS {report['peak_rss_bytes'] / 2**20:.1f} MiB"
+        lines.append(total)
+        return "\n".join(lines)
+
+
+def _round(value):
+    return round(value, 6) if value is not None else None
+
+
+class _TimedCollection:
+    """Collection proxy that records the latency of every write round trip."""
+
+    def __init__(self, collection, stats: StageStats):
+        self._collection = collection
+        self._stats = stats
+
+    def _timed(self, method, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self._stats._round_trip(time.perf_counter() - started)
+
+    def bulk_write(self, *args, **kwargs):
+        return self._timed(self._collection.bulk_write, *args, **kwargs)
+
+    def insert_many(self, *args, **kwargs):
+        return self._timed(self._collection.insert_many, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
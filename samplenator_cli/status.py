@@ -0,0 +1,106 @@
+import json
+
+from samplenator_cli.indexes import run_id_paths
+from samplenator_cli.ingest import batched
+
+DEFAULT_CHUNK_SIZE = 500
+
+# Top-level fields a lookup can be narrowed by; both are indexed (see indexes.py)
+FILTER_FIELDS = ("group_id", "sequencing_run_id")
+
+
+def read_sample_ids(lines):
+    """Sample ids from text, one per line; blank lines and `#` comments are skipped."""
+    for line in lines:
+        sample_id = line.split("#", 1)[0].strip()
+        if sample_id:
+            yield sample_id
+
+
+def sample_filter(cfg, group_id: str = None, sequencing_run_id: str = None) -> dict:
+    """The query narrowing a lookup to a group and/or sequencing run.
+
+    Uploads set the top-level `sequencing_run_id`, but documents written
+    before they did only carry it in `systems.<name>.ids`, so a run id is
+    matched at every path of `run_id_paths`.
+    """
+    filters = {}
+    if group_id:
+        filters["group_id"] = group_id
+    if sequencing_run_id:
+        filters["$or"] = [{path: sequencing_run_id} for path in run_id_paths(cfg)]
+    return filters
+
+
+def status_projection(systems=(), timestamps: bool = True) -> dict:
+    """Fields a status lookup returns: the summary, the chosen `systems.<name>` sections and timestamps.
+
+    The timeline is never fetched, since it is by far the largest part of a
+    sample document.
+    """
+    projection = {"_id": 0, "sample_id": 1, "summary": 1}
+    for system in systems:
+        projection[f"systems.{system}"] = 1
+    if timestamps:
+        projection["timestamps"] = 1
+    return projection
+
+
+def iter_status(collection, sample_ids, projection: dict, filters: dict = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE, missing: list = None):
+    """Yield the projected documents of `sample_ids`, one `$in` query per chunk.
+
+    Documents come back in the order the ids were given and each id is looked
+    up once. Ids with no (matching) document are appended to `missing`. With
+    `sample_ids` None, every document matching `filters` is yielded.
+    """
+    filters = dict(filters or {})
+    if sample_ids is None:
+        yield from collection.find(filters, projection)
+        return
+    seen = set()
+    for chunk in batched(sample_ids, chunk_size):
+        chunk = [sample_id for sample_id in dict.fromkeys(chunk) if sample_id not in seen]
+        seen.update(chunk)
+        if not chunk:
+            continue
+        found = {doc["sample_id"]: doc
+                 for doc in collection.find({"sample_id": {"$in": chunk}, **filters}, projection)}
+        for sample_id in chunk:
+            doc = found.get(sample_id)
+            if doc is not None:
+                yield doc
+            elif missing is not None:
+                missing.append(sample_id)
+
+
+def dump_status(doc: dict) -> str:
+    return json.dumps(doc, default=str, ensure_ascii=False) + "\n"
+
+
+def system_status(section) -> str:
+    """One-cell summary of a `systems.<name>` section: its status, or `checkpoint=status` pairs."""
+    if not isinstance(section, dict):
+        return "-"
+    checkpoints = section.get("checkpoints")
+    if isinstance(checkpoints, dict):
+        return ",".join(f"{name}={cp.get('status', '?')}" for name, cp in checkpoints.items()) or "-"
+    return section.get("status") or "-"
+
+
+def format_table(docs, systems=()) -> str:
+    headers = ["sample_id", "queue_status", "current_step", "updated_at", *systems]
+    rows = []
+    for doc in docs:
+        summary = doc.get("summary") or {}
+        sections = doc.get("systems") or {}
+        rows.append([
+            str(doc.get("sample_id", "")),
+            str(summary.get("queue_status") or "-"),
+            str(summary.get("current_step") or "-"),
+            str((doc.get("timestamps") or {}).get("updated_at") or "-"),
+            *(system_status(sections.get(system)) for system in systems),
+        ])
+    widths = [max(len(row[i]) for row in [headers, *rows]) for i in range(len(headers))]
+    return "\n".join("  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+                     for row in [headers, *rows])
@@ -0,0 +1,275 @@
+import csv
+import io
+import json
+import os
+import re
+import time
+
+from pymongo.errors import PyMongoError
+
+from samplenator_cli.ingest import (
+    READ_ERRORS,
+    build_items,
+    is_supported,
+    iter_aliases,
+    iter_json_lines,
+    iter_yaml_documents,
+    load_yaml_all,
+    row_label,
+    split_compression,
+)
+from samplenator_cli.plan import compile_plan
+from samplenator_cli.quarantine import is_rejects
+from samplenator_cli.retry import DEFAULT_BACKOFF, backoff_delay
+from samplenator_cli.writer import DEFAULT_BATCH_SIZE, write_updates
+
+STATE_FILENAME = ".samplenator-watch.json"
+
+# Start of a top-level YAML list item or document
+_YAML_BOUNDARY = re.compile(rb"^(?:-(?:[ \t]|$)|---)", re.MULTILINE)
+
+
+class UnparseableChunk(ValueError):
+    """Appended data that could not be parsed; `entry` is the state just past it."""
+
+    def __init__(self, message: str, entry: dict):
+        super().__init__(message)
+        self.entry = entry
+
+
+def _is_yaml(path: str) -> bool:
+    return path.lower().endswith((".yaml", ".yml"))
+
+
+class OffsetState:
+    """Per-file byte offsets, row counts and CSV headers, persisted as JSON."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.files = json.load(f)
+
+    def get(self, name: str) -> dict:
+        return self.files.get(name, {"offset": 0, "rows": 0, "header": None, "inode": None})
+
+    def save(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.files, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def read_appended(path: str, entry: dict, final: bool = False):
+    """Read the complete lines added to `path` since `entry["offset"]`.
+
+    Returns (raw_rows, new_entry). A file that shrank or was replaced is read
+    again from the start. Unless `final`, a trailing partial line is left for
+    the next call; in YAML a complete line is not a complete record either,
+    so the last top-level list item or document is left too, until another
+    one starts after it. With `final` everything up to the end of the file is
+    read, including a last line without a newline. Data that does not parse
+    raises `UnparseableChunk` carrying the state past it, so the caller can
+    report and skip it.
+    """
+    st = os.stat(path)
+    entry = dict(entry)
+    if entry["inode"] != st.st_ino or st.st_size < entry["offset"]:
+        entry = {"offset": 0, "rows": 0, "header": None, "inode": st.st_ino}
+    if st.st_size == entry["offset"]:
+        return [], entry
+
+    with open(path, "rb") as f:
+        f.seek(entry["offset"])
+        data = f.read()
+    if final:
+        end = len(data)
+    else:
+        end = data.rfind(b"\n") + 1
+        if end and _is_yaml(path):
+            starts = [m.start() for m in _YAML_BOUNDARY.finditer(data, 0, end)]
+            end = starts[-1] if starts else 0
+    if end == 0:
+        return [], entry
+
+    lower = path.lower()
+    try:
+        chunk = data[:end].decode("utf-8")
+        if _is_yaml(path):
+            rows = list(iter_yaml_documents(load_yaml_all(chunk)))
+        elif lower.endswith((".jsonl", ".ndjson")):
+            rows = list(iter_json_lines(chunk.splitlines(), start=entry["rows"] + 1))
+        else:
+            delimiter = "\t" if lower.endswith(".tsv") else ","
+            reader = csv.DictReader(io.StringIO(chunk, newline=""), fieldnames=entry["header"], delimiter=delimiter)
+            rows = [dict(row) for row in reader]
+            entry["header"] = reader.fieldnames
+    except ValueError as e:
+        start = entry["offset"]
+        entry["offset"] += end
+        raise UnparseableChunk(f"bytes {start}-{entry['offset']}: {e}", entry) from e
+
+    entry["offset"] += end
+    entry["rows"] += len(rows)
+    return rows, entry
+
+
+def _inotify_waiter(directory: str):
+    try:
+        from inotify_simple import INotify, flags
+    except ImportError:
+        return None
+    inotify = INotify()
+    inotify.add_watch(directory, flags.CREATE | flags.MODIFY | flags.CLOSE_WRITE | flags.MOVED_TO)
+
+    def wait(timeout: float) -> None:
+        inotify.read(timeout=int(timeout * 1000))
+    return wait
+
+
+class Watcher:
+    """Ingest new and appended records from files in a drop directory.
+
+    Rows are buffered and flushed as one bulk write once `batch_size` rows are
+    pending or `flush_interval` seconds have passed since the oldest pending
+    row. Offsets are only committed to the state file after a flush, so an
+    interrupted watcher re-reads (never skips) unflushed rows on restart.
+    Invalid rows are reported through `log` and skipped. When a flush fails
+    with a MongoDB error, the rows it did not write stay pending and the
+    offsets uncommitted, and `run` tries again after an exponential backoff
+    from `retry_backoff` seconds.
+    """
+
+    def __init__(self, directory: str, collection, cfg, state_path: str = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE, flush_interval: float = 2.0,
+                 poll_interval: float = 1.0, changes=None, retry_backoff: float = DEFAULT_BACKOFF,
+                 log=print):
+        self.directory = directory
+        self.collection = collection
+        self.cfg = cfg
+        self.plan = compile_plan(cfg)
+        self.state = OffsetState(state_path or os.path.join(directory, STATE_FILENAME))
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.poll_interval = poll_interval
+        self.changes = changes
+        self.retry_backoff = retry_backoff
+        self.log = log
+        self.pending = []
+        self.pending_state = {}
+        self.pending_since = None
+        self.totals = {"created": 0, "updated": 0, "rows": 0, "errors": []}
+        self._sizes = {}
+
+    def _files(self):
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            # Compressed files cannot be tailed by byte offset; rejects files are not new input
+            if (os.path.isfile(path) and is_supported(name) and split_compression(name)[1] is None
+                    and not is_rejects(name)):
+                yield name, path
+
+    def scan(self, final: bool = False) -> None:
+        """Read what was appended to every file; `final` reads each to its end (see `read_appended`)."""
+        for name, path in self._files():
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                # Renamed or removed since the directory was listed
+                continue
+            entry = self.pending_state.get(name) or self.state.get(name)
+            settled = self._sizes.get(name) == size
+            # A file that stopped growing with a line or YAML item held back has it read now
+            if settled and entry["offset"] >= size:
+                continue
+            self._sizes[name] = size
+            try:
+                raw_rows, new_entry = read_appended(path, entry, final=final or settled)
+            except UnparseableChunk as e:
+                self.log(f"{name}: Skipped data that does not parse ({e})")
+                self.pending_state[name] = e.entry
+                continue
+            except READ_ERRORS as e:
+                self.log(f"{name}: Error reading file: {e}")
+                continue
+            first_row = new_entry["rows"] - len(raw_rows) + 1
+            rows = list(iter_aliases(raw_rows, self.cfg.FIELD_ALIASES))
+            failures = self.plan.validate_batch(rows)
+            records = []
+            for offset, record in enumerate(rows):
+                ref = (name, first_row + offset)
+                errors = failures.get(offset, ())
+                for err in errors:
+                    self.log(f"{row_label(ref)}: {err}")
+                if not errors:
+                    records.append((ref, self.plan.normalise(record)))
+            self.pending.extend(build_items(records, self.cfg))
+            self.pending_state[name] = new_entry
+            if self.pending_since is None and self.pending:
+                self.pending_since = time.monotonic()
+
+    def due(self) -> bool:
+        if len(self.pending) >= self.batch_size:
+            return True
+        return self.pending_since is not None and time.monotonic() - self.pending_since >= self.flush_interval
+
+    def flush(self) -> None:
+        """Write the pending rows, then commit their offsets.
+
+        A MongoDB error is raised with the offsets left uncommitted and only
+        the rows that were not written still pending, so a retry never sends
+        a row twice.
+        """
+        if self.pending:
+            written = set()
+            try:
+                result = write_updates(self.collection, self.pending, batch_size=self.batch_size,
+                                       ordered=False, changes=self.changes, on_batch=written.update)
+            except PyMongoError:
+                self.pending = [item for item in self.pending if not written.issuperset(item[0])]
+                raise
+            for msg in result["errors"]:
+                self.log(msg)
+            for key in ("created", "updated", "rows"):
+                self.totals[key] += result[key]
+            self.totals["errors"].extend(result["errors"])
+            self.log(f"Flushed {result['rows']} rows — {result['created']} created, {result['updated']} updated")
+        if self.pending_state:
+            self.state.files.update(self.pending_state)
+            self.state.save()
+        self.pending, self.pending_state, self.pending_since = [], {}, None
+
+    def run(self, once: bool = False) -> dict:
+        """Scan and flush until interrupted; with `once`, a single pass whose MongoDB errors are raised."""
+        wait = None if once else _inotify_waiter(self.directory)
+        failures = 0
+        try:
+            while True:
+                self.scan(final=once)
+                if once or self.due():
+                    try:
+                        self.flush()
+                    except PyMongoError as e:
+                        if once:
+                            raise
+                        delay = backoff_delay(failures, self.retry_backoff)
+                        failures += 1
+                        self.log(f"Error writing to MongoDB: {e}; {len(self.pending)} rows kept pending, "
+                                 f"retrying in {delay:.1f}s")
+                        time.sleep(delay)
+                        continue
+                    failures = 0
+                if once:
+                    return self.totals
+                timeout = self.poll_interval
+                if self.pending_since is not None:
+                    remaining = self.flush_interval - (time.monotonic() - self.pending_since)
+                    timeout = max(0.0, min(timeout, remaining))
+                if wait is not None:
+                    wait(timeout)
+                else:
+                    time.sleep(timeout)
+        except KeyboardInterrupt:
+            self.flush()
+            return self.totals
@@ -0,0 +1,189 @@
+import queue
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from samplenator_cli.ingest import batched, row_label
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def write_updates(collection, items, batch_size: int = DEFAULT_BATCH_SIZE, ordered: bool = True,
+                  on_batch=None, event_log=None, rollups=None, changes=None) -> dict:
+    """Upsert (rows, filter, update) items through bulk_write in batches.
+
+    `rows` is the list of input row numbers an update was built from, so that
+    per-op write errors can be reported as `Row N: ...`. In ordered mode the
+    first failing op stops the upload; unordered mode keeps going. If given,
+    `on_batch` is called after every bulk_write with the rows it applied, and
+    `event_log` (an `events.EventLog`) moves timeline entries of applied ops
+    to the events collection and `rollups` (a `rollups.Rollups`) applies the
+    counter changes they cause. Rows of a batch that hit a write concern error
+    were applied but not acknowledged: they are reported in `errors` and not
+    passed to `on_batch`. `changes` (a `changes.ChangeFilter`) first drops
+    updates that would not change a status or message; their rows are passed
+    to `on_batch` as if written.
+    """
+    result = {"created": 0, "updated": 0, "rows": 0, "errors": []}
+    for batch in batched(items, batch_size):
+        result["rows"] += sum(len(rows) for rows, _, _ in batch)
+        unchanged = []
+        if changes is not None:
+            batch, unchanged = changes.split(batch)
+            if not batch:
+                if on_batch is not None:
+                    on_batch(unchanged)
+                continue
+        events = None
+        if event_log is not None:
+            batch, events = event_log.split(batch)
+        states = rollups.fetch(batch) if rollups is not None else None
+        error = None
+        try:
+            res = collection.bulk_write(to_operations(batch), ordered=ordered)
+        except BulkWriteError as e:
+            error = e
+            record_bulk_error(result, batch, e, ordered)
+        else:
+            record_bulk_result(result, res)
+        applied = applied_indexes(batch, error, ordered)
+        confirmed = [] if error is not None and error.details.get("writeConcernErrors") else applied
+        if events is not None:
+            event_log.insert(events, applied)
+        if states is not None:
+            rollups.update(batch, applied, states)
+        if on_batch is not None:
+            on_batch(unchanged + [row for index in confirmed for row in batch[index][0]])
+        if error is not None and ordered:
+            break
+    return result
+
+
+def to_operations(batch: list) -> list:
+    return [UpdateOne(filt, update, upsert=True) for _, filt, update in batch]
+
+
+def record_bulk_result(result: dict, res) -> None:
+    result["created"] += res.upserted_count
+    result["updated"] += res.matched_count
+
+
+def record_bulk_error(result: dict, batch: list, error: BulkWriteError, ordered: bool = True) -> None:
+    details = error.details
+    result["created"] += details.get("nUpserted", 0)
+    result["updated"] += details.get("nMatched", 0)
+    for err in details.get("writeErrors", []):
+        for row in batch[err["index"]][0]:
+            result["errors"].append(f"{row_label(row)}: {err.get('errmsg', 'write error')}")
+    # Applied but not acknowledged by the requested write concern
+    concern = "; ".join(err.get("errmsg", "write concern error")
+                        for err in details.get("writeConcernErrors", []))
+    if concern:
+        for index in applied_indexes(batch, error, ordered):
+            for row in batch[index][0]:
+                result["errors"].append(f"{row_label(row)}: write concern error: {concern}")
+
+
+def applied_indexes(batch: list, error: BulkWriteError = None, ordered: bool = True) -> list:
+    """Indexes of the ops in `batch` that MongoDB applied."""
+    if error is None:
+        return list(range(len(batch)))
+    failed = {err["index"] for err in error.details.get("writeErrors", [])}
+    stop = min(failed) if ordered and failed else len(batch)
+    return [index for index in range(stop) if index not in failed]
+
+
+def partition_for(sample_id: str, workers: int) -> int:
+    return zlib.crc32(str(sample_id).encode("utf-8")) % workers
+
+
+class QueueItems:
+    """The items of one partition's queue, up to the `END` marker the producer puts last.
+
+    Iterate it over a `queue.Queue`, or `async for` over an `asyncio.Queue`. A
+    writer that stops before the end must `drain` (or `adrain`) it, so the
+    producer never blocks on a full queue.
+    """
+
+    END = object()
+
+    def __init__(self, q):
+        self.q = q
+        self.done = False
+
+    def _take(self, item) -> bool:
+        self.done = item is self.END
+        return not self.done
+
+    def __iter__(self):
+        while not self.done:
+            item = self.q.get()
+            if self._take(item):
+                yield item
+
+    async def __aiter__(self):
+        while not self.done:
+            item = await self.q.get()
+            if self._take(item):
+                yield item
+
+    def drain(self) -> None:
+        for _ in self:
+            pass
+
+    async def adrain(self) -> None:
+        async for _ in self:
+            pass
+
+
+def _partition_writer(collection, q, batch_size, ordered, on_batch, event_log, rollups, changes):
+    items = QueueItems(q)
+    try:
+        return write_updates(collection, iter(items), batch_size=batch_size, ordered=ordered,
+                             on_batch=on_batch, event_log=event_log, rollups=rollups, changes=changes)
+    finally:
+        items.drain()
+
+
+def write_updates_concurrent(collection, items, workers: int, batch_size: int = DEFAULT_BATCH_SIZE,
+                             ordered: bool = True, on_batch=None, event_log=None, rollups=None,
+                             changes=None) -> dict:
+    """Write items from a pool of threads sharing one collection (and so one MongoClient).
+
+    Items are partitioned by a stable hash of `sample_id`, and every partition
+    is written in input order by a single thread, so per-sample update and
+    timeline order is the same as with `write_updates`. `ordered` applies per
+    partition. Per-worker results are summed into one result dict. `on_batch`
+    is called from the worker threads and must be thread-safe.
+    """
+    if workers <= 1:
+        return write_updates(collection, items, batch_size=batch_size, ordered=ordered, on_batch=on_batch,
+                             event_log=event_log, rollups=rollups, changes=changes)
+
+    queues = [queue.Queue(maxsize=batch_size * 2) for _ in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="samplenator-writer") as pool:
+        futures = [
+            pool.submit(_partition_writer, collection, q, batch_size, ordered, on_batch, event_log, rollups, changes)
+            for q in queues
+        ]
+        try:
+            for item in items:
+                queues[partition_for(item[1]["sample_id"], workers)].put(item)
+        finally:
+            for q in queues:
+                q.put(QueueItems.END)
+        results = [f.result() for f in futures]
+
+    return merge_results(results)
+
+
+def merge_results(results) -> dict:
+    merged = {"created": 0, "updated": 0, "rows": 0, "errors": []}
+    for res in results:
+        merged["created"] += res["created"]
+        merged["updated"] += res["updated"]
+        merged["rows"] += res["rows"]
+        merged["errors"].extend(res["errors"])
+    return merged
@@ -0,0 +1,195 @@
+"""Shared fixtures: in-memory stand-ins for a pymongo collection and client."""
+
+import asyncio
+import copy
+from unittest.mock import MagicMock
+
+import pytest
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+from pymongo.results import BulkWriteResult
+
+
+def _set_path(doc, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+_MISSING = object()
+
+
+def _get_path(doc, path, default=None):
+    for part in path.split("."):
+        if isinstance(doc, list) and part.isdigit() and int(part) < len(doc):
+            doc = doc[int(part)]
+        elif isinstance(doc, dict) and part in doc:
+            doc = doc[part]
+        else:
+            return default
+    return doc
+
+
+def _matches(doc, filt):
+    for key, cond in filt.items():
+        if key == "$or":
+            if not any(_matches(doc, branch) for branch in cond):
+                return False
+            continue
+        value = _get_path(doc, key, _MISSING)
+        if isinstance(cond, dict) and "$exists" in cond:
+            if (value is not _MISSING) != cond["$exists"]:
+                return False
+        elif isinstance(cond, dict) and "$in" in cond:
+            if value is _MISSING or value not in cond["$in"]:
+                return False
+        elif isinstance(cond, dict) and "$nin" in cond:
+            if value is not _MISSING and value in cond["$nin"]:
+                return False
+        elif value is _MISSING or value != cond:
+            return False
+    return True
+
+
+def _project(doc, projection):
+    """Inclusion projection with dotted paths; `_id` is kept unless set to 0."""
+    out = {"_id": doc["_id"]} if projection.get("_id", 1) and "_id" in doc else {}
+    for path, include in projection.items():
+        if path != "_id" and include:
+            value = _get_path(doc, path, _MISSING)
+            if value is not _MISSING:
+                _set_path(out, path, copy.deepcopy(value))
+    return out
+
+
+def apply_update(doc, update, inserted):
+    """Apply the subset of update operators that samplenator emits."""
+    if inserted:
+        for path, value in update.get("$setOnInsert", {}).items():
+            _set_path(doc, path, copy.deepcopy(value))
+    for path, value in update.get("$set", {}).items():
+        _set_path(doc, path, copy.deepcopy(value))
+    for path, value in update.get("$inc", {}).items():
+        _set_path(doc, path, _get_path(doc, path, 0) + value)
+    for path, value in update.get("$push", {}).items():
+        arr = _get_path(doc, path)
+        if arr is None:
+            arr = []
+            _set_path(doc, path, arr)
+        if isinstance(value, dict) and "$each" in value:
+            arr.extend(copy.deepcopy(value["$each"]))
+            if "$slice" in value:
+                arr[:] = arr[value["$slice"]:] if value["$slice"] < 0 else arr[:value["$slice"]]
+        else:
+            arr.append(copy.deepcopy(value))
+
+
+class FakeCollection:
+    """Minimal in-memory collection that counts round trips.
+
+    Sample ids listed in `fail_ids` make their upsert fail with a write error,
+    mimicking what pymongo raises for a rejected op inside a bulk_write.
+    """
+
+    def __init__(self, fail_ids=()):
+        self.docs = []
+        self.calls = []
+        self.indexes = []
+        self.queries = []
+        self.fail_ids = set(fail_ids)
+
+    def bulk_write(self, ops, ordered=True):
+        self.calls.append(len(ops))
+        upserted, matched, errors = [], 0, []
+        for index, op in enumerate(ops):
+            if op._filter.get("sample_id") in self.fail_ids:
+                errors.append({"index": index, "code": 121, "errmsg": "Document failed validation"})
+                if ordered:
+                    break
+                continue
+            doc = next((d for d in self.docs if _matches(d, op._filter)), None)
+            if doc is None and not op._upsert:
+                continue
+            if isinstance(op, ReplaceOne):
+                _id = doc["_id"] if doc else op._filter.get("_id")
+                replacement = {**copy.deepcopy(op._doc), "_id": _id}
+                if doc is None:
+                    self.docs.append(replacement)
+                    upserted.append({"index": index, "_id": replacement["_id"]})
+                else:
+                    self.docs[self.docs.index(doc)] = replacement
+                    matched += 1
+            elif doc is None:
+                doc = copy.deepcopy(op._filter)
+                doc.setdefault("_id", len(self.docs) + 1)
+                self.docs.append(doc)
+                apply_update(doc, op._doc, inserted=True)
+                upserted.append({"index": index, "_id": doc["_id"]})
+            else:
+                apply_update(doc, op._doc, inserted=False)
+                matched += 1
+        details = {
+            "nInserted": 0, "nUpserted": len(upserted), "nMatched": matched,
+            "nModified": matched, "nRemoved": 0, "upserted": upserted, "writeErrors": errors,
+        }
+        if errors:
+            raise BulkWriteError(details)
+        return BulkWriteResult(details, True)
+
+    def find_one(self, filt):
+        return next((d for d in self.docs if _matches(d, filt)), None)
+
+    def find(self, filt=None, projection=None):
+        self.queries.append(filt)
+        for doc in self.docs:
+            if _matches(doc, filt or {}):
+                yield _project(doc, projection) if projection else copy.deepcopy(doc)
+
+    def insert_many(self, docs, ordered=True):
+        self.calls.append(len(docs))
+        for doc in docs:
+            doc = copy.deepcopy(doc)
+            doc.setdefault("_id", len(self.docs) + 1)
+            self.docs.append(doc)
+
+    def delete_many(self, filt):
+        self.docs = [doc for doc in self.docs if not _matches(doc, filt)]
+
+    def create_index(self, keys, **kwargs):
+        self.indexes.append((keys, kwargs))
+        return kwargs.get("name")
+
+
+@pytest.fixture
+def fake_collection():
+    return FakeCollection()
+
+
+@pytest.fixture
+def mongo_client():
+    """Build a client to patch in for pymongo.MongoClient.
+
+    `client[db][name]` is the collection given, or `collections[name]` when
+    given a {name: collection} dict.
+    """
+    def make(collections):
+        client = MagicMock()
+        databases = client.__getitem__.return_value
+        if isinstance(collections, dict):
+            databases.__getitem__.side_effect = collections.__getitem__
+        else:
+            databases.__getitem__.return_value = collections
+        return client
+    return make
+
+
+class AsyncFakeCollection:
+    """Awaitable wrapper around FakeCollection, shaped like pymongo's AsyncCollection."""
+
+    def __init__(self, fail_ids=()):
+        self.sync = FakeCollection(fail_ids)
+
+    async def bulk_write(self, ops, ordered=True):
+        await asyncio.sleep(0)
+        return self.sync.bulk_write(ops, ordered=ordered)
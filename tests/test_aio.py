@@ -0,0 +1,63 @@
+"""Tests for the asyncio ingest API."""
+
+import asyncio
+import os
+import threading
+
+from conftest import AsyncFakeCollection
+
+import samplenator_cli.config as cfg
+from samplenator_cli.aio import ingest_records
+from samplenator_cli.ingest import parse_file
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "system")
+
+
+def test_ingest_records_writes_fixture():
+    collection = AsyncFakeCollection()
+    records = parse_file(os.path.join(FIXTURES, "frontend.csv"))
+    result = asyncio.run(ingest_records(records, cfg, collection, batch_size=2, concurrency=3))
+    assert result == {"created": 1, "updated": 6, "rows": 7, "errors": []}
+    timeline = collection.sync.docs[0]["timeline"]
+    assert [e["checkpoint"] for e in timeline] == [r["checkpoint"] for r in records]
+
+
+def test_ingest_records_resolves_aliases_and_coalesces():
+    collection = AsyncFakeCollection()
+    records = [
+        {"sampleid": "S1", "tool": "cdm", "msg": "Uploading", "state": "started"},
+        {"sampleid": "S1", "tool": "cdm", "msg": "Uploaded", "state": "ok"},
+    ]
+    result = asyncio.run(ingest_records(records, cfg, collection, coalesce=True))
+    assert result["created"] == 1
+    assert collection.sync.calls == [1]
+    assert collection.sync.docs[0]["systems"]["cdm"]["message"] == "Uploaded"
+
+
+def test_ingest_records_reports_validation_and_write_errors():
+    collection = AsyncFakeCollection(fail_ids={"S2"})
+    records = [
+        {"sample_id": "S1", "system": "cdm", "message": "m", "status": "ok"},
+        {"sample_id": "S2", "system": "cdm", "message": "m", "status": "ok"},
+        {"sample_id": "S3", "system": "cdm", "message": "m", "status": "bogus"},
+    ]
+    result = asyncio.run(ingest_records(records, cfg, collection, batch_size=1, concurrency=2))
+    assert result["errors"][0].startswith("Row 3: invalid status")
+    assert "Row 2: Document failed validation" in result["errors"]
+    assert result["created"] == 1
+
+
+def test_ordered_stop_keeps_draining_the_queue():
+    # Many more items than the queue holds: a writer that stops without draining blocks the producer
+    collection = AsyncFakeCollection(fail_ids={"S0"})
+    records = [{"sample_id": "S0", "system": "cdm", "message": f"m{i}", "status": "ok"}
+               for i in range(50)]
+    results = []
+    thread = threading.Thread(target=lambda: results.append(asyncio.run(
+        ingest_records(records, cfg, collection, batch_size=2, concurrency=1))), daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+    assert results, "ingest_records did not finish"
+    result = results[0]
+    assert result["errors"] == ["Row 1: Document failed validation"]
+    assert collection.sync.calls == [2]
@@ -0,0 +1,48 @@
+"""Smoke test for the benchmark suite."""
+
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(*args):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    return subprocess.run([sys.executable, os.path.join(ROOT, "benchmarks", "run.py"), *args],
+                          capture_output=True, text=True, env=env, check=False)
+
+
+def test_benchmark_writes_json_and_compares(tmp_path):
+    output = tmp_path / "bench.json"
+    first = _run("--rows", "200", "--repeat", "1", "--batch-size", "50", "--duplicate-ratio", "0.2",
+                 "--output", str(output))
+    assert first.returncode == 0, first.stderr
+    results = json.loads(output.read_text())
+    assert set(results["stages"]) == {"parse", "aliases", "validate", "normalise", "build",
+                                      "coalesce", "write"}
+    assert results["write"] == {"round_trips": 4, "ops": 200}
+
+    second = _run("--rows", "200", "--repeat", "1", "--batch-size", "50",
+                  "--duplicate-ratio", "0.2", "--compare", str(output), "--max-slowdown", "1000")
+    assert second.returncode == 0, second.stderr + second.stdout
+
+
+def test_benchmark_report_timings_fails_only_on_round_trips(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    args = ("--rows", "200", "--repeat", "1", "--batch-size", "50")
+    assert _run(*args, "--output", str(baseline)).returncode == 0
+    results = json.loads(baseline.read_text())
+    for stats in results["stages"].values():
+        stats["seconds"] = 1e-9
+    baseline.write_text(json.dumps(results))
+
+    slow = _run(*args, "--compare", str(baseline), "--report-timings")
+    assert slow.returncode == 0, slow.stderr + slow.stdout
+    assert "slower" in slow.stdout and "REGRESSION" not in slow.stdout
+    assert _run(*args, "--compare", str(baseline)).returncode == 1
+
+    results["write"]["round_trips"] = 1
+    baseline.write_text(json.dumps(results))
+    assert _run(*args, "--compare", str(baseline), "--report-timings").returncode == 1
@@ -0,0 +1,132 @@
+"""Tests for --skip-unchanged change detection."""
+
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from conftest import FakeCollection
+
+import samplenator_cli.config as cfg
+from samplenator_cli.changes import ChangeFilter, timeline_values, tracked_values
+from samplenator_cli.cli import main
+from samplenator_cli.ingest import build_items, coalesce_updates
+from samplenator_cli.plan import compile_plan
+from samplenator_cli.writer import write_updates, write_updates_concurrent
+
+
+def _record(sample_id="S1", status="running", message="Align", **fields):
+    return {"sample_id": sample_id, "system": "bjorn", "status": status, "message": message,
+            **fields}
+
+
+def _items(records):
+    return list(build_items(enumerate(records, start=1), cfg))
+
+
+def test_tracked_and_timeline_values():
+    clarity = {"sample_id": "S1", "system": "clarity", "status": "ok", "message": "Received",
+               "checkpoint": "reception", "group_id": "G1"}
+    (_, _, update), = _items([clarity])
+    assert tracked_values(update) == {
+        "group_id": "G1",
+        "systems.clarity.checkpoints.reception.status": "started:true;completed:true",
+        "systems.clarity.checkpoints.reception.message": "Received",
+    }
+    assert timeline_values(update, compile_plan(cfg)) == [
+        ("systems.clarity.checkpoints.reception.status", "started:true;completed:true"),
+        ("systems.clarity.checkpoints.reception.message", "Received"),
+    ]
+
+
+def test_heartbeats_are_skipped_with_one_lookup_per_batch():
+    collection = FakeCollection()
+    write_updates(collection, _items([_record()]))
+    changes = ChangeFilter(collection, cfg)
+    written = []
+    records = [_record(), _record(), _record(message="Call variants"),
+               _record(sample_id="S2"), _record(sample_id="S2")]
+    result = write_updates(collection, _items(records), changes=changes, on_batch=written.extend)
+
+    # The second S2 heartbeat is compared with what the first one, in the same batch, sets
+    assert changes.skipped == 3
+    assert result["rows"] == 5
+    assert (result["created"], result["updated"]) == (1, 1)
+    # Skipped rows are still reported as done, so a ledger or journal records them
+    assert sorted(written) == [1, 2, 3, 4, 5]
+    query, = [q for q in collection.queries if q]
+    assert query == {"sample_id": {"$in": ["S1", "S2"]}}
+    doc = collection.find_one({"sample_id": "S1"})
+    assert [entry["message"] for entry in doc["timeline"]] == ["Align", "Call variants"]
+    assert len(collection.find_one({"sample_id": "S2"})["timeline"]) == 1
+
+
+def test_batch_of_only_unchanged_rows_sends_no_write():
+    collection = FakeCollection()
+    write_updates(collection, _items([_record()]))
+    collection.calls.clear()
+    changes = ChangeFilter(collection, cfg)
+    written = []
+    write_updates(collection, _items([_record(), _record()]), batch_size=1, changes=changes,
+                  on_batch=written.extend)
+    assert collection.calls == []
+    assert written == [1, 2]
+
+
+def test_new_fields_and_round_trips_are_written():
+    collection = FakeCollection()
+    write_updates(collection, _items([_record()]))
+    changes = ChangeFilter(collection, cfg)
+    write_updates(collection, _items([_record(sequencing_run_id="R1")]), changes=changes)
+    assert changes.skipped == 0
+    assert collection.find_one({"sample_id": "S1"})["sequencing_run_id"] == "R1"
+
+    # Ends where it started, but the coalesced update still carries the "ok" entry
+    records = [_record(status="ok", message="Done"), _record(sequencing_run_id="R1")]
+    write_updates(collection, coalesce_updates(_items(records)), changes=changes)
+    assert changes.skipped == 0
+    assert len(collection.find_one({"sample_id": "S1"})["timeline"]) == 4
+
+
+def test_checkpoint_column_on_plain_system_is_skipped():
+    collection = FakeCollection()
+    record = {"sample_id": "S1", "system": "cdm", "status": "running", "message": "Load",
+              "checkpoint": "x"}
+    write_updates(collection, _items([record]))
+    changes = ChangeFilter(collection, cfg)
+    write_updates(collection, _items([record]), changes=changes)
+    assert changes.skipped == 1
+    assert len(collection.find_one({"sample_id": "S1"})["timeline"]) == 1
+
+
+def test_checkpoint_system_without_checkpoint_is_skipped():
+    collection = FakeCollection()
+    record = {"sample_id": "S1", "system": "frontend", "status": "ok", "message": "Loaded"}
+    write_updates(collection, _items([record]))
+    doc = collection.find_one({"sample_id": "S1"})
+    assert doc["systems"]["frontend"]["checkpoints"]["default"]["status"]
+    changes = ChangeFilter(collection, cfg)
+    write_updates(collection, _items([record]), changes=changes)
+    assert changes.skipped == 1
+    assert len(collection.find_one({"sample_id": "S1"})["timeline"]) == 1
+
+
+def test_concurrent_writers_share_the_skipped_count():
+    collection = FakeCollection()
+    write_updates(collection, _items([_record(sample_id=f"S{i}") for i in range(6)]))
+    changes = ChangeFilter(collection, cfg)
+    write_updates_concurrent(collection, _items([_record(sample_id=f"S{i}") for i in range(6)]),
+                             workers=3, batch_size=1, changes=changes)
+    assert changes.skipped == 6
+
+
+def test_cli_upload_skip_unchanged(tmp_path, fake_collection, mongo_client):
+    path = tmp_path / "heartbeats.jsonl"
+    path.write_text('{"sample_id": "S1", "system": "bjorn", "status": "running", '
+                    '"message": "Align"}\n' * 3)
+    with patch("pymongo.MongoClient", return_value=mongo_client(fake_collection)):
+        result = CliRunner().invoke(main, ["upload", "-i", str(path), "--skip-unchanged",
+                                           "--batch-size", "1"])
+    assert result.exit_code == 0, result.output
+    assert "Skipped 2 unchanged rows" in result.output
+    assert "Done — 1 created, 0 updated" in result.output
+    assert len(fake_collection.docs[0]["timeline"]) == 1
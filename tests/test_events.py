@@ -0,0 +1,77 @@
+"""Tests for the append-only events collection mode."""
+
+import os
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from conftest import FakeCollection
+
+from samplenator_cli.cli import main
+from samplenator_cli.events import MIGRATED_FLAG, EventLog, migrate_timeline, split_timeline
+from samplenator_cli.writer import write_updates
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "system")
+
+
+def test_split_timeline_single_and_each():
+    update, entries = split_timeline({"$set": {"a": 1}, "$push": {"timeline": {"n": 1}}}, 3)
+    assert entries == [{"n": 1}]
+    assert update["$push"]["timeline"] == {"$each": [{"n": 1}], "$slice": -3}
+
+    update, entries = split_timeline({"$push": {"timeline": {"$each": [{"n": 1}, {"n": 2}]}}}, 1)
+    assert entries == [{"n": 1}, {"n": 2}]
+    assert update["$push"]["timeline"] == {"$each": [{"n": 1}, {"n": 2}], "$slice": -1}
+
+
+def test_event_log_only_inserts_applied_ops():
+    samples, events = FakeCollection(fail_ids={"S2"}), FakeCollection()
+    items = [
+        ([i], {"sample_id": sid}, {"$set": {"sample_id": sid}, "$push": {"timeline": {"n": i}}})
+        for i, sid in enumerate(["S1", "S2", "S1", "S1"], start=1)
+    ]
+    write_updates(samples, items, ordered=False, event_log=EventLog(events, window=2))
+    assert [(e["sample_id"], e["n"]) for e in events.docs] == [("S1", 1), ("S1", 3), ("S1", 4)]
+    assert samples.find_one({"sample_id": "S1"})["timeline"] == [{"n": 3}, {"n": 4}]
+
+
+def test_cli_upload_event_log(mongo_client):
+    samples, events = FakeCollection(), FakeCollection()
+    client = mongo_client({"sample_tracking": samples, "sample_events": events})
+    runner = CliRunner()
+    with patch("pymongo.MongoClient", return_value=client):
+        result = runner.invoke(main, ["upload", "-i", os.path.join(FIXTURES, "frontend.csv"),
+                                      "--event-log", "--timeline-window", "3"])
+    assert result.exit_code == 0, result.output
+    assert len(events.docs) == 7
+    assert events.indexes[0][1]["name"] == "sample_id_started_at"
+    timeline = samples.docs[0]["timeline"]
+    assert [e["checkpoint"] for e in timeline] == [e["checkpoint"] for e in events.docs[-3:]]
+
+
+def test_migrate_timeline_moves_and_trims():
+    samples, events = FakeCollection(), FakeCollection()
+    samples.docs = [
+        {"_id": 1, "sample_id": "S1", "timeline": [{"n": i} for i in range(5)]},
+        {"_id": 2, "sample_id": "S2", "timeline": []},
+        {"_id": 3, "sample_id": "S3", "timeline": [{"n": 0}]},
+    ]
+    totals = migrate_timeline(samples, events, window=2, batch_size=1)
+    assert totals == {"samples": 2, "events": 6}
+    assert samples.docs[0]["timeline"] == [{"n": 3}, {"n": 4}]
+    assert MIGRATED_FLAG.split(".")[1] in samples.docs[0]["timestamps"]
+    assert "timestamps" not in samples.docs[1]
+
+    assert migrate_timeline(samples, events, window=2) == {"samples": 0, "events": 0}
+    assert len(events.docs) == 6
+
+
+def test_cli_migrate_timeline(mongo_client):
+    samples, events = FakeCollection(), FakeCollection()
+    samples.docs = [{"_id": 1, "sample_id": "S1", "timeline": [{"n": 1}]}]
+    runner = CliRunner()
+    client = mongo_client({"sample_tracking": samples, "sample_events": events})
+    with patch("pymongo.MongoClient", return_value=client):
+        result = runner.invoke(main, ["migrate-timeline"])
+    assert result.exit_code == 0, result.output
+    assert "moved 1 timeline entries from 1 samples" in result.output
@@ -0,0 +1,72 @@
+"""Tests for NDJSON export of update documents and the apply command."""
+
+import gzip
+import json
+import os
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from conftest import FakeCollection
+
+from samplenator_cli.cli import main
+from samplenator_cli.export import dump_item, iter_export
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "system")
+
+
+def test_dump_and_load_round_trip_row_refs():
+    item = ([("a.csv", 3), ("a.csv", 4)], {"sample_id": "S1"}, {"$set": {"sample_id": "S1"}})
+    line = dump_item(item)
+    assert line.endswith("\n") and "\n" not in line[:-1]
+    assert list(iter_export([line])) == [item]
+
+
+def test_upload_export_streams_ndjson_to_stdout():
+    result = CliRunner().invoke(main, ["upload", "-i", os.path.join(FIXTURES, "cdm.csv"),
+                                       "--export", "-"])
+    assert result.exit_code == 0, result.output
+    lines = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [doc["rows"] for doc in lines] == [[1], [2]]
+    assert all(doc["filter"] == {"sample_id": doc["update"]["$set"]["sample_id"]} for doc in lines)
+    assert "exported 2 rows" in result.stderr
+
+
+def test_upload_export_keeps_no_file_on_validation_error(tmp_path):
+    src = tmp_path / "bad.csv"
+    src.write_text("sample_id,system,message,status\nS1,cdm,m,ok\nS2,cdm,m,bogus\n")
+    out = tmp_path / "updates.ndjson"
+    result = CliRunner().invoke(main, ["upload", "-i", str(src), "--export", str(out)])
+    assert result.exit_code == 1
+    assert "Row 2: invalid status" in result.output
+    assert os.listdir(tmp_path) == ["bad.csv"]
+
+
+def test_apply_replays_export(tmp_path, mongo_client):
+    out = tmp_path / "updates.ndjson"
+    runner = CliRunner()
+    result = runner.invoke(main, ["upload", "-i", os.path.join(FIXTURES, "cdm.csv"),
+                                  "--export", str(out)])
+    assert result.exit_code == 0, result.output
+    packed = tmp_path / "updates.ndjson.gz"
+    packed.write_bytes(gzip.compress(out.read_bytes()))
+
+    collection = FakeCollection()
+    with patch("pymongo.MongoClient", return_value=mongo_client(collection)):
+        result = runner.invoke(main, ["apply", "-i", str(packed)])
+    assert result.exit_code == 0, result.output
+    assert "1 created, 1 updated" in result.output
+    assert collection.calls == [2]
+    assert len(collection.docs[0]["timeline"]) == 2
+
+
+def test_apply_reports_write_errors_by_source_row(tmp_path, mongo_client):
+    out = tmp_path / "updates.ndjson"
+    item = ([("run.csv", 7)], {"sample_id": "BAD"}, {"$set": {"sample_id": "BAD"}})
+    out.write_text(dump_item(item) + "not json\n")
+    collection = FakeCollection(fail_ids={"BAD"})
+    with patch("pymongo.MongoClient", return_value=mongo_client(collection)):
+        result = CliRunner().invoke(main, ["apply", "-i", str(out), "--unordered"])
+    assert result.exit_code == 1
+    assert "run.csv: Row 7: Document failed validation" in result.output
+    assert f"{out}: Error reading file: Line 2: invalid JSON" in result.output
@@ -0,0 +1,99 @@
+"""Tests for index management and query-plan verification."""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+from click.testing import CliRunner
+from pymongo.errors import OperationFailure
+
+import samplenator_cli.config as cfg
+from samplenator_cli.cli import main
+from samplenator_cli.indexes import check_indexes, ensure_indexes, required_indexes, run_id_paths
+
+IXSCAN_PLAN = {"queryPlanner": {"winningPlan": {"stage": "FETCH",
+                                                "inputStage": {"stage": "IXSCAN"}}}}
+COLLSCAN_PLAN = {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}
+
+
+def _collection(plan, existing=None):
+    collection = MagicMock()
+    collection.find.return_value.explain.return_value = plan
+    if existing is None:
+        existing = {
+            model.document["name"]: {"key": list(model.document["key"].items()),
+                                     "unique": model.document.get("unique", False)}
+            for model in required_indexes(cfg)
+        }
+    collection.index_information.return_value = existing
+    collection.create_indexes.side_effect = lambda models: [m.document["name"] for m in models]
+    return collection
+
+
+def test_required_indexes_cover_upsert_key_and_readers():
+    specs = {m.document["name"]: m.document for m in required_indexes(cfg)}
+    assert specs["sample_id_unique"]["unique"] is True
+    assert "group_id" in specs and "sequencing_run_id" in specs
+    for system in cfg.KNOWN_SYSTEMS:
+        assert f"systems_{system}_last_seen_at" in specs
+    assert specs["systems_bjorn_ids_sequencing_run_id"]["sparse"] is True
+    assert "systems_clarity_ids_sequencing_run_id" not in specs
+
+
+def test_ensure_indexes_creates_all():
+    collection = _collection(IXSCAN_PLAN, existing={"_id_": {"key": [("_id", 1)]}})
+    names = ensure_indexes(collection, cfg)
+    assert names[0] == "sample_id_unique"
+    assert len(names) == 2 + len(run_id_paths(cfg)) + len(cfg.KNOWN_SYSTEMS)
+
+
+def test_ensure_indexes_keeps_existing_indexes_under_other_names():
+    existing = {"_id_": {"key": [("_id", 1)]},
+                "sample_id_1": {"key": [("sample_id", 1)], "unique": True},
+                "group_id_1": {"key": [("group_id", 1)]}}
+    collection = _collection(IXSCAN_PLAN, existing)
+    names = ensure_indexes(collection, cfg)
+    assert names[:3] == ["sample_id_1", "group_id_1", "sequencing_run_id"]
+    created = [m.document["name"] for m in collection.create_indexes.call_args.args[0]]
+    assert "sample_id_unique" not in created and "group_id" not in created
+    assert len(created) == len(names) - 2
+
+
+def test_ensure_indexes_creates_nothing_when_all_exist():
+    collection = _collection(IXSCAN_PLAN)
+    assert ensure_indexes(collection, cfg)[0] == "sample_id_unique"
+    collection.create_indexes.assert_not_called()
+
+
+def test_ensure_indexes_refuses_non_unique_sample_id_index():
+    collection = _collection(IXSCAN_PLAN, {"sid": {"key": [("sample_id", 1)]}})
+    with pytest.raises(OperationFailure, match="'sid' on sample_id must be unique"):
+        ensure_indexes(collection, cfg)
+    collection.create_indexes.assert_not_called()
+
+
+def test_check_indexes_ok():
+    assert check_indexes(_collection(IXSCAN_PLAN), cfg) == []
+
+
+def test_check_indexes_reports_missing_non_unique_and_collscan():
+    existing = {"_id_": {"key": [("_id", 1)]}, "sid": {"key": [("sample_id", 1)]}}
+    problems = check_indexes(_collection(COLLSCAN_PLAN, existing), cfg)
+    assert "index 'sid' on sample_id must be unique" in problems
+    assert any(p.startswith("missing index 'group_id'") for p in problems)
+    assert problems[-1] == "upsert filter on sample_id is not an index lookup (plan: COLLSCAN)"
+
+
+def test_cli_indexes_check_fails_loudly(mongo_client):
+    runner = CliRunner()
+    with patch("pymongo.MongoClient", return_value=mongo_client(_collection(COLLSCAN_PLAN))):
+        result = runner.invoke(main, ["indexes", "check"])
+    assert result.exit_code == 1
+    assert "not an index lookup" in result.output
+
+
+def test_cli_indexes_ensure(mongo_client):
+    runner = CliRunner()
+    with patch("pymongo.MongoClient", return_value=mongo_client(_collection(IXSCAN_PLAN))):
+        result = runner.invoke(main, ["indexes", "ensure"])
+    assert result.exit_code == 0, result.output
+    assert "sample_id_unique" in result.output
@@ -1,18 +1,32 @@
 """Tests for samplenator_cli ingest functions and CLI dry-run output."""
 
+import bz2
+import gzip
+import io
 import json
+import lzma
 import os
 from unittest.mock import patch
 
 import pytest
 from click.testing import CliRunner
+from pymongo import UpdateOne
+
+from conftest import FakeCollection
 
 import samplenator_cli.config as cfg
 from samplenator_cli.cli import main
 from samplenator_cli.ingest import (
     build_mongo_update,
+    coalesce_updates,
+    is_supported,
+    iter_file,
+    iter_stream,
+    iter_updates,
+    iter_validated,
     parse_file,
     resolve_aliases,
+    sniff_format,
     validate_record,
 )
 
@@ -60,6 +74,63 @@ def test_parse_file_unsupported_extension(tmp_path):
         parse_file(str(bad))
 
 
+def test_iter_file_reads_lazily(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("sample_id,system,message,status\nS1,cdm,a,ok\nS2,cdm,b,ok\n")
+    rows = iter_file(str(path))
+    assert next(rows)["sample_id"] == "S1"
+    path.write_text("")  # the open handle keeps reading the original content
+    assert next(rows)["sample_id"] == "S2"
+
+
+def test_iter_file_unsupported_extension_raises_eagerly(tmp_path):
+    bad = tmp_path / "data.json"
+    bad.write_text("{}")
+    with pytest.raises(ValueError, match="Unsupported file extension"):
+        iter_file(str(bad))
+
+
+# ---------------------------------------------------------------------------
+# iter_updates
+# ---------------------------------------------------------------------------
+
+def test_iter_updates_normalises_and_builds():
+    rows = [{"sample_id": " S1 ", "system": "CDM", "message": "m", "status": "OK", "extra": "x"}]
+    errors = []
+    (item,) = iter_updates(rows, cfg, errors)
+    assert errors == []
+    assert item[0] == [1]
+    assert item[1] == {"sample_id": "S1"}
+    assert item[2]["$set"]["systems.cdm.status"] == "started:true;completed:true"
+    assert "extra" not in item[2]["$set"]
+
+
+def test_iter_updates_stops_yielding_after_first_error():
+    rows = [
+        {"sample_id": "S1", "system": "cdm", "message": "m", "status": "ok"},
+        {"sample_id": "S2", "system": "cdm", "message": "m", "status": "bogus"},
+        {"sample_id": "S3", "system": "cdm", "message": "m", "status": "ok"},
+        {"sample_id": "S4", "system": "nope", "message": "m", "status": "ok"},
+    ]
+    errors = []
+    items = list(iter_updates(rows, cfg, errors))
+    assert [item[0] for item in items] == [[1]]
+    assert len(errors) == 2
+    assert errors[0].startswith("Row 2: invalid status")
+    assert errors[1].startswith("Row 4: unknown system")
+
+
+def test_iter_validated_numbers_rows_across_chunks():
+    rows = [{"sample_id": f"S{i}", "system": "cdm", "message": "m", "status": "ok"}
+            for i in range(1, 6)]
+    rows[3]["status"] = "bogus"
+    errors = []
+    refs = [ref for ref, _ in iter_validated(rows, cfg, errors, source="a.csv", chunk_size=2)]
+    assert refs == [("a.csv", 1), ("a.csv", 2), ("a.csv", 3)]
+    assert len(errors) == 1
+    assert errors[0].startswith("a.csv: Row 4: invalid status 'bogus'")
+
+
 # ---------------------------------------------------------------------------
 # resolve_aliases
 # ---------------------------------------------------------------------------
@@ -273,6 +344,60 @@ def test_build_update_checkpoint_timeline_entry():
     assert entry["system"] == "frontend"
 
 
+# ---------------------------------------------------------------------------
+# coalesce_updates
+# ---------------------------------------------------------------------------
+
+def _items_from_fixture(filename):
+    rows = resolve_aliases(parse_file(os.path.join(FIXTURES, filename)), cfg.FIELD_ALIASES)
+    return [
+        ([i], {"sample_id": r["sample_id"]}, _build({k: v for k, v in r.items() if v}))
+        for i, r in enumerate(rows, start=1)
+    ]
+
+
+def test_coalesce_updates_folds_rows_per_sample():
+    items = _items_from_fixture("frontend.csv")
+    coalesced = coalesce_updates(items)
+    assert len(coalesced) == 1
+    rows, filt, update = coalesced[0]
+    assert rows == [1, 2, 3, 4, 5, 6, 7]
+    assert filt == {"sample_id": "TEST-SAMPLE-001"}
+    names = [e["name"] for e in update["$push"]["timeline"]["$each"]]
+    assert names == [u["$push"]["timeline"]["name"] for _, _, u in items]
+
+
+def test_coalesce_updates_last_writer_wins():
+    items = _items_from_fixture("cdm.csv")
+    (_, _, update), = coalesce_updates(items)
+    assert update["$set"]["systems.cdm.message"] == "Uploaded to CDM"
+    assert update["$set"]["summary.queue_status"] == "completed"
+    # started_at only comes from the first row and must survive the merge
+    assert update["$set"]["systems.cdm.started_at"] == FIXED_NOW
+
+
+def test_coalesce_updates_keeps_samples_apart():
+    items = [
+        ([1], {"sample_id": "A"}, {"$set": {"x": 1}, "$push": {"timeline": {"n": 1}}}),
+        ([2], {"sample_id": "B"}, {"$set": {"x": 2}, "$push": {"timeline": {"n": 2}}}),
+        ([3], {"sample_id": "A"}, {"$set": {"x": 3}, "$push": {"timeline": {"n": 3}}}),
+    ]
+    coalesced = coalesce_updates(items)
+    assert [(rows, u["$set"]["x"]) for rows, _, u in coalesced] == [([1, 3], 3), ([2], 2)]
+    assert coalesced[0][2]["$push"]["timeline"] == {"$each": [{"n": 1}, {"n": 3}]}
+
+
+@pytest.mark.parametrize("filename", ["clarity.csv", "demux.csv", "pipeline.csv", "cdm.csv",
+                                      "frontend.csv"])
+def test_coalesce_updates_matches_sequential_state(filename):
+    items = _items_from_fixture(filename)
+    sequential, folded = FakeCollection(), FakeCollection()
+    for item in items:
+        sequential.bulk_write([UpdateOne(item[1], item[2], upsert=True)])
+    folded.bulk_write([UpdateOne(f, u, upsert=True) for _, f, u in coalesce_updates(items)])
+    assert folded.docs == sequential.docs
+
+
 # ---------------------------------------------------------------------------
 # CLI dry-run — end-to-end MongoDB update format
 # ---------------------------------------------------------------------------
@@ -341,3 +466,144 @@ def test_cli_dry_run_unsupported_format(tmp_path):
     runner = CliRunner()
     result = runner.invoke(main, ["upload", "-i", str(bad), "--dry-run"])
     assert result.exit_code != 0
+
+
+def test_cli_dry_run_coalesce():
+    runner = CliRunner()
+    result = runner.invoke(main, ["upload", "-i", os.path.join(FIXTURES, "frontend.csv"),
+                                  "--dry-run", "--coalesce"])
+    assert result.exit_code == 0
+    data = json.loads(result.output)
+    assert len(data["updates"]) == 1
+    assert len(data["updates"][0]["$push"]["timeline"]["$each"]) == 7
+
+
+# ---------------------------------------------------------------------------
+# JSON Lines and YAML streams
+# ---------------------------------------------------------------------------
+
+def test_iter_file_reads_json_lines(tmp_path):
+    path = tmp_path / "data.ndjson"
+    path.write_text('{"sample_id": "S1", "system": "cdm"}\n\n'
+                    '{"sample_id": "S2", "system": "cdm"}\n')
+    assert [row["sample_id"] for row in iter_file(str(path))] == ["S1", "S2"]
+
+
+@pytest.mark.parametrize("content, message", [
+    ('{"sample_id": "S1"}\n{"sample_id": \n', "Line 2: invalid JSON"),
+    ('["S1"]\n', "Line 1: JSON Lines record must be an object"),
+])
+def test_iter_file_rejects_bad_json_lines(tmp_path, content, message):
+    path = tmp_path / "data.jsonl"
+    path.write_text(content)
+    with pytest.raises(ValueError, match=message):
+        parse_file(str(path))
+
+
+def test_iter_file_reads_multi_document_yaml(tmp_path):
+    path = tmp_path / "data.yaml"
+    path.write_text("- sample_id: S1\n- sample_id: S2\n---\nsample_id: S3\n---\n")
+    assert [row["sample_id"] for row in iter_file(str(path))] == ["S1", "S2", "S3"]
+
+
+def test_cli_upload_reports_read_error_mid_stream(tmp_path):
+    path = tmp_path / "data.jsonl"
+    path.write_text('{"sample_id": "S1", "system": "cdm", "message": "m", "status": "ok"}\n'
+                    'not json\n')
+    result = CliRunner().invoke(main, ["upload", "-i", str(path), "--dry-run"])
+    assert result.exit_code == 1
+    assert "Error reading file: Line 2: invalid JSON" in result.output
+
+
+# ---------------------------------------------------------------------------
+# Compressed inputs
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize("suffix, opener", [(".gz", gzip.open), (".bz2", bz2.open),
+                                            (".xz", lzma.open)])
+@pytest.mark.parametrize("ext, content", [
+    (".tsv", "sample_id\tsystem\nS1\tcdm\nS2\tcdm\n"),
+    (".jsonl", '{"sample_id": "S1", "system": "cdm"}\n{"sample_id": "S2", "system": "cdm"}\n'),
+    (".yaml", "- sample_id: S1\n  system: cdm\n- sample_id: S2\n  system: cdm\n"),
+])
+def test_iter_file_decompresses(tmp_path, suffix, opener, ext, content):
+    path = str(tmp_path / f"data{ext}{suffix}")
+    with opener(path, "wt", encoding="utf-8") as f:
+        f.write(content)
+    assert is_supported(path)
+    assert [row["sample_id"] for row in iter_file(path)] == ["S1", "S2"]
+
+
+def test_iter_file_zstd(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    path = tmp_path / "data.csv.zst"
+    path.write_bytes(zstandard.ZstdCompressor().compress(b"sample_id,system\nS1,cdm\n"))
+    assert parse_file(str(path)) == [{"sample_id": "S1", "system": "cdm"}]
+
+
+@pytest.mark.parametrize("suffix", [".gz", ".xz", ".zst"])
+def test_cli_upload_reports_corrupt_compressed_file(tmp_path, suffix):
+    if suffix == ".zst":
+        pytest.importorskip("zstandard")
+    path = tmp_path / f"data.csv{suffix}"
+    path.write_bytes(b"this is not compressed data\n" * 4)
+    result = CliRunner().invoke(main, ["upload", "-i", str(path), "--dry-run"])
+    assert result.exit_code == 1
+    assert "Error reading file" in result.output
+    assert result.exception is None or isinstance(result.exception, SystemExit)
+
+
+def test_iter_file_zstd_without_zstandard(tmp_path):
+    path = tmp_path / "data.csv.zst"
+    path.write_bytes(b"")
+    with patch.dict("sys.modules", {"zstandard": None}):
+        with pytest.raises(ValueError, match="requires the zstandard package"):
+            iter_file(str(path))
+
+
+def test_is_supported_rejects_unknown_base_extension():
+    assert not is_supported("data.json.gz")
+    assert not is_supported("data.gz")
+
+
+# ---------------------------------------------------------------------------
+# stdin
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize("line, fmt", [
+    ('{"sample_id": "S1"}', "jsonl"),
+    ("- sample_id: S1", "yaml"),
+    ("sample_id: S1", "yaml"),
+    ("---", "yaml"),
+    ("sample_id,system,message,status", "csv"),
+    ("sample_id\tsystem\tmessage\tstatus", "tsv"),
+])
+def test_sniff_format(line, fmt):
+    assert sniff_format(line) == fmt
+
+
+def test_iter_stream_reads_only_the_first_line_to_sniff():
+    stream = io.StringIO("\nsample_id\tsystem\nS1\tcdm\n")
+    rows = iter_stream(stream)
+    assert stream.tell() == len("\nsample_id\tsystem\n")
+    assert list(rows) == [{"sample_id": "S1", "system": "cdm"}]
+    assert list(iter_stream(io.StringIO("\n\n"))) == []
+
+
+@pytest.mark.parametrize("args, content", [
+    ([], "sample_id,system,message,status\nS1,cdm,m,ok\n"),
+    (["--format", "jsonl"],
+     '{"sample_id": "S1", "system": "cdm", "message": "m", "status": "ok"}\n'),
+])
+def test_cli_upload_reads_stdin(args, content):
+    result = CliRunner().invoke(main, ["upload", "-i", "-", "--dry-run", *args], input=content)
+    assert result.exit_code == 0, result.output
+    (update,) = json.loads(result.output)["updates"]
+    assert update["$set"]["sample_id"] == "S1"
+
+
+def test_cli_upload_rejects_stdin_with_other_inputs():
+    result = CliRunner().invoke(main, ["upload", "-i", "-",
+                                       "-i", os.path.join(FIXTURES, "cdm.csv")])
+    assert result.exit_code == 2
+    assert "cannot be combined" in result.output
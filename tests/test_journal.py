@@ -0,0 +1,91 @@
+"""Tests for the resumable upload journal."""
+
+import json
+from unittest.mock import patch
+
+import pytest
+from click.testing import CliRunner
+from pymongo.errors import AutoReconnect
+
+from conftest import FakeCollection
+
+from samplenator_cli.cli import main
+from samplenator_cli.journal import Journal, in_ranges, merge_ranges
+
+
+class DroppingCollection(FakeCollection):
+    """Loses the connection on every bulk_write after the first `ok_calls`."""
+
+    def __init__(self, ok_calls):
+        super().__init__()
+        self.ok_calls = ok_calls
+
+    def bulk_write(self, ops, ordered=True):
+        if len(self.calls) >= self.ok_calls:
+            raise AutoReconnect("connection reset")
+        return super().bulk_write(ops, ordered=ordered)
+
+
+def _csv(path, n):
+    rows = "".join(f"S{i},cdm,m{i},ok\n" for i in range(1, n + 1))
+    path.write_text("sample_id,system,message,status\n" + rows)
+    return str(path)
+
+
+def test_merge_ranges_and_lookup():
+    ranges = merge_ranges([], [3, 1, 2, 7])
+    assert ranges == [[1, 3], [7, 7]]
+    ranges = merge_ranges(ranges, [5, 4, 6, 9])
+    assert ranges == [[1, 7], [9, 9]]
+    assert [row for row in range(11) if in_ranges(ranges, row)] == [1, 2, 3, 4, 5, 6, 7, 9]
+
+
+def test_journal_resume_skips_committed_rows(tmp_path):
+    src = _csv(tmp_path / "a.csv", 3)
+    path = str(tmp_path / "journal.json")
+    journal = Journal(path, [src])
+    journal.commit([1, 3])
+
+    resumed = Journal(path, [src], resume=True)
+    records = [(i, {}) for i in (1, 2, 3)]
+    assert [ref for ref, _ in resumed.filter_new(records)] == [2]
+    assert resumed.skipped == 2
+    assert [ref for ref, _ in Journal(path, [src]).filter_new(records)] == [1, 2, 3]
+
+
+def test_journal_refuses_changed_input(tmp_path):
+    src = _csv(tmp_path / "a.csv", 3)
+    path = str(tmp_path / "journal.json")
+    Journal(path, [src]).commit([1])
+    _csv(tmp_path / "a.csv", 4)
+    with pytest.raises(ValueError, match="has changed"):
+        Journal(path, [src], resume=True)
+
+
+def test_cli_upload_resumes_after_connection_loss(tmp_path, mongo_client):
+    src = _csv(tmp_path / "a.csv", 5)
+    journal = str(tmp_path / "journal.json")
+    args = ["upload", "-i", src, "--batch-size", "2", "--journal", journal, "--retries", "0"]
+    runner = CliRunner()
+
+    dropping = DroppingCollection(ok_calls=2)
+    with patch("pymongo.MongoClient", return_value=mongo_client(dropping)):
+        result = runner.invoke(main, args)
+    assert result.exit_code == 1
+    assert "Error writing to MongoDB: connection reset" in result.output
+    assert "--resume" in result.output
+    with open(journal, encoding="utf-8") as f:
+        assert json.load(f)["files"][src]["committed"] == [[1, 4]]
+
+    collection = FakeCollection()
+    with patch("pymongo.MongoClient", return_value=mongo_client(collection)):
+        result = runner.invoke(main, [*args, "--resume"])
+    assert result.exit_code == 0, result.output
+    assert "skipped 4 rows already written" in result.output
+    assert [doc["sample_id"] for doc in collection.docs] == ["S5"]
+
+
+def test_cli_resume_requires_journal(tmp_path):
+    result = CliRunner().invoke(main, ["upload", "-i", _csv(tmp_path / "a.csv", 1), "--resume"])
+    assert result.exit_code == 2
+    assert "requires --journal" in result.output
@@ -0,0 +1,102 @@
+"""Tests for the content-hash ingest ledger."""
+
+import os
+import time
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from conftest import FakeCollection
+
+from samplenator_cli.cli import main
+from samplenator_cli.ledger import Ledger, ledger_target, record_hash
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "system")
+
+
+def _records(*sample_ids):
+    return [(i, {"sample_id": sid, "system": "cdm", "message": "m", "status": "ok"})
+            for i, sid in enumerate(sample_ids, start=1)]
+
+
+def test_record_hash_ignores_key_order():
+    assert record_hash({"a": "1", "b": "2"}) == record_hash({"b": "2", "a": "1"})
+    assert record_hash({"a": "1"}) != record_hash({"a": "2"})
+    first, second = ("mongodb://h/db.c1",), ("mongodb://h/db.c2",)
+    assert record_hash({"a": "1"}, first) != record_hash({"a": "1"}, second)
+
+
+def test_ledger_target_drops_credentials_and_options():
+    assert ledger_target("mongodb://user:p@ss@h1:27017,h2/admin?tls=true", "lab", "samples") == \
+        "mongodb://h1:27017,h2/lab.samples"
+    assert ledger_target("mongodb://localhost", "lab", "samples") == \
+        "mongodb://localhost/lab.samples"
+
+
+def test_ledger_entries_are_per_target(tmp_path):
+    ledger = Ledger(str(tmp_path / "ledger.db"), "mongodb://h/lab.samples")
+    list(ledger.filter_new(_records("S1")))
+    ledger.commit([1])
+    ledger.close()
+
+    ledger = Ledger(str(tmp_path / "ledger.db"), "mongodb://h/lab.staging")
+    assert [ref for ref, _ in ledger.filter_new(_records("S1"))] == [1]
+
+
+def test_ledger_by_position_keeps_a_repeated_record(tmp_path):
+    # running -> ok -> running: the second "running" is a real transition, not a duplicate
+    records = _records("S1", "S2", "S1")
+    ledger = Ledger(str(tmp_path / "ledger.db"), by_position=True)
+    assert [ref for ref, _ in ledger.filter_new(records, "runs.csv")] == [1, 2, 3]
+    ledger.commit([1, 2, 3])
+    ledger.close()
+
+    # The same rows of a re-run file are skipped, wherever the file now lives
+    ledger = Ledger(str(tmp_path / "ledger.db"), by_position=True)
+    assert list(ledger.filter_new(records, "/exports/runs.csv")) == []
+    multi = [(("/exports/runs.csv", ref), record) for ref, record in records]
+    assert list(ledger.filter_new(multi)) == []
+    assert [ref for ref, _ in ledger.filter_new(records, "other.csv")] == [1, 2, 3]
+
+
+def test_filter_new_skips_committed_and_in_run_duplicates(tmp_path):
+    ledger = Ledger(str(tmp_path / "ledger.db"))
+    assert [ref for ref, _ in ledger.filter_new(_records("S1", "S2", "S1"))] == [1, 2]
+    assert ledger.skipped == 1
+    ledger.commit([1])  # row 2 was never written
+    ledger.close()
+
+    ledger = Ledger(str(tmp_path / "ledger.db"))
+    assert [ref for ref, _ in ledger.filter_new(_records("S1", "S2"))] == [2]
+
+
+def test_ledger_evicts_by_count_and_age(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    ledger = Ledger(path)
+    list(ledger.filter_new(_records("S1", "S2", "S3")))
+    for ref in (1, 2, 3):
+        ledger.commit([ref])
+        time.sleep(0.01)
+    ledger.close()
+
+    ledger = Ledger(path, max_entries=1)
+    assert [ref for ref, _ in ledger.filter_new(_records("S1", "S2", "S3"))] == [1, 2]
+    ledger.close()
+
+    ledger = Ledger(path, max_age_days=0)
+    assert len(list(ledger.filter_new(_records("S1", "S2", "S3")))) == 3
+
+
+def test_cli_upload_ledger_skips_rerun(tmp_path, mongo_client):
+    collection = FakeCollection()
+    client = mongo_client(collection)
+    args = ["upload", "-i", os.path.join(FIXTURES, "cdm.csv"),
+            "--ledger", str(tmp_path / "ledger.db")]
+    runner = CliRunner()
+    with patch("pymongo.MongoClient", return_value=client):
+        first = runner.invoke(main, args)
+        second = runner.invoke(main, args)
+    assert first.exit_code == 0 and second.exit_code == 0
+    assert "Skipped 2 already-ingested rows" in second.output
+    assert collection.calls == [2]
+    assert len(collection.docs[0]["timeline"]) == 2
@@ -0,0 +1,99 @@
+"""Tests for the precompiled ingest plan."""
+
+import os
+from unittest.mock import patch
+
+import pytest
+
+import samplenator_cli.config as cfg
+from samplenator_cli.ingest import (
+    build_items,
+    build_mongo_update,
+    iter_aliases,
+    parse_file,
+    validate_record,
+)
+from samplenator_cli.plan import IngestPlan, compile_plan
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "system")
+
+
+def test_compile_plan_is_cached_and_passes_plans_through():
+    plan = compile_plan(cfg)
+    assert isinstance(plan, IngestPlan)
+    assert compile_plan(cfg) is plan
+    assert compile_plan(plan) is plan
+
+
+@pytest.mark.parametrize("filename", ["clarity.csv", "demux.csv", "bjorn.csv", "pipeline.csv",
+                                      "cdm.csv", "frontend.csv"])
+def test_build_items_shares_one_timestamp_per_batch(filename):
+    rows = list(iter_aliases(parse_file(os.path.join(FIXTURES, filename)), cfg.FIELD_ALIASES))
+    plan = compile_plan(cfg)
+    records = [(i, plan.normalise(r)) for i, r in enumerate(rows, start=1)]
+    items = list(build_items(records, cfg))
+    stamps = {update["$set"]["timestamps.updated_at"] for _, _, update in items}
+    assert len(stamps) == 1
+    now = stamps.pop()
+    expected = [build_mongo_update(r, cfg, now=now) for _, r in records]
+    assert [update for _, _, update in items] == expected
+    assert len(items) == len(rows)
+
+
+def test_build_items_refreshes_timestamp_by_count_and_age():
+    record = {"sample_id": "S1", "system": "bjorn", "message": "m", "status": "ok"}
+    stamps = iter(f"2026-01-01T00:00:0{i}Z" for i in range(10))
+    with patch("samplenator_cli.ingest.utc_now", lambda: next(stamps)):
+        items = list(build_items(((i, record) for i in range(5)), cfg, timestamp_every=2))
+        stamped = [u["$set"]["timestamps.updated_at"][-2:] for _, _, u in items]
+        assert stamped == ["0Z", "0Z", "1Z", "1Z", "2Z"]
+
+        clock = iter([0.0, 0.1, 0.2, 5.0, 5.0])
+        with patch("samplenator_cli.ingest.time.monotonic", lambda: next(clock)):
+            # A slow producer: the third row arrives five seconds after the first
+            items = list(build_items(((i, record) for i in range(3)), cfg, timestamp_max_age=1.0))
+    assert [u["$set"]["timestamps.updated_at"][-2:] for _, _, u in items] == ["3Z", "3Z", "4Z"]
+
+
+@pytest.mark.parametrize("record", [
+    {"sample_id": "S1", "system": "bjorn", "message": "ok", "status": "ok"},
+    {"sample_id": "", "system": " Nope ", "status": "WAT"},
+    {"system": None, "status": None},
+])
+def test_plan_validate_matches_validate_record(record):
+    expected = validate_record(record, cfg.REQUIRED_FIELDS, cfg.VALID_STATUSES, cfg.KNOWN_SYSTEMS)
+    assert compile_plan(cfg).validate(record) == expected
+
+
+def test_validate_batch_matches_validate_record():
+    records = [
+        {"sample_id": "S1", "system": "bjorn", "message": "ok", "status": "ok"},
+        {"sample_id": "", "system": " Nope ", "status": "WAT", "message": " "},
+        {"system": None, "status": None},
+        {"sample_id": "S2", "system": "CDM", "message": "\t", "status": " Fail "},
+        {"sample_id": 7, "system": "cdm", "message": "m", "status": True},
+        {"sample_id": "S1", "system": "bjorn", "message": "ok", "status": "ok"},
+    ]
+    expected = [validate_record(r, cfg.REQUIRED_FIELDS, cfg.VALID_STATUSES, cfg.KNOWN_SYSTEMS)
+                for r in records]
+    failures = compile_plan(cfg).validate_batch(records)
+    assert [failures.get(i, []) for i in range(len(records))] == expected
+    assert set(failures) == {1, 2, 3, 4}
+
+
+def test_validate_batch_falls_back_for_unhashable_values():
+    records = [{"sample_id": ["S1"], "system": "cdm", "message": "m", "status": {"x": 1}}]
+    expected = validate_record(records[0], cfg.REQUIRED_FIELDS, cfg.VALID_STATUSES,
+                               cfg.KNOWN_SYSTEMS)
+    assert compile_plan(cfg).validate_batch(records) == {0: expected}
+
+
+def test_iter_aliases_handles_mixed_headers():
+    rows = [{"sampleid": "S1", "tool": "cdm"}, {"sample": "S2", "entity": "demux"},
+            {"sampleid": "S3", "tool": "pipeline"}]
+    resolved = list(iter_aliases(rows, cfg.FIELD_ALIASES))
+    assert resolved == [
+        {"sample_id": "S1", "system": "cdm"},
+        {"sample_id": "S2", "system": "demux"},
+        {"sample_id": "S3", "system": "pipeline"},
+    ]
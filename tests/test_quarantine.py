@@ -0,0 +1,154 @@
+"""Tests for --on-error quarantine and rejects files."""
+
+import csv
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+import samplenator_cli.config as cfg
+from samplenator_cli.cli import EXIT_PARTIAL, main
+from samplenator_cli.ingest import iter_file, iter_quarantined
+from samplenator_cli.quarantine import Rejects, is_rejects, rejects_path
+from samplenator_cli.sources import expand_inputs
+
+CSV = (
+    "SampleID,system,message,status\n"
+    "S1,cdm,a,ok\n"
+    ",cdm,b,ok\n"
+    "S3,cdm,c,bogus,extra\n"
+    "S4,cdm,d,ok\n"
+)
+
+
+def test_iter_quarantined_passes_raw_rows_on_and_keeps_going():
+    rows = [{"SampleID": "S1", "system": "cdm", "message": "a", "status": "ok"},
+            {"SampleID": "S2", "system": "cdm", "message": "b", "status": "bogus"},
+            {"SampleID": "S3", "system": "cdm", "message": "c", "status": "ok"}]
+    rejected = []
+    valid = list(iter_quarantined(rows, cfg, lambda *args: rejected.append(args), chunk_size=2))
+    assert [ref for ref, _ in valid] == [1, 3]
+    assert valid[0][1]["sample_id"] == "S1"
+    ref, row, messages = rejected[0]
+    assert (ref, row) == (2, rows[1])
+    assert messages[0].startswith("invalid status 'bogus'")
+
+
+def test_rejects_path():
+    assert rejects_path("in/runs.csv.gz", "csv") == "in/runs.rejects.csv"
+    assert rejects_path("in/runs.yml", "yaml", "out") == "out/runs.rejects.yml"
+    assert rejects_path("-", "jsonl", "out") == "out/stdin.rejects.jsonl"
+
+
+def test_rejects_round_trip_in_each_format(tmp_path):
+    row = {"sample_id": "S1", "system": "cdm", "status": "bogus", "message": "a"}
+    for fmt, ext in (("csv", "csv"), ("tsv", "tsv"), ("yaml", "yaml"), ("jsonl", "jsonl")):
+        path = str(tmp_path / f"runs.rejects.{ext}")
+        rejects = Rejects(path, fmt)
+        rejects(2, row, ["first", "second"])
+        rejects(("runs", 5), row, ["third"])
+        assert rejects.close() == (2, path, ["Row 2: first", "Row 2: second", "runs: Row 5: third"])
+        read = list(iter_file(path))
+        assert [str(r["_row"]) for r in read] == ["2", "5"]
+        assert {k: v for k, v in read[0].items() if not k.startswith("_")} == row
+
+
+def test_rejects_without_rows_writes_no_file(tmp_path):
+    path = tmp_path / "runs.rejects.csv"
+    assert Rejects(str(path), "csv").close() == (0, None, [])
+    assert not path.exists()
+
+
+def test_cli_upload_quarantine_writes_valid_rows(tmp_path, fake_collection, mongo_client):
+    path = tmp_path / "runs.csv"
+    path.write_text(CSV)
+    with patch("pymongo.MongoClient", return_value=mongo_client(fake_collection)):
+        result = CliRunner().invoke(main, ["upload", "-i", str(path), "--on-error", "quarantine"])
+    assert result.exit_code == EXIT_PARTIAL, result.output
+    assert [d["sample_id"] for d in fake_collection.docs] == ["S1", "S4"]
+    assert "Row 2: missing required field: 'sample_id'" in result.output
+    assert f"Quarantined 2 invalid rows to {tmp_path / 'runs.rejects.csv'}" in result.output
+
+    with open(tmp_path / "runs.rejects.csv", newline="") as f:
+        rejected = list(csv.reader(f))
+    assert rejected[0] == ["_row", "_errors", "SampleID", "system", "message", "status"]
+    assert rejected[1] == ["2", "missing required field: 'sample_id'", "", "cdm", "b", "ok"]
+    assert rejected[2][0] == "3"
+    assert rejected[2][2:] == ["S3", "cdm", "c", "bogus", "extra"]
+
+
+def test_cli_upload_quarantine_across_files_and_processes(tmp_path, fake_collection, mongo_client):
+    (tmp_path / "a.csv").write_text(CSV)
+    (tmp_path / "b.jsonl").write_text(
+        '{"sample_id": "S9", "system": "cdm", "message": "x", "status": "ok"}\n'
+        '{"sample_id": "S8", "system": "nope", "message": "x", "status": "ok"}\n'
+    )
+    rejects_dir = tmp_path / "rejects"
+    rejects_dir.mkdir()
+    with patch("pymongo.MongoClient", return_value=mongo_client(fake_collection)):
+        result = CliRunner().invoke(main, ["upload", "-i", str(tmp_path / "a.csv"),
+                                           "-i", str(tmp_path / "b.jsonl"),
+                                           "--processes", "2", "--on-error", "quarantine",
+                                           "--rejects-dir", str(rejects_dir)])
+    assert result.exit_code == EXIT_PARTIAL, result.output
+    assert sorted(d["sample_id"] for d in fake_collection.docs) == ["S1", "S4", "S9"]
+    assert sorted(p.name for p in rejects_dir.iterdir()) == ["a.rejects.csv", "b.rejects.jsonl"]
+
+
+def test_cli_upload_quarantine_clean_input_exits_zero(tmp_path, fake_collection, mongo_client):
+    path = tmp_path / "runs.csv"
+    path.write_text("sample_id,system,message,status\nS1,cdm,a,ok\n")
+    with patch("pymongo.MongoClient", return_value=mongo_client(fake_collection)):
+        result = CliRunner().invoke(main, ["upload", "-i", str(path), "--on-error", "quarantine"])
+    assert result.exit_code == 0, result.output
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_cli_dry_run_quarantine_reports_without_writing(tmp_path):
+    result = CliRunner().invoke(main, ["upload", "-i", "-", "--on-error", "quarantine", "--dry-run",
+                                       "--rejects-dir", str(tmp_path)], input=CSV)
+    assert result.exit_code == EXIT_PARTIAL
+    assert "Quarantined 2 invalid rows\n" in result.output
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cli_rejects_dir_requires_quarantine(tmp_path):
+    result = CliRunner().invoke(main, ["upload", "-i", "x.csv", "--rejects-dir", str(tmp_path)])
+    assert result.exit_code == 2
+    assert "requires --on-error quarantine" in result.output
+
+
+def test_cli_quarantine_same_basename_keeps_every_rejects_file(tmp_path, fake_collection,
+                                                                mongo_client):
+    for folder in ("a", "b"):
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / "run.csv").write_text(
+            f"sample_id,system,message,status\n{folder}1,cdm,x,bogus\n")
+    rejects_dir = tmp_path / "rejects"
+    rejects_dir.mkdir()
+    (rejects_dir / "run.rejects.csv").write_text("left by an earlier run\n")
+    with patch("pymongo.MongoClient", return_value=mongo_client(fake_collection)):
+        result = CliRunner().invoke(main, ["upload", "-i", str(tmp_path / "a"),
+                                           "-i", str(tmp_path / "b"), "--processes", "2",
+                                           "--on-error", "quarantine",
+                                           "--rejects-dir", str(rejects_dir)])
+    assert result.exit_code == EXIT_PARTIAL, result.output
+    assert (rejects_dir / "run.rejects.csv").read_text() == "left by an earlier run\n"
+    written = sorted(p.name for p in rejects_dir.iterdir() if p.name != "run.rejects.csv")
+    assert written == ["run.rejects.2.csv", "run.rejects.3.csv"]
+    ids = sorted(row["sample_id"] for name in written for row in iter_file(str(rejects_dir / name)))
+    assert ids == ["a1", "b1"]
+
+
+def test_rejects_files_are_not_picked_up_from_directories(tmp_path, fake_collection, mongo_client):
+    (tmp_path / "run.csv").write_text(CSV)
+    with patch("pymongo.MongoClient", return_value=mongo_client(fake_collection)):
+        for _ in range(2):
+            result = CliRunner().invoke(main, ["upload", "-i", str(tmp_path),
+                                               "--on-error", "quarantine"])
+            assert result.exit_code == EXIT_PARTIAL, result.output
+    assert sorted(p.name for p in tmp_path.iterdir()) == \
+        ["run.csv", "run.rejects.2.csv", "run.rejects.csv"]
+    assert expand_inputs([str(tmp_path)]) == [str(tmp_path / "run.csv")]
+    assert expand_inputs([str(tmp_path / "*.csv")]) == [str(tmp_path / "run.csv")]
+    assert expand_inputs([str(tmp_path / "run*")]) == [str(tmp_path / "run.csv")]
+    assert is_rejects("out/run.rejects.2.csv") and not is_rejects("run.csv")
@@ -0,0 +1,78 @@
+"""Tests for retrying writes on transient MongoDB errors."""
+
+import pytest
+from pymongo.errors import (
+    AutoReconnect,
+    BulkWriteError,
+    NetworkTimeout,
+    OperationFailure,
+    ServerSelectionTimeoutError,
+    WaitQueueTimeoutError,
+)
+
+from samplenator_cli.retry import RetryingCollection, backoff_delay, call_with_retry, is_transient
+
+
+def _flaky(errors, result="ok"):
+    errors = list(errors)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return result
+    return fn, calls
+
+
+def test_is_transient():
+    assert is_transient(ServerSelectionTimeoutError("no primary"))
+    assert is_transient(WaitQueueTimeoutError("pool exhausted"))
+    assert is_transient(OperationFailure("not primary", 10107,
+                                         {"errorLabels": ["NoWritesPerformed"]}))
+    # These can come after the server applied the batch; re-sending would push timeline
+    # entries twice
+    assert not is_transient(AutoReconnect("lost"))
+    assert not is_transient(NetworkTimeout("slow"))
+    assert not is_transient(OperationFailure("not primary", 10107,
+                                             {"errorLabels": ["RetryableWriteError"]}))
+    assert not is_transient(OperationFailure("bad", 2))
+    assert not is_transient(BulkWriteError({"writeErrors": [],
+                                            "errorLabels": ["RetryableWriteError"]}))
+
+
+def test_call_with_retry_backs_off_then_succeeds():
+    fn, calls = _flaky([ServerSelectionTimeoutError("a"), WaitQueueTimeoutError("b")])
+    delays, messages = [], []
+    result = call_with_retry(fn, retries=3, backoff=1.0, log=messages.append, sleep=delays.append)
+    assert result == "ok"
+    assert len(calls) == 3
+    assert 0 <= delays[0] <= 1.0 and 0 <= delays[1] <= 2.0
+    assert "(2/3)" in messages[1]
+
+
+def test_call_with_retry_gives_up():
+    fn, calls = _flaky([ServerSelectionTimeoutError("a")] * 3)
+    with pytest.raises(ServerSelectionTimeoutError):
+        call_with_retry(fn, retries=2, sleep=lambda _: None)
+    assert len(calls) == 3
+
+    fn, calls = _flaky([NetworkTimeout("sent, maybe applied")])
+    with pytest.raises(NetworkTimeout):
+        call_with_retry(fn, retries=5, sleep=lambda _: None)
+    assert len(calls) == 1
+
+    fn, calls = _flaky([OperationFailure("bad", 2)])
+    with pytest.raises(OperationFailure):
+        call_with_retry(fn, retries=5, sleep=lambda _: None)
+    assert len(calls) == 1
+
+
+def test_backoff_delay_is_capped():
+    assert all(0 <= backoff_delay(attempt, 0.5, max_backoff=2.0) <= 2.0 for attempt in range(20))
+
+
+def test_retrying_collection_passes_other_attributes_through(fake_collection):
+    collection = RetryingCollection(fake_collection, retries=0)
+    collection.insert_many([{"a": 1}])
+    assert collection.find_one({"a": 1})["a"] == 1
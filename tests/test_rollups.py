@@ -0,0 +1,137 @@
+"""Tests for the per-run and per-group rollups collection."""
+
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from conftest import FakeCollection
+
+import samplenator_cli.config as cfg
+from samplenator_cli.cli import main
+from samplenator_cli.ingest import build_items
+from samplenator_cli.rollups import Rollups, advance, contribution, rebuild_rollups, sample_state
+from samplenator_cli.writer import write_updates, write_updates_concurrent
+
+RECORDS = [
+    {"sample_id": "S1", "system": "bjorn", "status": "running", "message": "a",
+     "sequencing_run_id": "R1", "group_id": "G1"},
+    {"sample_id": "S2", "system": "clarity", "status": "started", "message": "b",
+     "checkpoint": "reception", "sequencing_run_id": "R1", "group_id": "G2"},
+    {"sample_id": "S1", "system": "bjorn", "status": "ok", "message": "c"},
+    {"sample_id": "S3", "system": "bjorn", "status": "fail", "message": "d",
+     "sequencing_run_id": "R2"},
+    {"sample_id": "S2", "system": "clarity", "status": "ok", "message": "e",
+     "checkpoint": "reception"},
+    {"sample_id": "S4", "system": "bjorn", "status": "ok", "message": "f"},
+]
+
+
+def _write(samples, rollups_collection, records, **kwargs):
+    return write_updates(samples, build_items(enumerate(records, start=1), cfg),
+                         rollups=Rollups(rollups_collection, samples), **kwargs)
+
+
+def _by_id(collection):
+    return {doc["_id"]: doc for doc in collection.docs}
+
+
+def test_advance_reads_statuses_and_scopes_from_set():
+    empty = sample_state({})
+    state = advance(empty, {"$set": {"sequencing_run_id": "R1",
+                                     "summary.queue_status": "in_progress",
+                                     "systems.bjorn.status": "x",
+                                     "systems.clarity.checkpoints.reception.status": "y"}})
+    assert state == {"scopes": {"sequencing_run_id": "R1"}, "queue_status": "in_progress",
+                     "statuses": {"bjorn": "x", "clarity.reception": "y"}}
+    doc = {"sequencing_run_id": "R1", "summary": {"queue_status": "in_progress"},
+           "systems": {"bjorn": {"status": "x"},
+                       "clarity": {"checkpoints": {"reception": {"status": "y"}}}}}
+    assert sample_state(doc) == state
+    assert contribution(state) == {"sequencing_run_id:R1": {
+        "samples": 1, "queue_status.in_progress": 1,
+        "systems.bjorn.x": 1, "systems.clarity.reception.y": 1,
+    }}
+
+
+def test_incremental_rollups_match_rebuild():
+    samples, rollups = FakeCollection(), FakeCollection()
+    # Small batches so states carry over between batches as well as within them
+    _write(samples, rollups, RECORDS, batch_size=2)
+    incremental = _by_id(rollups)
+
+    run = incremental["sequencing_run_id:R1"]
+    assert (run["field"], run["value"], run["samples"]) == ("sequencing_run_id", "R1", 2)
+    assert run["queue_status"] == {"in_progress": 0, "completed": 2}
+    assert run["systems"]["bjorn"] == {"started:true;completed:false": 0,
+                                       "started:true;completed:true": 1}
+    assert run["systems"]["clarity"]["reception"]["started:true;completed:true"] == 1
+    assert incremental["group_id:G2"]["samples"] == 1
+    # S4 has no run or group and is not counted anywhere
+    assert set(incremental) == {"sequencing_run_id:R1", "sequencing_run_id:R2",
+                                "group_id:G1", "group_id:G2"}
+
+    rebuilt = FakeCollection()
+    assert rebuild_rollups(samples, rebuilt) == {"samples": 4, "rollups": 4}
+
+    def nonzero(doc):
+        if isinstance(doc, dict):
+            return {k: nonzero(v) for k, v in doc.items() if v != 0}
+        return doc
+    assert {k: nonzero(v) for k, v in incremental.items()} == _by_id(rebuilt)
+
+
+def test_rollups_follow_a_sample_into_a_new_run():
+    samples, rollups = FakeCollection(), FakeCollection()
+    _write(samples, rollups, RECORDS[:1])
+    _write(samples, rollups, [{**RECORDS[2], "sequencing_run_id": "R9"}])
+    docs = _by_id(rollups)
+    assert docs["sequencing_run_id:R1"]["samples"] == 0
+    assert docs["sequencing_run_id:R1"]["systems"]["bjorn"]["started:true;completed:false"] == 0
+    assert docs["sequencing_run_id:R9"]["samples"] == 1
+    assert docs["sequencing_run_id:R9"]["systems"]["bjorn"] == {"started:true;completed:true": 1}
+
+
+def test_rollups_skip_failed_ops_and_use_one_lookup_per_batch():
+    samples, rollups = FakeCollection(fail_ids={"S2"}), FakeCollection()
+    _write(samples, rollups, RECORDS[:2], ordered=False)
+    assert [q["sample_id"]["$in"] for q in samples.queries] == [["S1", "S2"]]
+    assert rollups.calls == [2]
+    assert set(_by_id(rollups)) == {"sequencing_run_id:R1", "group_id:G1"}
+
+
+def test_rollups_with_concurrent_writers():
+    samples, rollups = FakeCollection(), FakeCollection()
+    write_updates_concurrent(samples, build_items(enumerate(RECORDS, start=1), cfg), workers=3,
+                             batch_size=1, rollups=Rollups(rollups, samples))
+    assert _by_id(rollups)["sequencing_run_id:R1"]["queue_status"]["completed"] == 2
+
+
+def test_rebuild_replaces_drifted_and_deletes_stale_rollups():
+    samples, rollups = FakeCollection(), FakeCollection()
+    _write(samples, rollups, RECORDS)
+    rollups.docs[0]["samples"] = 99
+    rollups.docs.append({"_id": "group_id:GONE", "samples": 1})
+    rebuild_rollups(samples, rollups, batch_size=2)
+    docs = _by_id(rollups)
+    assert docs["sequencing_run_id:R1"]["samples"] == 2
+    assert "group_id:GONE" not in docs
+
+
+def test_cli_upload_with_rollups_and_rebuild(tmp_path, mongo_client):
+    samples, rollups = FakeCollection(), FakeCollection()
+    collections = {cfg.MONGO_COLLECTION: samples, "run_rollups": rollups}
+    path = tmp_path / "runs.jsonl"
+    path.write_text('{"sample_id": "S1", "system": "bjorn", "status": "ok", "message": "a", '
+                    '"run_id": "R1"}\n')
+    with patch("pymongo.MongoClient", return_value=mongo_client(collections)):
+        result = CliRunner().invoke(main, ["upload", "-i", str(path), "--rollups",
+                                           "--rollups-collection", "run_rollups"])
+        assert result.exit_code == 0, result.output
+        assert _by_id(rollups)["sequencing_run_id:R1"]["samples"] == 1
+
+        rollups.docs.clear()
+        result = CliRunner().invoke(main, ["rollups", "rebuild"],
+                                    env={"SAMPLENATOR_ROLLUPS_COLLECTION": "run_rollups"})
+    assert result.exit_code == 0, result.output
+    assert "Done — 1 rollups from 1 samples" in result.output
+    assert _by_id(rollups)["sequencing_run_id:R1"]["queue_status"] == {"completed": 1}
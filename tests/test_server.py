@@ -0,0 +1,132 @@
+"""Tests for the micro-batching ingest daemon and its send client."""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen
+
+import pytest
+from click.testing import CliRunner
+
+from conftest import FakeCollection
+
+import samplenator_cli.config as cfg
+from samplenator_cli.cli import main
+from samplenator_cli.client import send_records, send_unix
+from samplenator_cli.server import Batcher, open_server
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "system")
+
+
+def _record(sample_id, status="started", system="clarity"):
+    return {"sample_id": sample_id, "system": system, "status": status, "message": "Reception"}
+
+
+@pytest.fixture
+def serving(tmp_path):
+    """Start a server over a FakeCollection; yields a function taking Batcher/open_server kwargs."""
+    running = []
+
+    def start(collection, port=None, **kwargs):
+        batcher = Batcher(collection, cfg, log=lambda msg: None, **kwargs)
+        server = open_server(batcher, socket_path=str(tmp_path / "s.sock"), port=port)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        running.append((server, batcher))
+        return server
+
+    yield start
+    for server, batcher in running:
+        server.shutdown()
+        server.server_close()
+        batcher.close()
+
+
+def test_concurrent_clients_share_one_bulk_write(serving):
+    collection = FakeCollection()
+    server = serving(collection, batch_size=4, flush_interval=60)
+    batches = [[_record("S1"), _record("S2")], [_record("S3"), _record("S1", status="completed")]]
+    with ThreadPoolExecutor(2) as pool:
+        replies = list(pool.map(lambda records: send_records(records, socket_path=server.address),
+                                batches))
+
+    assert [reply["written"] for reply in replies] == [2, 2]
+    # Both requests went out in one round trip, with S1's two rows coalesced into one op
+    assert collection.calls == [3]
+    assert len(collection.find_one({"sample_id": "S1"})["timeline"]) == 2
+
+
+def test_errors_are_reported_to_the_request_that_sent_them(serving):
+    server = serving(FakeCollection(fail_ids={"BAD"}), flush_interval=0)
+    reply = send_records([_record("S1"), _record("S2", status="bogus"), _record("BAD")],
+                         socket_path=server.address)
+    assert reply["accepted"] == 2
+    assert reply["written"] == 1
+    assert reply["errors"][0].startswith("Row 2: invalid status 'bogus'")
+    assert reply["errors"][1] == "Row 3: Document failed validation"
+
+
+def test_invalid_json_rejects_the_whole_request(serving):
+    collection = FakeCollection()
+    server = serving(collection, flush_interval=0)
+    reply = send_unix(server.address, b'{"sample_id": "S1"}\nnot json\n')
+    assert reply == {"accepted": 0, "written": 0,
+                     "errors": ["Line 2: invalid JSON: Expecting value"]}
+    assert collection.calls == []
+
+
+def test_http_records_and_health(serving):
+    collection = FakeCollection()
+    server = serving(collection, port=0, flush_interval=0)
+    reply = send_records([_record("S1")], url=server.address)
+    assert reply == {"accepted": 1, "written": 1, "errors": []}
+    with urlopen(f"{server.address}/health") as response:
+        health = json.loads(response.read())
+    assert health["status"] == "ok"
+    assert health["created"] == 1
+
+
+def test_close_flushes_pending_records():
+    collection = FakeCollection()
+    batcher = Batcher(collection, cfg, flush_interval=60, log=lambda msg: None)
+    thread = threading.Thread(target=batcher.submit, args=([json.dumps(_record("S1"))],))
+    thread.start()
+    while not batcher.totals["requests"]:
+        time.sleep(0.001)
+    batcher.close()
+    thread.join()
+    assert collection.calls == [1]
+
+
+def test_stale_socket_is_replaced_but_other_files_are_not(tmp_path):
+    batcher = Batcher(FakeCollection(), cfg, log=lambda msg: None)
+    try:
+        path = str(tmp_path / "s.sock")
+        open_server(batcher, socket_path=path).socket.close()  # leaves the socket file behind
+        server = open_server(batcher, socket_path=path)
+        server.server_close()
+        assert not os.path.exists(path)
+
+        (tmp_path / "plain").write_text("")
+        with pytest.raises(OSError, match="not a socket"):
+            open_server(batcher, socket_path=str(tmp_path / "plain"))
+    finally:
+        batcher.close()
+
+
+def test_cli_send_forwards_a_file(serving):
+    collection = FakeCollection()
+    server = serving(collection, flush_interval=0)
+    result = CliRunner().invoke(main, ["send", "-i", os.path.join(FIXTURES, "cdm.csv"),
+                                       "--socket", server.address])
+    assert result.exit_code == 0, result.output
+    assert "Done — 2 rows written" in result.output
+    assert len(collection.docs) == 1
+
+
+def test_cli_send_without_server_fails(tmp_path):
+    result = CliRunner().invoke(main, ["send", "-i", os.path.join(FIXTURES, "cdm.csv"),
+                                       "--socket", str(tmp_path / "missing.sock")])
+    assert result.exit_code == 1
+    assert "Error sending to" in result.output
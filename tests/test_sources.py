@@ -0,0 +1,95 @@
+"""Tests for multi-file / directory input expansion and pooled parsing."""
+
+import json
+import os
+import shutil
+
+import pytest
+from click.testing import CliRunner
+
+from samplenator_cli.cli import main
+from samplenator_cli.sources import expand_inputs, iter_sources, load_records
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "system")
+
+
+@pytest.fixture
+def drop_dir(tmp_path):
+    for name in ("cdm.csv", "demux.csv"):
+        shutil.copy(os.path.join(FIXTURES, name), tmp_path / name)
+    nested = tmp_path / "nested"
+    nested.mkdir()
+    shutil.copy(os.path.join(FIXTURES, "bjorn.csv"), nested / "bjorn.csv")
+    (tmp_path / "README.txt").write_text("not a record file")
+    return tmp_path
+
+
+def test_expand_inputs_directory_recurses_supported_files(drop_dir):
+    files = expand_inputs([str(drop_dir)])
+    assert [os.path.relpath(f, drop_dir) for f in files] == \
+        ["cdm.csv", "demux.csv", os.path.join("nested", "bjorn.csv")]
+
+
+def test_expand_inputs_glob_and_dedupe(drop_dir):
+    files = expand_inputs([str(drop_dir / "*.csv"), str(drop_dir / "cdm.csv")])
+    assert [os.path.basename(f) for f in files] == ["cdm.csv", "demux.csv"]
+
+
+def test_expand_inputs_missing(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        expand_inputs([str(tmp_path / "missing.csv")])
+    with pytest.raises(FileNotFoundError, match="No supported files match"):
+        expand_inputs([str(tmp_path / "*.csv")])
+
+
+@pytest.mark.parametrize("pattern", ["", "*", "*.txt"])
+def test_cli_upload_rejects_input_without_supported_files(tmp_path, pattern):
+    (tmp_path / "notes.txt").write_text("not a record file")
+    (tmp_path / "run.rejects.csv").write_text("sample_id,system,message,status\n")
+    path = str(tmp_path / pattern) if pattern else str(tmp_path)
+    result = CliRunner().invoke(main, ["upload", "-i", path, "--dry-run"])
+    assert result.exit_code == 2
+    assert "Invalid value for '-i' / '--input': No supported files" in result.output
+    assert repr(path) in result.output
+
+
+def test_cli_upload_rejects_missing_input(tmp_path):
+    result = CliRunner().invoke(main, ["upload", "-i", str(tmp_path / "missing.csv"), "--dry-run"])
+    assert result.exit_code == 2
+    assert "No such file or directory" in result.output
+
+
+def test_load_records_attributes_errors_to_file(tmp_path):
+    path = tmp_path / "bad.csv"
+    path.write_text("sample_id,system,message,status\nS1,cdm,m,bogus\n")
+    _, records, errors = load_records(str(path))
+    assert records == []
+    assert errors[0].startswith(f"{path}: Row 1: invalid status")
+
+
+def test_iter_sources_process_pool_keeps_file_order(drop_dir):
+    paths = expand_inputs([str(drop_dir)])
+    errors = []
+    records = list(iter_sources(paths, None, 2, errors))
+    assert errors == []
+    assert [ref for ref, _ in records] == [
+        (paths[0], 1), (paths[0], 2), (paths[1], 1), (paths[1], 2), (paths[2], 1),
+    ]
+
+
+def test_cli_dry_run_multiple_inputs(drop_dir):
+    runner = CliRunner()
+    result = runner.invoke(main, ["upload", "-i", str(drop_dir),
+                                  "-i", os.path.join(FIXTURES, "pipeline.csv"),
+                                  "--processes", "2", "--dry-run"])
+    assert result.exit_code == 0, result.output
+    assert len(json.loads(result.output)["updates"]) == 8
+
+
+def test_cli_multiple_inputs_reports_file_and_row(drop_dir):
+    (drop_dir / "zz_bad.yaml").write_text(
+        "- sample_id: S1\n  system: nope\n  message: m\n  status: ok\n")
+    runner = CliRunner()
+    result = runner.invoke(main, ["upload", "-i", str(drop_dir), "--processes", "1", "--dry-run"])
+    assert result.exit_code == 1
+    assert f"{drop_dir / 'zz_bad.yaml'}: Row 1: unknown system" in result.output
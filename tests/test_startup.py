@@ -0,0 +1,65 @@
+"""Import-time budget for CLI startup."""
+
+import os
+import subprocess
+import sys
+
+from samplenator_cli.cli import load_config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "tests", "fixtures", "system")
+
+# Generous enough for a loaded CI runner; a local run is ~100 ms, most of it click
+BUDGET_MS = float(os.environ.get("SAMPLENATOR_IMPORT_BUDGET_MS", "400"))
+# Only needed for YAML input, MongoDB writes and --processes
+LAZY_MODULES = ("yaml", "pymongo", "bson", "multiprocessing", "concurrent.futures.process")
+
+
+def _importtime(*args):
+    """Run the CLI under -X importtime; return (result, {module: self µs})."""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "from samplenator_cli.cli import main; main()",
+         *args],
+        capture_output=True, text=True, env=env, check=False,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(self_us)
+    return result, modules
+
+
+def _check_budget(modules):
+    loaded = [name for name in LAZY_MODULES if name in modules]
+    assert not loaded, f"imported at startup: {loaded}"
+    total_ms = sum(modules.values()) / 1000
+    slowest = sorted(modules.items(), key=lambda kv: -kv[1])[:5]
+    assert total_ms <= BUDGET_MS, \
+        f"imports took {total_ms:.0f} ms (budget {BUDGET_MS:.0f} ms); slowest: {slowest}"
+
+
+def test_help_is_within_import_budget():
+    result, modules = _importtime("--help")
+    assert result.returncode == 0, result.stderr
+    _check_budget(modules)
+
+
+def test_csv_dry_run_is_within_import_budget():
+    result, modules = _importtime("upload", "-i", os.path.join(FIXTURES, "cdm.csv"), "--dry-run")
+    assert result.returncode == 0, result.stderr
+    _check_budget(modules)
+
+
+def test_load_config_is_cached_until_the_file_changes(tmp_path):
+    path = tmp_path / "config.py"
+    path.write_text("VALUE = 1\n")
+    first = load_config(str(path))
+    assert load_config(str(path)) is first
+
+    path.write_text("VALUE = 22\n")
+    second = load_config(str(path))
+    assert second is not first
+    assert second.VALUE == 22
@@ -0,0 +1,91 @@
+"""Tests for per-stage upload instrumentation."""
+
+import json
+import os
+import pstats
+import time
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from conftest import FakeCollection
+
+from samplenator_cli.cli import main
+from samplenator_cli.stats import StageStats, percentile
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "system")
+
+
+def _slow(n, delay):
+    for i in range(n):
+        time.sleep(delay)
+        yield i
+
+
+def test_nested_stages_are_charged_only_their_own_time():
+    stats = StageStats(memory=False)
+    outer = stats.timed("outer", (i for i in stats.timed("inner", _slow(3, 0.01))))
+    assert list(outer) == [0, 1, 2]
+    report = stats.report()
+    assert report["stages"]["inner"]["rows"] == 3
+    assert report["stages"]["inner"]["seconds"] >= 0.03
+    assert report["stages"]["outer"]["seconds"] < 0.01
+
+
+def test_collection_proxy_records_round_trips():
+    stats = StageStats(memory=False)
+    collection = stats.collection(FakeCollection())
+    with stats.measure("write"):
+        collection.bulk_write([], ordered=True)
+        collection.bulk_write([], ordered=True)
+    write = stats.report()["stages"]["write"]
+    assert write["round_trips"] == 2
+    assert write["latency_p50"] is not None
+    assert collection.calls == [0, 0]
+
+
+def test_percentile_nearest_rank():
+    assert percentile([], 50) is None
+    assert percentile([3, 1, 2, 4], 50) == 2
+    assert percentile(list(range(1, 101)), 99) == 99
+
+
+def test_cli_upload_stats_json_and_profile(tmp_path, mongo_client):
+    collection = FakeCollection()
+    client = mongo_client(collection)
+    stats_path, profile_path = tmp_path / "stats.json", tmp_path / "upload.prof"
+    with patch("pymongo.MongoClient", return_value=client):
+        result = CliRunner().invoke(main, [
+            "upload", "-i", os.path.join(FIXTURES, "cdm.csv"), "--stats",
+            "--stats-json", str(stats_path), "--profile", str(profile_path),
+        ])
+    assert result.exit_code == 0, result.output
+    assert "round trips: 1" in result.output
+    report = json.loads(stats_path.read_text())
+    assert list(report["stages"]) == ["parse", "aliases", "validate", "normalise", "build", "write"]
+    assert all(stage["rows"] == 2 for stage in report["stages"].values())
+    assert report["stages"]["write"]["round_trips"] == 1
+    # Memory is not traced unless asked for; the process peak RSS always is
+    assert report["peak_bytes"] is None
+    assert all(stage["peak_bytes"] is None for stage in report["stages"].values())
+    assert report["peak_rss_bytes"] > 0
+    assert pstats.Stats(str(profile_path)).total_calls > 0
+
+
+def test_cli_upload_stats_memory(tmp_path, mongo_client):
+    collection = FakeCollection()
+    client = mongo_client(collection)
+    stats_path = tmp_path / "stats.json"
+    with patch("pymongo.MongoClient", return_value=client):
+        result = CliRunner().invoke(main, ["upload", "-i", os.path.join(FIXTURES, "cdm.csv"),
+                                           "--stats-json", str(stats_path), "--stats-memory"])
+    assert result.exit_code == 0, result.output
+    report = json.loads(stats_path.read_text())
+    assert report["peak_bytes"] > 0
+    stages = report["stages"].values()
+    assert all(0 < stage["peak_bytes"] <= report["peak_bytes"] for stage in stages)
+
+    result = CliRunner().invoke(main, ["upload", "-i", os.path.join(FIXTURES, "cdm.csv"),
+                                       "--stats-memory"])
+    assert result.exit_code == 2
+    assert "requires --stats or --stats-json" in result.output
@@ -0,0 +1,119 @@
+"""Tests for the status lookup subcommand."""
+
+import json
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from conftest import FakeCollection
+
+import samplenator_cli.config as cfg
+from samplenator_cli.cli import main
+from samplenator_cli.ingest import build_items
+from samplenator_cli.status import (
+    format_table,
+    iter_status,
+    read_sample_ids,
+    sample_filter,
+    status_projection,
+)
+from samplenator_cli.writer import write_updates
+
+
+def _collection():
+    collection = FakeCollection()
+    records = [
+        {"sample_id": "S1", "system": "bjorn", "status": "ok", "message": "Done", "group_id": "G1"},
+        {"sample_id": "S2", "system": "clarity", "status": "started", "message": "Reception",
+         "checkpoint": "reception", "group_id": "G1"},
+        {"sample_id": "S3", "system": "bjorn", "status": "running", "message": "Align",
+         "group_id": "G2", "sequencing_run_id": "R1"},
+    ]
+    write_updates(collection, build_items(enumerate(records, start=1), cfg))
+    return collection
+
+
+def test_read_sample_ids_skips_blanks_and_comments():
+    assert list(read_sample_ids(["S1\n", "\n", "# header\n", " S2  # trailing\n"])) == ["S1", "S2"]
+
+
+def test_iter_status_chunks_in_input_order():
+    collection = _collection()
+    missing = []
+    docs = list(iter_status(collection, ["S3", "S1", "S3", "NOPE", "S2"],
+                            status_projection(["bjorn"]), chunk_size=2, missing=missing))
+    assert [doc["sample_id"] for doc in docs] == ["S3", "S1", "S2"]
+    assert missing == ["NOPE"]
+    # The repeated S3 is dropped from its chunk, so three $in queries cover five ids
+    assert [q["sample_id"]["$in"] for q in collection.queries] == \
+        [["S3", "S1"], ["NOPE"], ["S2"]]
+    assert set(docs[0]) == {"sample_id", "summary", "systems", "timestamps"}
+    assert list(docs[0]["systems"]) == ["bjorn"]
+    assert "timeline" not in docs[0]
+
+
+def test_iter_status_with_filters():
+    collection = _collection()
+    docs = list(iter_status(collection, ["S1", "S3"], status_projection(timestamps=False),
+                            {"group_id": "G1"}))
+    assert [doc["sample_id"] for doc in docs] == ["S1"]
+    assert set(docs[0]) == {"sample_id", "summary"}
+    docs = iter_status(collection, None, {"sample_id": 1}, {"group_id": "G1"})
+    assert [doc["sample_id"] for doc in docs] == ["S1", "S2"]
+
+
+def test_sample_filter_matches_run_id_written_by_uploads_and_under_system_ids():
+    collection = _collection()
+    # Written before uploads set the top-level field: the run id is only under systems.<name>.ids
+    collection.docs.append({"sample_id": "S4",
+                            "systems": {"demux": {"ids": {"sequencing_run_id": "R1"}}}})
+    filters = sample_filter(cfg, sequencing_run_id="R1")
+    docs = iter_status(collection, None, {"sample_id": 1}, filters)
+    assert [doc["sample_id"] for doc in docs] == ["S3", "S4"]
+    filters = sample_filter(cfg, group_id="G2", sequencing_run_id="R1")
+    docs = iter_status(collection, ["S1", "S3", "S4"], {"sample_id": 1}, filters)
+    assert [doc["sample_id"] for doc in docs] == ["S3"]
+
+
+def test_format_table_summarises_checkpoints():
+    docs = list(iter_status(_collection(), ["S1", "S2"], status_projection(["bjorn", "clarity"])))
+    lines = format_table(docs, ["bjorn", "clarity"]).splitlines()
+    assert lines[0].split() == ["sample_id", "queue_status", "current_step", "updated_at",
+                                "bjorn", "clarity"]
+    assert lines[1].split()[:3] == ["S1", "completed", "Done"]
+    assert lines[1].split()[-1] == "-"
+    assert lines[2].split()[-1] == "reception=started:true;completed:false"
+
+
+def test_cli_status_ndjson_from_args_and_stdin(mongo_client):
+    with patch("pymongo.MongoClient", return_value=mongo_client(_collection())):
+        result = CliRunner().invoke(main, ["status", "S1", "-i", "-", "--system", "Bjorn"],
+                                    input="S3\nS9\n")
+    assert result.exit_code == 1
+    lines = result.output.splitlines()
+    assert [json.loads(line)["sample_id"] for line in lines[:2]] == ["S1", "S3"]
+    assert json.loads(lines[0])["systems"]["bjorn"]["status"] == "started:true;completed:true"
+    assert lines[2] == "Not found: S9"
+
+
+def test_cli_status_by_group_as_table(mongo_client):
+    with patch("pymongo.MongoClient", return_value=mongo_client(_collection())):
+        result = CliRunner().invoke(main, ["status", "--group-id", "G2", "--format", "table"])
+    assert result.exit_code == 0, result.output
+    assert [line.split()[0] for line in result.output.splitlines()] == ["sample_id", "S3"]
+
+
+def test_cli_status_by_sequencing_run_id(mongo_client):
+    with patch("pymongo.MongoClient", return_value=mongo_client(_collection())):
+        result = CliRunner().invoke(main, ["status", "--sequencing-run-id", "R1"])
+    assert result.exit_code == 0, result.output
+    assert [json.loads(line)["sample_id"] for line in result.output.splitlines()] == ["S3"]
+
+
+def test_cli_status_rejects_unknown_system_and_missing_ids():
+    result = CliRunner().invoke(main, ["status", "S1", "--system", "nope"])
+    assert result.exit_code == 2
+    assert "unknown system 'nope'" in result.output
+    result = CliRunner().invoke(main, ["status"])
+    assert result.exit_code == 2
+    assert "Give sample ids" in result.output
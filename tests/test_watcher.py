@@ -0,0 +1,240 @@
+"""Tests for the drop-directory watcher."""
+
+import os
+from unittest.mock import patch
+
+import pytest
+from click.testing import CliRunner
+from pymongo.errors import AutoReconnect
+
+from conftest import FakeCollection
+
+import samplenator_cli.config as cfg
+from samplenator_cli.cli import main
+from samplenator_cli.watcher import STATE_FILENAME, OffsetState, Watcher, read_appended
+
+HEADER = "sample_id,system,message,status\n"
+
+
+def _append(path, text):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+
+
+class OutageCollection(FakeCollection):
+    """Fails the bulk_write calls whose (0-based) numbers are in `outages`, before writing anything."""
+
+    def __init__(self, outages):
+        super().__init__()
+        self.outages = set(outages)
+        self.attempts = 0
+
+    def bulk_write(self, ops, ordered=True):
+        self.attempts += 1
+        if self.attempts - 1 in self.outages:
+            raise AutoReconnect("connection reset")
+        return super().bulk_write(ops, ordered=ordered)
+
+
+def test_read_appended_keeps_header_and_skips_partial_line(tmp_path):
+    path = tmp_path / "a.csv"
+    path.write_text(HEADER + "S1,cdm,a,ok\nS2,cdm,b")
+    entry = OffsetState(str(tmp_path / "state.json")).get("a.csv")
+    rows, entry = read_appended(str(path), entry)
+    assert [r["sample_id"] for r in rows] == ["S1"]
+    _append(path, ",ok\nS3,cdm,c,ok\n")
+    rows, entry = read_appended(str(path), entry)
+    assert [r["sample_id"] for r in rows] == ["S2", "S3"]
+    assert entry["rows"] == 3
+    assert entry["offset"] == path.stat().st_size
+
+
+@pytest.mark.parametrize("name, content", [
+    ("a.csv", HEADER + "S1,cdm,a,ok\nS2,cdm,b,ok"),
+    ("a.jsonl", '{"sample_id": "S1", "system": "cdm", "message": "a", "status": "ok"}\n'
+                '{"sample_id": "S2", "system": "cdm", "message": "b", "status": "ok"}'),
+    ("a.yaml", "- sample_id: S1\n  system: cdm\n  message: a\n  status: ok\n"
+               "- sample_id: S2\n  system: cdm\n  message: b\n  status: ok"),
+])
+def test_watcher_once_reads_last_line_without_newline(tmp_path, fake_collection, name, content):
+    path = tmp_path / name
+    path.write_text(content)
+    log = []
+    totals = Watcher(str(tmp_path), fake_collection, cfg, log=log.append).run(once=True)
+    assert [d["sample_id"] for d in fake_collection.docs] == ["S1", "S2"]
+    assert fake_collection.docs[1]["systems"]["cdm"]["message"] == "b"
+    assert totals["rows"] == 2 and totals["errors"] == []
+    assert log == ["Flushed 2 rows — 2 created, 0 updated"]
+    assert OffsetState(str(tmp_path / STATE_FILENAME)).get(name)["offset"] == path.stat().st_size
+
+
+def test_watcher_reads_last_line_once_the_file_settles(tmp_path, fake_collection):
+    path = tmp_path / "a.csv"
+    path.write_text(HEADER + "S1,cdm,a,ok\nS2,cdm,b,ok")
+    watcher = Watcher(str(tmp_path), fake_collection, cfg, log=lambda _: None)
+    watcher.scan()
+    assert [refs for refs, _, _ in watcher.pending] == [[("a.csv", 1)]]
+    # Still the same size on the next scan: the writer is done, so the last line is complete
+    watcher.scan()
+    assert [refs for refs, _, _ in watcher.pending] == [[("a.csv", 1)], [("a.csv", 2)]]
+
+
+def test_flush_failure_keeps_unwritten_rows_and_offsets(tmp_path):
+    (tmp_path / "a.csv").write_text(HEADER + "S1,cdm,a,ok\nS2,cdm,b,ok\n")
+    collection = OutageCollection(outages={1})
+    watcher = Watcher(str(tmp_path), collection, cfg, batch_size=1, log=lambda _: None)
+    watcher.scan()
+    with pytest.raises(AutoReconnect):
+        watcher.flush()
+    # S1 was written before the outage and is not sent again
+    assert [refs for refs, _, _ in watcher.pending] == [[("a.csv", 2)]]
+    assert not os.path.exists(tmp_path / STATE_FILENAME)
+    watcher.flush()
+    assert [len(d["timeline"]) for d in collection.docs] == [1, 1]
+    assert OffsetState(str(tmp_path / STATE_FILENAME)).get("a.csv")["rows"] == 2
+
+
+def test_watcher_backs_off_and_retries_after_mongo_error(tmp_path):
+    (tmp_path / "a.csv").write_text(HEADER + "S1,cdm,a,ok\n")
+    collection = OutageCollection(outages={0})
+    log, delays = [], []
+
+    def sleep(delay):
+        delays.append(delay)
+        if len(delays) == 1:
+            raise KeyboardInterrupt  # stop the daemon; its final flush is the retry
+
+    watcher = Watcher(str(tmp_path), collection, cfg, flush_interval=0, retry_backoff=0.5,
+                      log=log.append)
+    with patch("samplenator_cli.watcher._inotify_waiter", return_value=None), \
+            patch("samplenator_cli.watcher.time.sleep", sleep):
+        totals = watcher.run()
+    assert log[0].startswith("Error writing to MongoDB: connection reset; 1 rows kept pending, retrying in")
+    assert 0 <= delays[0] <= 0.5
+    assert totals["created"] == 1
+    assert collection.attempts == 2
+
+
+def test_cli_watch_once_reports_mongo_error(tmp_path, mongo_client):
+    (tmp_path / "a.csv").write_text(HEADER + "S1,cdm,a,ok\n")
+    with patch("pymongo.MongoClient", return_value=mongo_client(OutageCollection(outages={0}))):
+        result = CliRunner().invoke(main, ["watch", str(tmp_path), "--once"])
+    assert result.exit_code == 1
+    assert "Error writing to MongoDB: connection reset" in result.output
+    assert not os.path.exists(tmp_path / STATE_FILENAME)
+
+
+def test_scan_skips_files_removed_after_listing(tmp_path, fake_collection):
+    (tmp_path / "a.csv").write_text(HEADER + "S1,cdm,a,ok\n")
+    watcher = Watcher(str(tmp_path), fake_collection, cfg)
+    with patch("samplenator_cli.watcher.os.path.getsize", side_effect=FileNotFoundError):
+        watcher.scan()
+    assert watcher.pending == []
+
+
+def test_read_appended_restarts_truncated_file(tmp_path):
+    path = tmp_path / "a.csv"
+    path.write_text(HEADER + "S1,cdm,a,ok\nS2,cdm,b,ok\n")
+    _, entry = read_appended(str(path), OffsetState(str(tmp_path / "s.json")).get("a.csv"))
+    path.write_text(HEADER + "S9,cdm,z,ok\n")
+    rows, entry = read_appended(str(path), entry)
+    assert [r["sample_id"] for r in rows] == ["S9"]
+    assert entry["rows"] == 1
+
+
+def test_watcher_ingests_only_new_rows(tmp_path, fake_collection):
+    path = tmp_path / "cdm.csv"
+    path.write_text(HEADER + "S1,cdm,Uploading,started\n")
+    (tmp_path / "batch.yaml").write_text(
+        "- sample_id: S2\n  system: demux\n  message: m\n  status: ok\n")
+    log = []
+    watcher = Watcher(str(tmp_path), fake_collection, cfg, log=log.append)
+    assert watcher.run(once=True)["created"] == 2
+
+    _append(path, "S1,cdm,Uploaded,ok\nS3,cdm,bad,bogus\n")
+    watcher.run(once=True)
+    assert fake_collection.calls == [2, 1]
+    doc = fake_collection.find_one({"sample_id": "S1"})
+    assert [e["message"] for e in doc["timeline"]] == ["Uploading", "Uploaded"]
+    assert any(msg.startswith("cdm.csv: Row 3: invalid status") for msg in log)
+
+
+def test_watcher_resumes_from_state_file(tmp_path, fake_collection):
+    path = tmp_path / "cdm.csv"
+    path.write_text(HEADER + "S1,cdm,a,ok\n")
+    Watcher(str(tmp_path), fake_collection, cfg, log=lambda _: None).run(once=True)
+    assert os.path.exists(tmp_path / STATE_FILENAME)
+
+    _append(path, "S2,cdm,b,ok\n")
+    Watcher(str(tmp_path), fake_collection, cfg, log=lambda _: None).run(once=True)
+    assert [d["sample_id"] for d in fake_collection.docs] == ["S1", "S2"]
+    assert fake_collection.calls == [1, 1]
+
+
+def test_watcher_flushes_on_size(tmp_path, fake_collection):
+    (tmp_path / "cdm.csv").write_text(HEADER + "".join(f"S{i},cdm,m,ok\n" for i in range(3)))
+    watcher = Watcher(str(tmp_path), fake_collection, cfg, batch_size=3, flush_interval=60)
+    watcher.scan()
+    assert watcher.due()
+    watcher.batch_size = 4
+    assert not watcher.due()
+
+
+def test_cli_watch_once(tmp_path, fake_collection, mongo_client):
+    (tmp_path / "cdm.csv").write_text(HEADER + "S1,cdm,a,ok\n")
+    client = mongo_client(fake_collection)
+    runner = CliRunner()
+    with patch("pymongo.MongoClient", return_value=client):
+        result = runner.invoke(main, ["watch", str(tmp_path), "--once"])
+    assert result.exit_code == 0, result.output
+    assert "1 created, 0 updated" in result.output
+
+
+def test_watcher_skips_rejects_files(tmp_path, fake_collection):
+    (tmp_path / "run.rejects.jsonl").write_text(
+        '{"sample_id": "S1", "system": "cdm", "message": "a", "status": "ok"}\n')
+    Watcher(str(tmp_path), fake_collection, cfg).run(once=True)
+    assert fake_collection.docs == []
+
+
+def test_read_appended_holds_back_the_last_yaml_item(tmp_path):
+    path = tmp_path / "batch.yaml"
+    path.write_text("- sample_id: S1\n")
+    entry = OffsetState(str(tmp_path / "s.json")).get("batch.yaml")
+    rows, entry = read_appended(str(path), entry)
+    assert rows == [] and entry["offset"] == 0
+    _append(path, "  system: demux\n  message: m\n  status: ok\n- sample_id: S2\n")
+    rows, entry = read_appended(str(path), entry)
+    assert rows == [{"sample_id": "S1", "system": "demux", "message": "m", "status": "ok"}]
+    _append(path, "  system: demux\n  message: m\n  status: ok\n")
+    rows, entry = read_appended(str(path), entry, final=True)
+    assert [r["sample_id"] for r in rows] == ["S2"]
+    assert entry["offset"] == path.stat().st_size
+
+
+def test_watcher_reads_yaml_item_split_across_appends(tmp_path, fake_collection):
+    path = tmp_path / "batch.yaml"
+    path.write_text("- sample_id: S1\n")
+    log = []
+    watcher = Watcher(str(tmp_path), fake_collection, cfg, log=log.append)
+    watcher.scan()
+    _append(path, "  system: demux\n  message: m\n  status: ok\n")
+    watcher.scan()
+    assert watcher.pending == []
+    # Once the file has stopped growing, the held-back item is read
+    watcher.scan()
+    watcher.flush()
+    assert [d["sample_id"] for d in fake_collection.docs] == ["S1"]
+    assert log == ["Flushed 1 rows — 1 created, 0 updated"]
+
+
+def test_watcher_skips_unparseable_data_and_keeps_going(tmp_path, fake_collection):
+    path = tmp_path / "events.jsonl"
+    path.write_text('{"sample_id": "S1", "system": "cdm"\n')
+    log = []
+    watcher = Watcher(str(tmp_path), fake_collection, cfg, log=log.append)
+    watcher.run(once=True)
+    assert log[0].startswith("events.jsonl: Skipped data that does not parse (bytes 0-")
+    _append(path, '{"sample_id": "S2", "system": "cdm", "message": "a", "status": "ok"}\n')
+    watcher.run(once=True)
+    assert [d["sample_id"] for d in fake_collection.docs] == ["S2"]
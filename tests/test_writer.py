@@ -0,0 +1,186 @@
+"""Tests for the batched bulk_write upload path."""
+
+import json
+import os
+from unittest.mock import patch
+
+from click.testing import CliRunner
+from pymongo.errors import BulkWriteError
+
+from conftest import FakeCollection
+
+from samplenator_cli.cli import main
+from samplenator_cli.writer import partition_for, write_updates, write_updates_concurrent
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "system")
+
+
+class UnacknowledgedCollection(FakeCollection):
+    """Applies every op, then reports a write concern error as pymongo does for a `w` timeout."""
+
+    def bulk_write(self, ops, ordered=True):
+        res = super().bulk_write(ops, ordered=ordered)
+        raise BulkWriteError({
+            "nInserted": 0, "nUpserted": res.upserted_count, "nMatched": res.matched_count,
+            "nModified": res.modified_count, "nRemoved": 0, "upserted": [], "writeErrors": [],
+            "writeConcernErrors": [{"code": 64, "errmsg": "waiting for replication timed out"}],
+        })
+
+
+def _items(sample_ids):
+    return [
+        ([i], {"sample_id": sid}, {"$set": {"sample_id": sid, "n": i}})
+        for i, sid in enumerate(sample_ids, start=1)
+    ]
+
+
+def test_write_updates_batches_round_trips(fake_collection):
+    result = write_updates(fake_collection, _items(f"S{i}" for i in range(5)), batch_size=2)
+    assert fake_collection.calls == [2, 2, 1]
+    assert result == {"created": 5, "updated": 0, "rows": 5, "errors": []}
+
+
+def test_write_updates_counts_created_and_updated(fake_collection):
+    result = write_updates(fake_collection, _items(["S1", "S2", "S1"]), batch_size=10)
+    assert result["created"] == 2
+    assert result["updated"] == 1
+    assert fake_collection.find_one({"sample_id": "S1"})["n"] == 3
+
+
+def test_write_updates_ordered_stops_at_first_error():
+    collection = FakeCollection(fail_ids={"S2"})
+    result = write_updates(collection, _items(["S1", "S2", "S3", "S4"]), batch_size=2, ordered=True)
+    assert result["errors"] == ["Row 2: Document failed validation"]
+    assert result["created"] == 1
+    assert collection.calls == [2]
+
+
+def test_write_updates_unordered_continues_past_errors():
+    collection = FakeCollection(fail_ids={"S2"})
+    result = write_updates(collection, _items(["S1", "S2", "S3", "S4"]), batch_size=2,
+                           ordered=False)
+    assert result["errors"] == ["Row 2: Document failed validation"]
+    assert result["created"] == 3
+    assert collection.calls == [2, 2]
+
+
+def test_on_batch_reports_applied_rows_ordered():
+    seen = []
+    write_updates(FakeCollection(fail_ids={"S4"}), _items(["S1", "S2", "S3", "S4", "S5"]),
+                  batch_size=2, ordered=True, on_batch=seen.append)
+    assert seen == [[1, 2], [3]]
+
+
+def test_on_batch_reports_applied_rows_unordered():
+    seen = []
+    write_updates(FakeCollection(fail_ids={"S4"}), _items(["S1", "S2", "S3", "S4", "S5"]),
+                  batch_size=3, ordered=False, on_batch=seen.append)
+    assert seen == [[1, 2, 3], [5]]
+
+
+def test_write_concern_error_is_reported_and_rows_are_not_confirmed():
+    seen = []
+    result = write_updates(UnacknowledgedCollection(), _items(["S1", "S2"]), batch_size=10,
+                           ordered=False, on_batch=seen.append)
+    assert result["errors"] == ["Row 1: write concern error: waiting for replication timed out",
+                                "Row 2: write concern error: waiting for replication timed out"]
+    assert result["created"] == 2
+    assert seen == [[]]
+
+
+def test_cli_upload_fails_on_write_concern_error(tmp_path, mongo_client):
+    runner = CliRunner()
+    with patch("pymongo.MongoClient", return_value=mongo_client(UnacknowledgedCollection())):
+        result = runner.invoke(main, ["upload", "-i", os.path.join(FIXTURES, "cdm.csv"),
+                                      "--journal", str(tmp_path / "journal.json")])
+    assert result.exit_code == 1
+    assert "Row 1: write concern error: waiting for replication timed out" in result.output
+    journal = json.loads((tmp_path / "journal.json").read_text())
+    assert [entry["committed"] for entry in journal["files"].values()] == [[]]
+
+
+def test_cli_upload_uses_bulk_write(fake_collection, mongo_client):
+    runner = CliRunner()
+    with patch("pymongo.MongoClient", return_value=mongo_client(fake_collection)):
+        result = runner.invoke(main, ["upload", "-i", os.path.join(FIXTURES, "frontend.csv"),
+                                      "--batch-size", "3"])
+    assert result.exit_code == 0, result.output
+    assert fake_collection.calls == [3, 3, 1]
+    assert "1 created, 6 updated" in result.output
+    assert len(fake_collection.docs[0]["timeline"]) == 7
+
+
+def test_cli_upload_reports_write_errors(mongo_client):
+    collection = FakeCollection(fail_ids={"TEST-SAMPLE-001"})
+    runner = CliRunner()
+    with patch("pymongo.MongoClient", return_value=mongo_client(collection)):
+        result = runner.invoke(main, ["upload", "-i", os.path.join(FIXTURES, "cdm.csv"),
+                                      "--unordered"])
+    assert result.exit_code == 1
+    assert "Row 1: Document failed validation" in result.output
+    assert "Row 2: Document failed validation" in result.output
+
+
+def test_cli_upload_stream_writes_before_error(tmp_path, fake_collection, mongo_client):
+    path = tmp_path / "data.csv"
+    path.write_text(
+        "sample_id,system,message,status\n"
+        "S1,cdm,a,ok\nS2,cdm,b,ok\nS3,cdm,c,bogus\nS4,cdm,d,ok\n"
+    )
+    runner = CliRunner()
+    with patch("pymongo.MongoClient", return_value=mongo_client(fake_collection)):
+        result = runner.invoke(main, ["upload", "-i", str(path), "--stream", "--batch-size", "1"])
+    assert result.exit_code == 1
+    assert "Row 3: invalid status" in result.output
+    assert [d["sample_id"] for d in fake_collection.docs] == ["S1", "S2"]
+
+
+def test_cli_upload_stream_coalesces_per_batch(fake_collection, mongo_client):
+    runner = CliRunner()
+    with patch("pymongo.MongoClient", return_value=mongo_client(fake_collection)):
+        result = runner.invoke(main, ["upload", "-i", os.path.join(FIXTURES, "frontend.csv"),
+                                      "--stream", "--coalesce", "--batch-size", "4"])
+    assert result.exit_code == 0, result.output
+    assert fake_collection.calls == [2]
+    assert len(fake_collection.docs[0]["timeline"]) == 7
+
+
+def test_partition_for_is_stable():
+    assert partition_for("S1", 4) == partition_for("S1", 4)
+    assert {partition_for(f"S{i}", 4) for i in range(50)} == {0, 1, 2, 3}
+
+
+def test_write_updates_concurrent_keeps_per_sample_order():
+    collection = FakeCollection()
+    items = [
+        ([i], {"sample_id": f"S{i % 7}"}, {"$set": {"last": i}, "$push": {"timeline": i}})
+        for i in range(1, 201)
+    ]
+    result = write_updates_concurrent(collection, items, workers=4, batch_size=5)
+    assert result["rows"] == 200
+    assert result["created"] == 7
+    assert result["updated"] == 193
+    for doc in collection.docs:
+        sid = int(doc["sample_id"][1:])
+        expected = [i for i in range(1, 201) if i % 7 == sid]
+        assert doc["timeline"] == expected
+        assert doc["last"] == expected[-1]
+
+
+def test_write_updates_concurrent_merges_errors():
+    collection = FakeCollection(fail_ids={"S2"})
+    result = write_updates_concurrent(collection, _items(["S1", "S2", "S3", "S2", "S4"]), workers=3,
+                                      batch_size=1, ordered=False)
+    assert sorted(result["errors"]) == ["Row 2: Document failed validation",
+                                        "Row 4: Document failed validation"]
+    assert result["created"] == 3
+
+
+def test_cli_upload_workers(fake_collection, mongo_client):
+    runner = CliRunner()
+    with patch("pymongo.MongoClient", return_value=mongo_client(fake_collection)):
+        result = runner.invoke(main, ["upload", "-i", os.path.join(FIXTURES, "frontend.csv"),
+                                      "--workers", "3"])
+    assert result.exit_code == 0, result.output
+    assert "1 created, 6 updated" in result.output
+    assert "Wrote 7 rows" in result.output